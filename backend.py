@@ -1,29 +1,153 @@
 
 import os
-import csv
+import time
+import threading
 from backendHelpers import BackendHelpers
+from catalog import Catalog
+from folderMetadata import FolderMetadata, MetadataCache
+from duplicateFinder import DuplicateFinder, HashCache
+from catalogStorage import get_catalog_storage, CsvCatalogStorage, SqliteCatalogStorage
+from catalogSnapshot import CatalogSnapshot
+from searchIndex import SearchIndex, DEFAULT_FUZZY_LIMIT
+from catalogQuery import compile_query
+from progressEvents import (RunStats, run_profiled, PROFILE_ENV_VAR, STAGE_DISCOVER, STAGE_LIST, STAGE_METADATA,
+                            STAGE_SORT, STAGE_WRITE)
+from scanCache import ScanCache
+from scanJournal import ScanJournal
+from scanSession import ScanSession
+
+# Default number of drives scanned in parallel
+DEFAULT_SCAN_WORKERS = 8
 
 class Folders2CSVBackend:
     """Backend interface for processing Audio Archive drives"""
 
+    _scan_cache = None
+    _scan_cache_lock = threading.Lock()
+    
+    # Callables given the RunStats of every finished run
+    run_listeners = []
+
+    @staticmethod
+    def get_scan_cache():
+        """
+        Get the shared persistent scan cache
+        
+        Returns:
+            ScanCache: Cache of mastering folder listings
+        """
+        with Folders2CSVBackend._scan_cache_lock:
+            if Folders2CSVBackend._scan_cache is None:
+                Folders2CSVBackend._scan_cache = ScanCache()
+            return Folders2CSVBackend._scan_cache
+    
+    @staticmethod
+    def save_scan_cache():
+        """Write any pending scan cache changes to disk"""
+        if Folders2CSVBackend._scan_cache is not None:
+            Folders2CSVBackend._scan_cache.save()
+    
+    @staticmethod
+    def clear_scan_cache(drive_name=None):
+        """
+        Invalidate cached listings so the next scan reads the drives again
+        
+        Args:
+            drive_name (str): Drive to invalidate, or None for every drive
+        """
+        cache = Folders2CSVBackend.get_scan_cache()
+        cache.invalidate(drive_name)
+        cache.save()
+
     @staticmethod
-    def get_csv_contents(csv_file_path):
+    def get_csv_contents(csv_file_path, use_snapshot=True):
         """
         Get contents of the CSV file
         
+        A CSV catalog given a binary snapshot with build_snapshot is read from
+        it, and the snapshot is rebuilt whenever the CSV has changed since it
+        was written. Other CSVs are parsed, so reading a catalog never leaves
+        a snapshot the size of the CSV next to it.
+        
         Args:
             csv_file_path (str): Path to the CSV file
+            use_snapshot (bool): Read the snapshot if the catalog has one; False always parses the CSV
             
         Returns:
-            list: List of tuples containing folder names and drive names
+            Catalog: Catalog of folder names and drive names
         """
         if not os.path.exists(csv_file_path):
-            return []
+            return Catalog()
         try:
-            return BackendHelpers.getCsvContents(csv_file_path)
+            return Folders2CSVBackend.load_catalog(csv_file_path, use_snapshot)
         except Exception as e:
             print(f"Error reading CSV file: {e}")
-            return []
+            return Catalog()
+    
+    @staticmethod
+    def load_catalog(catalog_path, use_snapshot=True):
+        """
+        Read a whole catalog of any storage type, like get_csv_contents but
+        raising read errors, for callers that must tell a failed read from
+        an empty catalog
+        
+        Args:
+            catalog_path (str): Path to the catalog
+            use_snapshot (bool): Read the snapshot if the catalog has one
+            
+        Returns:
+            Catalog: Catalog of folder names and drive names
+            
+        Raises:
+            OSError: If the catalog can't be read
+        """
+        storage = get_catalog_storage(catalog_path)
+        if isinstance(storage, CsvCatalogStorage):
+            snapshot = CatalogSnapshot(catalog_path)
+            if use_snapshot and snapshot.exists():
+                return snapshot.load()
+            return BackendHelpers.getCsvContents(catalog_path)
+        return storage.load()
+    
+    @staticmethod
+    def iter_csv_contents(csv_file_path):
+        """
+        Stream the contents of the CSV file without loading it into memory
+        
+        Args:
+            csv_file_path (str): Path to the CSV file
+            
+        Yields:
+            tuple: (folder name, drive name)
+        """
+        if not os.path.exists(csv_file_path):
+            return
+        yield from get_catalog_storage(csv_file_path).iter_rows()
+    
+    @staticmethod
+    def get_csv_page(csv_file_path, offset, limit):
+        """
+        Get one page of rows from the CSV file
+        
+        A byte offset index is stored next to the CSV the first time a page is
+        requested, so later pages are read directly without parsing the rows
+        before them.
+        
+        Args:
+            csv_file_path (str): Path to the CSV file
+            offset (int): Index of the first row to return
+            limit (int): Maximum number of rows to return
+            
+        Returns:
+            tuple: (rows: list of (folder name, drive name) tuples, total_count: int)
+        """
+        if not os.path.exists(csv_file_path):
+            return [], 0
+        try:
+            return get_catalog_storage(csv_file_path).get_page(offset, limit)
+        except Exception as e:
+            print(f"Error reading CSV file: {e}")
+            return [], 0
     
     @staticmethod
     def get_available_drives():
@@ -40,92 +164,497 @@ class Folders2CSVBackend:
             return []
     
     @staticmethod
-    def process_drives_to_csv(selected_drives, csv_file_path, progress_callback=None):
+    def scan_drives(selected_drives, progress_callback=None, max_workers=None, cache=None, force_rescan=False,
+                    session=None, stats=None, scanner=None, metadata=None, cancel_event=None, on_drive_done=None):
+        """
+        Scan the mastering folders of several drives concurrently
+        
+        Drives are grouped by physical device and each group is scanned by a
+        single worker, so there is at most one scan in flight per device.
+        
+        Args:
+            selected_drives (list): List of drive names to scan
+            progress_callback (callable): Optional callback given a ProgressEvent per update
+            max_workers (int): Maximum number of devices scanned in parallel
+            cache (ScanCache): Optional cache of previous listings
+            force_rescan (bool): Ignore cached listings and read every drive
+            session (ScanSession): Optional listings captured by get_drive_info
+            stats (RunStats): Optional run timings to add to; its callback replaces progress_callback
+            scanner (DeepScanner): List nested folders with this scanner instead of
+                only the top level; cache and session are not used
+            metadata (FolderMetadata): Also measure the size, file count and newest
+                mtime of every folder
+            cancel_event (threading.Event): Stop scanning once set; drives that
+                have not finished by then are left out of the results
+            on_drive_done (callable): Called from the worker with (drive name,
+                mastering folder, folder data, mastering folder mtime before the
+                scan) as each drive finishes, e.g. to checkpoint it
+            
+        Returns:
+            list: List of (drive name, mastering folder, folder data) tuples in
+                the same order as selected_drives
+        """
+        # Imported here to keep startup of the command line tool fast
+        from concurrent.futures import ThreadPoolExecutor
+        
+        if max_workers is None:
+            max_workers = DEFAULT_SCAN_WORKERS
+        if stats is None:
+            stats = RunStats(progress_callback)
+        
+        drive_count = len(dict.fromkeys(selected_drives))
+        finished = []
+        
+        def drive_done(drive, message):
+            with stats.lock:
+                finished.append(drive)
+                stats.emit(STAGE_LIST, message, drive, len(finished), drive_count)
+        
+        def measure(drive, mastering_folder, folder_data):
+            if metadata is None or not folder_data:
+                return folder_data
+            stats.emit(STAGE_METADATA, f"Measuring folders in {drive}", drive, total=drive_count)
+            with stats.stage(STAGE_METADATA):
+                folder_data = metadata.add_metadata(mastering_folder, drive, folder_data)
+            stats.add_count(STAGE_METADATA, len(folder_data))
+            return folder_data
+        
+        def scan_drive(drive):
+            stats.emit(STAGE_LIST, f"Processing drive: {drive}", drive, total=drive_count)
+            
+            # Reuse the listing from the last drive refresh if it's still valid
+            reused = None
+            if session is not None and not force_rescan and scanner is None:
+                reused = session.lookup(drive)
+            if reused is not None:
+                mastering_folder, folder_data = reused
+                folder_data = measure(drive, mastering_folder, folder_data)
+                drive_done(drive, f"Found {len(folder_data)} folders in {drive}")
+                return drive, mastering_folder, folder_data
+            
+            mastering_folder = BackendHelpers.getMasteringFolder(drive)
+            if mastering_folder:
+                folder_data = BackendHelpers.getFolderContents(mastering_folder, drive, cache, force_rescan, scanner)
+                folder_data = measure(drive, mastering_folder, folder_data)
+                if folder_data:
+                    drive_done(drive, f"Found {len(folder_data)} folders in {drive}")
+                else:
+                    drive_done(drive, f"No folders found in {drive}")
+            else:
+                folder_data = Catalog()
+                drive_done(drive, f"No mastering folder found for drive: {drive}")
+            return drive, mastering_folder, folder_data
+        
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+        
+        def scan_device(drives):
+            results = {}
+            for drive in drives:
+                if cancelled():
+                    break
+                start = time.perf_counter()
+                mtime_ns = None
+                if on_drive_done is not None:
+                    mastering_folder = BackendHelpers.getMasteringFolder(drive)
+                    mtime_ns = ScanSession.get_mtime(mastering_folder) if mastering_folder else None
+                result = scan_drive(drive)
+                # Metadata walks stop early when cancelled, leaving incomplete totals
+                if metadata is not None and cancelled():
+                    break
+                results[drive] = result
+                stats.add_drive_time(drive, time.perf_counter() - start)
+                stats.add_count(STAGE_LIST, len(result[2]))
+                if on_drive_done is not None:
+                    on_drive_done(*result, mtime_ns)
+            return results
+        
+        # Group drives by device, keeping the selection order within each group
+        with stats.stage(STAGE_DISCOVER):
+            devices = {}
+            for drive in dict.fromkeys(selected_drives):
+                devices.setdefault(BackendHelpers.getDeviceId(drive), []).append(drive)
+        
+        results = {}
+        workers = max(1, min(max_workers, len(devices)))
+        with stats.stage(STAGE_LIST):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(scan_device, drives) for drives in devices.values()]
+                for future in futures:
+                    results.update(future.result())
+        
+        # Merge in selection order so the output does not depend on timing
+        return [results[drive] for drive in dict.fromkeys(selected_drives) if drive in results]
+    
+    @staticmethod
+    def add_run_listener(listener):
+        """
+        Register a callable that is given the RunStats of every finished
+        process_drives_to_csv run, e.g. to log stage timings
+        """
+        Folders2CSVBackend.run_listeners.append(listener)
+    
+    @staticmethod
+    def process_drives_to_csv(selected_drives, csv_file_path, progress_callback=None, max_workers=None,
+                              use_cache=True, force_rescan=False, session=None, profile=None, scanner=None,
+                              collect_metadata=False, cancel_event=None, resume=True, stats=None):
         """
         Process selected drives and save/append to CSV file
         
+        Each finished drive is checkpointed to a journal next to the catalog
+        until the catalog is written, so a cancelled or interrupted run keeps
+        the drives it already scanned.
+        
         Args:
             selected_drives (list): List of drive names to process
             csv_file_path (str): Path to the CSV file to create/update
-            progress_callback (callable): Optional callback for progress updates
+            progress_callback (callable): Optional callback given a ProgressEvent per update
+            max_workers (int): Maximum number of drives scanned in parallel
+            use_cache (bool): Reuse cached listings for drives that have not changed
+            force_rescan (bool): Read every drive even if a cached listing is valid
+            session (ScanSession): Optional listings captured when the drives were refreshed
+            profile (bool): Write a cProfile report to the config directory; defaults
+                to on when the FOLDERS2CSV_PROFILE environment variable is set
+            scanner (DeepScanner): Optional deep scanner; nested folders are written
+                as paths relative to the mastering folder
+            collect_metadata (bool): Also write each folder's size, file count and
+                newest mtime; repeat scans reuse cached totals for unchanged directories
+            cancel_event (threading.Event): Set from another thread to stop the run
+                after the drives currently being scanned; nothing is written
+            resume (bool): Skip drives already scanned by an earlier run into the same
+                catalog that was cancelled or interrupted
+            stats (RunStats): Records this run's stage timings, e.g. for a report
+                afterwards; each run needs its own, since several can run at once
             
         Returns:
             tuple: (success: bool, message: str, data_count: int)
         """
+        if stats is None:
+            stats = RunStats()
+        stats.progress_callback = progress_callback
+        if profile is None:
+            profile = bool(os.environ.get(PROFILE_ENV_VAR))
         try:
-            data = []
-            
-            for i, drive in enumerate(selected_drives):
-                if progress_callback:
-                    progress_callback(f"Processing drive: {drive}")
-                
-                mastering_folder = BackendHelpers.getMasteringFolder(drive)
-                if mastering_folder:
-                    folder_data = BackendHelpers.getFolderContents(mastering_folder, drive)
-                    if folder_data:
-                        data.extend(folder_data)
-                        if progress_callback:
-                            progress_callback(f"Found {len(folder_data)} folders in {drive}")
-                    else:
-                        if progress_callback:
-                            progress_callback(f"No folders found in {drive}")
-                else:
-                    if progress_callback:
-                        progress_callback(f"No mastering folder found for drive: {drive}")
-            
-            if not data:
-                return False, "No data found to save", 0
-            
-            # Sort by drive name
-            data.sort(key=lambda x: x[1])
-            
-            # Check if file exists to determine if we should append or create new
-            file_exists = os.path.exists(csv_file_path)
-            existing_data = []
-            
-            if file_exists:
-                # Read existing data to avoid duplicates
-                try:
-                    with open(csv_file_path, 'r', newline='') as csvfile:
-                        reader = csv.reader(csvfile)
-                        next(reader, None)  # Skip header
-                        existing_data = [(row[0], row[1]) for row in reader if len(row) >= 2]
-                except Exception as e:
-                    print(f"Warning: Could not read existing CSV file: {e}")
-                    existing_data = []
-            
-            # Filter out duplicates
-            existing_set = set(existing_data)
-            new_data = [item for item in data if item not in existing_set]
-            
-            # Combine all data
-            all_data = existing_data + new_data
-            all_data.sort(key=lambda x: x[1])  # Sort by drive name
-            
-            # Write to CSV
-            if progress_callback:
-                progress_callback("Saving to CSV file...")
-            
-            with open(csv_file_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['Folder Name', 'Drive Name'])
-                for folder, drive in all_data:
-                    writer.writerow([folder, drive])
-            
-            total_folders = len(all_data)
-            new_folders = len(new_data)
-            
-            if file_exists and new_folders > 0:
-                message = f"CSV updated with {new_folders} new folders. Total: {total_folders} folders."
-            elif file_exists and new_folders == 0:
-                message = f"No new folders found. CSV contains {total_folders} folders."
+            if profile:
+                result = run_profiled(stats, Folders2CSVBackend.run_process_drives, stats, selected_drives,
+                                      csv_file_path, max_workers, use_cache, force_rescan, session, scanner,
+                                      collect_metadata, cancel_event, resume)
+                stats.emit(STAGE_WRITE, f"Profile written to {stats.profile_path}")
             else:
-                message = f"CSV created with {total_folders} folders."
+                result = Folders2CSVBackend.run_process_drives(stats, selected_drives, csv_file_path, max_workers,
+                                                               use_cache, force_rescan, session, scanner,
+                                                               collect_metadata, cancel_event, resume)
+        except Exception as e:
+            error_msg = f"Error processing drives: {str(e)}"
+            print(error_msg)
+            result = False, error_msg, 0
+        
+        stats.finish()
+        for listener in list(Folders2CSVBackend.run_listeners):
+            # A broken listener mustn't turn a finished run into a failed one
+            try:
+                listener(stats)
+            except Exception as e:
+                print(f"Warning: Run listener failed: {e}")
+        return result
+    
+    @staticmethod
+    def run_process_drives(stats, selected_drives, csv_file_path, max_workers, use_cache, force_rescan, session,
+                           scanner=None, collect_metadata=False, cancel_event=None, resume=True):
+        """Body of process_drives_to_csv, timed stage by stage in stats"""
+        journal = ScanJournal(csv_file_path, {'deep': scanner.settings if scanner is not None else None,
+                                              'metadata': collect_metadata})
+        try:
+            return Folders2CSVBackend.write_drives(stats, journal, selected_drives, csv_file_path, max_workers,
+                                                   use_cache, force_rescan, session, scanner, collect_metadata,
+                                                   cancel_event, resume)
+        finally:
+            # Kept unless write_drives discarded it after saving, so the next run can resume
+            journal.close()
+    
+    @staticmethod
+    def write_drives(stats, journal, selected_drives, csv_file_path, max_workers, use_cache, force_rescan, session,
+                     scanner, collect_metadata, cancel_event, resume):
+        """Scan the drives not already in the journal and write every drive to the catalog"""
+        data = Catalog()
+        
+        # A forced rescan reads every drive again, but still checkpoints them
+        resumed = journal.begin(resume and not force_rescan)
+        selected_drives = list(dict.fromkeys(selected_drives))
+        drives = [drive for drive in selected_drives if drive not in resumed]
+        if len(drives) < len(selected_drives):
+            stats.emit(STAGE_LIST, f"Resuming: {len(selected_drives) - len(drives)} drives already scanned")
+        
+        cache = Folders2CSVBackend.get_scan_cache() if use_cache and scanner is None else None
+        metadata = None
+        metadata_cache = None
+        if collect_metadata:
+            metadata_cache = MetadataCache() if use_cache else None
+            metadata = FolderMetadata(metadata_cache, force_rescan=force_rescan, cancel_event=cancel_event)
+        scan_results = Folders2CSVBackend.scan_drives(
+            drives, None, max_workers, cache, force_rescan, session, stats, scanner, metadata, cancel_event,
+            journal.record)
+        if metadata_cache is not None:
+            metadata_cache.evict()
+        if cache is not None:
+            cache.save()
+        
+        if cancel_event is not None and cancel_event.is_set():
+            finished = len(selected_drives) - len(drives) + len(scan_results)
+            return (False, f"Cancelled after scanning {finished} of {len(selected_drives)} drives. "
+                           f"Process the same drives again to resume.", 0)
+        
+        scanned = {drive: folder_data for drive, mastering_folder, folder_data in scan_results}
+        for drive in selected_drives:
+            if drive in resumed:
+                data.extend(resumed[drive][1])
+            elif drive in scanned:
+                data.extend(scanned[drive])
+        
+        if not data:
+            journal.discard()
+            return False, "No data found to save", 0
+        
+        # Sort by drive name
+        with stats.stage(STAGE_SORT):
+            data.sort_by_drive()
+        stats.add_count(STAGE_SORT, len(data))
+        
+        # Check if file exists to determine if we should append or create new
+        storage = get_catalog_storage(csv_file_path)
+        file_exists = storage.exists()
+        
+        # Write to CSV
+        stats.emit(STAGE_WRITE, "Saving to CSV file...", done=0, total=len(data))
+        
+        # Rows already in the catalog are skipped using its index
+        new_folders, total_folders = storage.add_rows(data, stats)
+        journal.discard()
+        
+        if file_exists and new_folders > 0:
+            message = f"CSV updated with {new_folders} new folders. Total: {total_folders} folders."
+        elif file_exists and new_folders == 0:
+            message = f"No new folders found. CSV contains {total_folders} folders."
+        else:
+            message = f"CSV created with {total_folders} folders."
+        
+        return True, message, total_folders
+    
+    @staticmethod
+    def find_duplicates(selected_drives, progress_callback=None, max_workers=None, use_cache=True, force_rescan=False,
+                        similarity=None, hash_workers=None):
+        """
+        Find project folders copied onto more than one of the selected drives
+        
+        Folders are matched by total size and file count first, then by
+        sampled partial hashes, and only the remaining candidates are hashed
+        in full, so most files are never read.
+        
+        Args:
+            selected_drives (list): List of drive names to compare
+            progress_callback (callable): Optional callback given a ProgressEvent per update
+            max_workers (int): Maximum number of drives scanned in parallel
+            use_cache (bool): Reuse cached listings, folder sizes and file hashes
+            force_rescan (bool): Read every drive and hash every file again
+            similarity (float): Also report same-named folders sharing at least this
+                share of their bytes (e.g. 0.9); None for identical folders only
+            hash_workers (int): Processes hashing files; defaults to the number of CPUs
             
-            return True, message, total_folders
+        Returns:
+            list: DuplicateGroup per set of duplicate folders, most wasted space first
+        """
+        stats = RunStats(progress_callback)
+        cache = Folders2CSVBackend.get_scan_cache() if use_cache else None
+        metadata_cache = MetadataCache() if use_cache else None
+        hash_cache = HashCache() if use_cache else None
+        try:
+            scan_results = Folders2CSVBackend.scan_drives(
+                selected_drives, None, max_workers, cache, force_rescan, stats=stats,
+                metadata=FolderMetadata(metadata_cache, force_rescan=force_rescan))
+            if cache is not None:
+                cache.save()
+            finder = DuplicateFinder(hash_cache, hash_workers, force_rescan=force_rescan, similarity=similarity)
+            groups = finder.find(scan_results, stats)
+            for evicted in (metadata_cache, hash_cache):
+                if evicted is not None:
+                    evicted.evict()
+            return groups
+        except Exception as e:
+            print(f"Error finding duplicates: {e}")
+            return []
+    
+    @staticmethod
+    def compact_csv(csv_file_path):
+        """
+        Remove duplicate rows from the CSV file and sort it by drive name
+        
+        Args:
+            csv_file_path (str): Path to the CSV file
             
+        Returns:
+            tuple: (success: bool, message: str, data_count: int)
+        """
+        if not os.path.exists(csv_file_path):
+            return False, "CSV file does not exist", 0
+        try:
+            count = get_catalog_storage(csv_file_path).compact()
+            return True, f"CSV sorted and compacted. Total: {count} folders.", count
         except Exception as e:
-            error_msg = f"Error processing drives: {str(e)}"
+            error_msg = f"Error compacting CSV file: {str(e)}"
+            print(error_msg)
+            return False, error_msg, 0
+    
+    @staticmethod
+    def build_snapshot(csv_file_path, compress=False):
+        """
+        Rewrite the binary snapshot of a CSV catalog
+        
+        Args:
+            csv_file_path (str): Path to the CSV file
+            compress (bool): Compress the folder names; later automatic
+                rebuilds keep this setting
+            
+        Returns:
+            tuple: (success: bool, message: str, data_count: int)
+        """
+        if not os.path.exists(csv_file_path):
+            return False, "CSV file does not exist", 0
+        if not isinstance(get_catalog_storage(csv_file_path), CsvCatalogStorage):
+            return False, "Snapshots are only kept for CSV catalogs", 0
+        try:
+            snapshot = CatalogSnapshot(csv_file_path)
+            count = len(snapshot.build(compress=compress))
+            size = os.path.getsize(snapshot.path) if os.path.exists(snapshot.path) else 0
+            return True, f"Snapshot written with {count} folders ({size} bytes).", count
+        except Exception as e:
+            error_msg = f"Error writing snapshot: {str(e)}"
+            print(error_msg)
+            return False, error_msg, 0
+    
+    @staticmethod
+    def search_catalog(csv_file_path, query):
+        """
+        Search the catalog using its on-disk index
+        
+        Args:
+            csv_file_path (str): Path to the catalog CSV or database
+            query (str): Text to find in folder or drive names, case-insensitive
+            
+        Returns:
+            Catalog: Matching rows
+        """
+        if not os.path.exists(csv_file_path):
+            return Catalog()
+        try:
+            return get_catalog_storage(csv_file_path).search(query)
+        except Exception as e:
+            print(f"Error searching catalog: {e}")
+            return Catalog()
+    
+    @staticmethod
+    def fuzzy_search_catalog(csv_file_path, query, limit=DEFAULT_FUZZY_LIMIT):
+        """
+        Find the folder names closest to the query, allowing for typos and
+        words in a different order
+        
+        Args:
+            csv_file_path (str): Path to the catalog CSV or database
+            query (str): Words to look for, case-insensitive
+            limit (int): Maximum number of rows to return
+            
+        Returns:
+            Catalog: Best matching rows, best first
+        """
+        matches = Catalog()
+        if not os.path.exists(csv_file_path):
+            return matches
+        try:
+            for row in SearchIndex(Folders2CSVBackend.get_csv_contents(csv_file_path)).fuzzy_search(query, limit):
+                matches.append(row.folder, row.drive, row.metadata)
+        except Exception as e:
+            print(f"Error searching catalog: {e}")
+        return matches
+    
+    @staticmethod
+    def query_catalog(csv_file_path, query):
+        """
+        Find the rows matching a query such as `drive:10-20 folder:*mix* -demo`
+        
+        See catalogQuery.QueryParser for the syntax. Queries are parsed once
+        and kept for reuse, and conditions on the drive rule out whole drives
+        before any folder name is looked at.
+        
+        Args:
+            csv_file_path (str): Path to the catalog CSV or database
+            query (str): Query to run
+            
+        Returns:
+            Catalog: Matching rows in catalog order
+            
+        Raises:
+            QueryError: If the query can't be parsed
+        """
+        compiled = compile_query(query)
+        matches = Catalog()
+        if not os.path.exists(csv_file_path):
+            return matches
+        try:
+            for row in compiled.run(SearchIndex(Folders2CSVBackend.get_csv_contents(csv_file_path))):
+                matches.append(row.folder, row.drive, row.metadata)
+        except Exception as e:
+            print(f"Error searching catalog: {e}")
+        return matches
+    
+    @staticmethod
+    def has_search_index(csv_file_path):
+        """
+        Check if the catalog can be searched on disk without loading it
+        
+        Args:
+            csv_file_path (str): Path to the catalog CSV or database
+            
+        Returns:
+            bool: True for indexed (SQLite) catalogs
+        """
+        return isinstance(get_catalog_storage(csv_file_path), SqliteCatalogStorage)
+    
+    @staticmethod
+    def import_csv(csv_file_path, database_path):
+        """
+        Import a catalog CSV into an SQLite or sharded catalog
+        
+        Args:
+            csv_file_path (str): Path to the CSV file to import
+            database_path (str): Path to the SQLite database or sharded catalog manifest
+            
+        Returns:
+            tuple: (success: bool, message: str, data_count: int)
+        """
+        try:
+            new_count, total = get_catalog_storage(database_path).import_csv(csv_file_path)
+            return True, f"Imported {new_count} new folders. Total: {total} folders.", total
+        except Exception as e:
+            error_msg = f"Error importing CSV file: {str(e)}"
+            print(error_msg)
+            return False, error_msg, 0
+    
+    @staticmethod
+    def export_csv(catalog_path, csv_file_path):
+        """
+        Export a catalog to a CSV file
+        
+        Args:
+            catalog_path (str): Path to the catalog CSV or database
+            csv_file_path (str): Path to the CSV file to write
+            
+        Returns:
+            tuple: (success: bool, message: str, data_count: int)
+        """
+        try:
+            count = get_catalog_storage(catalog_path).export_csv(csv_file_path)
+            return True, f"Exported {count} folders to {csv_file_path}", count
+        except Exception as e:
+            error_msg = f"Error exporting catalog: {str(e)}"
             print(error_msg)
             return False, error_msg, 0
     
@@ -147,31 +676,18 @@ class Folders2CSVBackend:
             return True, "New CSV file will be created", 0
         
         try:
-            with open(csv_file_path, 'r', newline='') as csvfile:
-                reader = csv.reader(csvfile)
-                header = next(reader, None)
-                
-                if not header or len(header) < 2:
-                    return False, "Invalid CSV format: missing or incorrect header", 0
-                
-                if header[0].lower() not in ['folder name', 'folder'] or header[1].lower() not in ['drive name', 'drive']:
-                    return False, "Invalid CSV format: incorrect column headers", 0
-                
-                # Count existing rows
-                row_count = sum(1 for row in reader if len(row) >= 2)
-                
-                return True, f"Valid CSV file with {row_count} existing entries", row_count
-                
+            return get_catalog_storage(csv_file_path).validate()
         except Exception as e:
             return False, f"Error reading CSV file: {str(e)}", 0
     
     @staticmethod
-    def get_drive_info(drive_name):
+    def get_drive_info(drive_name, session=None):
         """
         Get information about a specific drive
         
         Args:
             drive_name (str): Name of the drive
+            session (ScanSession): Optional session that keeps the listing for processing
             
         Returns:
             dict: Drive information including folder count, mastering folder path, etc.
@@ -187,7 +703,11 @@ class Folders2CSVBackend:
                     'status': 'No mastering folder found'
                 }
             
-            folder_data = BackendHelpers.getFolderContents(mastering_folder, drive_name)
+            mtime_ns = ScanSession.get_mtime(mastering_folder) if session is not None else None
+            folder_data = BackendHelpers.getFolderContents(
+                mastering_folder, drive_name, Folders2CSVBackend.get_scan_cache())
+            if session is not None:
+                session.store(drive_name, mastering_folder, folder_data, mtime_ns)
             
             return {
                 'drive_name': drive_name,
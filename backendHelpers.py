@@ -1,16 +1,21 @@
 import os
 import re
 import csv
+from catalog import Catalog
+from csvCatalog import CsvCatalog
 
 pattern = re.compile(r'.*?\bAudio Archive\s+0*(\d+)\b', re.I)
 
 osDrives = ['Macintosh HD', 'Macintosh HD - Data', '.timemachine']
 
 class BackendHelpers:
+    # Directory that external drives are mounted under
+    volumesRoot = '/Volumes'
+
     @staticmethod
     def getDrives():
         drives = []
-        for drive in os.listdir('/Volumes'):
+        for drive in os.listdir(BackendHelpers.volumesRoot):
             if drive not in osDrives:
                 t = BackendHelpers.stripDriveName(drive)
                 if t != 'Unknown Drive':
@@ -18,11 +23,24 @@ class BackendHelpers:
         return drives
     @staticmethod
     def getMasteringFolder(drive_name):
-        masteringFolder = os.path.join('/Volumes', drive_name, 'mastering')
+        masteringFolder = os.path.join(BackendHelpers.volumesRoot, drive_name, 'mastering')
         if not os.path.exists(masteringFolder):
             return None
         return masteringFolder
 
+    @staticmethod
+    def getDeviceId(drive_name):
+        # Mounted volumes are keyed by their device number so that two
+        # volumes on the same disk are never scanned at the same time.
+        # Plain directories (e.g. a test volume root) are keyed by path.
+        drivePath = os.path.join(BackendHelpers.volumesRoot, drive_name)
+        try:
+            if os.path.ismount(drivePath):
+                return os.stat(drivePath).st_dev
+        except OSError:
+            pass
+        return drivePath
+
     @staticmethod
     def stripDriveName(drive_name):
         m = pattern.fullmatch(drive_name.strip())
@@ -31,16 +49,44 @@ class BackendHelpers:
         return "Unknown Drive"
 
     @staticmethod
-    def getFolderContents(masteringFolder, drive_name):
+    def getDriveNumber(drive_name):
+        m = pattern.fullmatch(drive_name.strip())
+        if m:
+            return int(m.group(1))
+        return None
+
+    @staticmethod
+    def getFolderContents(masteringFolder, drive_name, cache=None, forceRescan=False, scanner=None):
         if not os.path.exists(masteringFolder):
-            return []
-        subFolders = []
-        for folder in os.listdir(masteringFolder):
-            if folder.startswith('.'):
-                continue
-            subFolders.append((folder, BackendHelpers.stripDriveName(drive_name)))
+            return Catalog()
+        if scanner is not None:
+            # Deep scans aren't cached: the mastering folder's identity
+            # doesn't change when something is added further down the tree
+            subFolders = Catalog()
+            subFolders.add_folders(scanner.scan(masteringFolder), BackendHelpers.stripDriveName(drive_name))
+            return subFolders
+        folders = None
+        if cache is not None and not forceRescan:
+            folders = cache.lookup(drive_name, masteringFolder)
+        if folders is None:
+            # Capture the identity before listing so a change made while
+            # listing invalidates the stored entry
+            identity = cache.get_identity(masteringFolder) if cache is not None else None
+            folders = [folder for folder in os.listdir(masteringFolder) if not folder.startswith('.')]
+            if cache is not None:
+                cache.store(drive_name, identity, folders)
+        subFolders = Catalog()
+        subFolders.add_folders(folders, BackendHelpers.stripDriveName(drive_name))
         return subFolders
 
+    @staticmethod
+    def getAppSupportFolder():
+        app_support = os.path.expanduser('~/Library/Application Support')
+        app_folder = os.path.join(app_support, 'Folders2CSV')
+        if not os.path.exists(app_folder):
+            os.makedirs(app_folder, exist_ok=True)
+        return app_folder
+
     @staticmethod
     def saveToCsv(foldersAndDrives):
         downloads_folder = os.path.expanduser('~/Downloads')
@@ -56,11 +102,14 @@ class BackendHelpers:
         with open(csv_file_path, 'r', newline="") as csvfile:
             reader = csv.reader(csvfile)
             next(reader, None) # Skip header
-            data = []
+            data = Catalog()
             for row in reader:
+                if len(row) < 2:
+                    continue
                 folder_name = row[0].strip()
                 drive_name = row[1].strip()
                 if folder_name and drive_name:
-                    data.append((folder_name, drive_name))
+                    metadata = CsvCatalog.parse_metadata(row[2:5]) if len(row) >= 5 else None
+                    data.append(folder_name, drive_name, metadata)
             return data
     
\ No newline at end of file
@@ -0,0 +1,1026 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Folders2CSV backend.
+Builds a fake volume root in a temporary directory so no real drives are needed.
+"""
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+import csv
+import json
+import argparse
+import platform
+import random
+import tempfile
+import tracemalloc
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend import Folders2CSVBackend
+from backendHelpers import BackendHelpers
+
+
+# Folder names that exercise quoting, Unicode and whitespace handling
+ODD_FOLDER_NAMES = [
+    'Mix, Final {n}',
+    '"Quoted" Session {n}',
+    'Caf\u00e9 Se\u00f1or \u2013 Master {n}',
+    '\u30c6\u30b9\u30c8 {n}',
+    '  Padded {n}  ',
+    'Semi;colon {n}',
+    '#{n} [Remaster] (2024)',
+]
+
+# Drive names that getDrives must recognize as Audio Archive drives
+ODD_DRIVE_NAMES = ['audio archive {n}', 'Audio Archive 0{n:03d}', 'Backup - Audio Archive {n}']
+
+# Volumes that getDrives must skip
+DECOY_VOLUMES = ['Macintosh HD', 'Macintosh HD - Data', '.timemachine', 'Untitled', 'Audio Archive']
+
+# Hidden entries macOS leaves in a mastering folder
+HIDDEN_FOLDER_NAMES = ['.Spotlight-V100', '.Trashes', '.fseventsd', '.TemporaryItems', '.DocumentRevisions-V100']
+
+
+def make_volume_root(root, drive_count, folders_per_drive, hidden_per_drive=0, odd_names=False, decoys=False):
+    """
+    Create a fake volume root with Audio Archive drives
+
+    Args:
+        root (str): Directory to create the drives in
+        drive_count (int): Number of drives to create
+        folders_per_drive (int): Number of mastering subfolders per drive
+        hidden_per_drive (int): Number of hidden dot-folders to add to each mastering folder
+        odd_names (bool): Vary the drive name format and give some folders awkward names
+        decoys (bool): Also create system volumes and non-archive drives that should be skipped
+
+    Returns:
+        list: List of drive names that were created
+    """
+    drives = []
+    for d in range(1, drive_count + 1):
+        if odd_names and d % 4 == 0:
+            drive = ODD_DRIVE_NAMES[(d // 4) % len(ODD_DRIVE_NAMES)].format(n=d)
+        else:
+            drive = f"Audio Archive {d:02d}"
+        mastering = os.path.join(root, drive, 'mastering')
+        os.makedirs(mastering)
+        for f in range(folders_per_drive):
+            if odd_names and f % 10 == 0:
+                name = ODD_FOLDER_NAMES[(f // 10) % len(ODD_FOLDER_NAMES)].format(n=f"{d:02d}-{f:05d}")
+            else:
+                name = f"Project {d:02d}-{f:05d}"
+            os.mkdir(os.path.join(mastering, name))
+        for h in range(hidden_per_drive):
+            hidden = HIDDEN_FOLDER_NAMES[h % len(HIDDEN_FOLDER_NAMES)]
+            os.mkdir(os.path.join(mastering, hidden if h < len(HIDDEN_FOLDER_NAMES) else f"{hidden}-{h}"))
+        drives.append(drive)
+    if decoys:
+        for volume in DECOY_VOLUMES:
+            os.makedirs(os.path.join(root, volume, 'mastering'), exist_ok=True)
+    return drives
+
+
+def make_nested_tree(mastering, clients, sessions_per_client, files_per_session):
+    """
+    Create client folders with nested sessions, as deep scans expect
+
+    Each session holds a Stems folder and files_per_session empty files.
+
+    Returns:
+        int: Number of files and folders created
+    """
+    entries = 0
+    for c in range(clients):
+        client = os.path.join(mastering, f"Client {c:04d}")
+        os.mkdir(client)
+        entries += 1
+        for n in range(sessions_per_client):
+            session = os.path.join(client, f"Session {n:03d}")
+            os.makedirs(os.path.join(session, 'Stems'))
+            entries += 2
+            for f in range(files_per_session):
+                open(os.path.join(session, f"take {f:03d}.wav"), 'w').close()
+            entries += files_per_session
+    return entries
+
+
+def make_duplicate_tree(root, drive_count, projects_per_drive, files_per_project, file_size, copies=2):
+    """
+    Create Audio Archive drives where some projects are copied onto other drives
+
+    Every project holds files_per_project files of random bytes, each
+    between half and one and a half times file_size.
+    Each of the first projects_per_drive // 4 projects of a drive is also
+    copied onto the next copies - 1 drives; one in every four copies has a
+    single byte changed in its last file, so it only differs past the
+    partial hash samples.
+
+    Returns:
+        tuple: (drive names, number of unchanged copies)
+    """
+    rng = random.Random(0)
+    drives = [f"Audio Archive {d:02d}" for d in range(1, drive_count + 1)]
+    for drive in drives:
+        os.makedirs(os.path.join(root, drive, 'mastering'))
+    exact = 0
+    for d, drive in enumerate(drives):
+        for p in range(projects_per_drive):
+            name = f"Project {d + 1:02d}-{p:05d}"
+            project = os.path.join(root, drive, 'mastering', name)
+            os.makedirs(os.path.join(project, 'Stems'))
+            for f in range(files_per_project):
+                folder = project if f % 2 else os.path.join(project, 'Stems')
+                with open(os.path.join(folder, f"take {f:03d}.wav"), 'wb') as out:
+                    out.write(os.urandom(rng.randint(file_size // 2, file_size * 3 // 2)))
+            if p >= projects_per_drive // 4:
+                continue
+            for c in range(1, min(copies, drive_count)):
+                copy = os.path.join(root, drives[(d + c) % drive_count], 'mastering', name)
+                shutil.copytree(project, copy)
+                if p % 4 == 3:
+                    # Change a byte in the middle of the last file
+                    last = os.path.join(copy, f"take {files_per_project - 1:03d}.wav")
+                    if not os.path.exists(last):
+                        last = os.path.join(copy, 'Stems', f"take {files_per_project - 1:03d}.wav")
+                    with open(last, 'r+b') as out:
+                        out.seek(os.path.getsize(last) // 3)
+                        out.write(b'\0' if out.read(1) != b'\0' else b'\1')
+                else:
+                    exact += 1
+    return drives, exact
+
+
+def make_catalog_rows(row_count, drive_count=40, odd_names=False):
+    """
+    Build synthetic catalog rows without touching the disk
+
+    Args:
+        row_count (int): Number of rows to build
+        drive_count (int): Number of distinct drives to spread the rows over
+        odd_names (bool): Give every tenth folder an awkward name
+
+    Returns:
+        list: List of (folder name, drive name) tuples
+    """
+    per_drive = max(1, row_count // drive_count)
+    rows = [
+        (f"Client {i % 997:03d} - Project {i:07d}", f"Audio Archive {i // per_drive + 1}")
+        for i in range(row_count)
+    ]
+    if odd_names:
+        for i in range(0, row_count, 10):
+            name = ODD_FOLDER_NAMES[(i // 10) % len(ODD_FOLDER_NAMES)].format(n=f"{i:07d}").strip()
+            rows[i] = (name, rows[i][1])
+    return rows
+
+
+def make_project_rows(row_count, drive_count=40, seed=1):
+    """
+    Build catalog rows with varied, realistic project folder names
+
+    Returns:
+        list: List of (folder name, drive name) tuples, e.g.
+            ("Northfield Records - Silver Harbor Deluxe_v2_final", "Audio Archive 7")
+    """
+    rng = random.Random(seed)
+    words = ['Silver', 'Harbor', 'Midnight', 'Garden', 'Echo', 'Violet', 'River', 'Static', 'Golden', 'Hour',
+             'Paper', 'Moon', 'Velvet', 'Signal', 'Winter', 'Coast', 'Neon', 'Desert', 'Glass', 'Fever',
+             'Ocean', 'Lantern', 'Thunder', 'Copper', 'Wild', 'Horses', 'Electric', 'Dream', 'Summer', 'Ghost']
+    clients = [f"{rng.choice(words)}{rng.choice(['field', 'wood', 'stone', 'light', ''])} "
+               f"{rng.choice(['Records', 'Music', 'Sound', 'Audio', 'Entertainment'])}" for _ in range(400)]
+    kinds = ['Master', 'Mix', 'Deluxe', 'Remaster', 'Vinyl', 'Stems', 'EP', 'LP', 'Single']
+    suffixes = ['', '', '', '_v2', '_v2_final', ' FINAL', ' (alt)', '_old', ' 24-96']
+    per_drive = max(1, row_count // drive_count)
+    return [
+        (f"{rng.choice(clients)} - {' '.join(rng.sample(words, rng.randint(1, 3)))} {rng.choice(kinds)}"
+         f"{rng.choice(suffixes)} {i}", f"Audio Archive {i // per_drive + 1}")
+        for i in range(row_count)
+    ]
+
+
+def write_catalog_csv(path, rows):
+    """Write catalog rows to a CSV file in the app's format"""
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Folder Name', 'Drive Name'])
+        writer.writerows(rows)
+
+
+def load_tuple_list(csv_file_path):
+    """The original CSV loader, producing a list of (folder, drive) tuples"""
+    with open(csv_file_path, 'r', newline="") as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        data = []
+        for row in reader:
+            folder_name = row[0].strip()
+            drive_name = row[1].strip()
+            if folder_name and drive_name:
+                data.append((folder_name, drive_name))
+        return data
+
+
+def measure(load, *args):
+    """Run a loader and return (result, seconds, bytes held by the result)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load(*args)
+    elapsed = time.perf_counter() - start
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, held
+
+
+def with_latency(latency):
+    """Wrap getFolderContents so every listing pays a fixed seek latency"""
+    list_folder = BackendHelpers.getFolderContents
+
+    def slow_get_folder_contents(masteringFolder, drive_name, *args):
+        time.sleep(latency)
+        return list_folder(masteringFolder, drive_name, *args)
+
+    BackendHelpers.getFolderContents = staticmethod(slow_get_folder_contents)
+    return list_folder
+
+
+def bench_scan_scaling(args):
+    """Wall-clock time of process_drives_to_csv versus number of drives"""
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    saved_root = BackendHelpers.volumesRoot
+    list_folder = with_latency(args.latency) if args.latency else None
+    try:
+        BackendHelpers.volumesRoot = tmp
+        drives = make_volume_root(tmp, max(args.drives), args.folders)
+
+        print(f"{'drives':>6} {'serial (s)':>11} {'parallel (s)':>13} {'speedup':>8}")
+        for count in args.drives:
+            timings = []
+            for workers in (1, args.workers):
+                csv_path = os.path.join(tmp, f'catalog-{count}-{workers}.csv')
+                start = time.perf_counter()
+                Folders2CSVBackend.process_drives_to_csv(drives[:count], csv_path, max_workers=workers,
+                                                         use_cache=False)
+                timings.append(time.perf_counter() - start)
+            print(f"{count:>6} {timings[0]:>11.3f} {timings[1]:>13.3f} {timings[0] / timings[1]:>7.1f}x")
+    finally:
+        BackendHelpers.volumesRoot = saved_root
+        if list_folder:
+            BackendHelpers.getFolderContents = staticmethod(list_folder)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_viewer(args):
+    """Open, scroll and filter latency of the virtualized CSV table"""
+    import tkinter as tk
+    from virtualTable import VirtualTable
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Viewer benchmark needs a display: {e}")
+        return
+    root.geometry("600x500")
+    table = VirtualTable(root)
+    table.pack(fill=tk.BOTH, expand=True)
+    root.update()
+
+    print(f"{'rows':>9} {'open (ms)':>10} {'scroll (ms)':>12} {'filter (ms)':>12}")
+    for count in args.rows:
+        rows = make_catalog_rows(count)
+
+        start = time.perf_counter()
+        table.set_rows(rows)
+        root.update_idletasks()
+        open_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for step in range(1, 101):
+            table.scroll_to(count * step // 100)
+            root.update_idletasks()
+        scroll_ms = (time.perf_counter() - start) * 1000 / 100
+
+        start = time.perf_counter()
+        term = "project 00"
+        table.set_rows([row for row in rows if term in row[0].lower() or term in row[1].lower()])
+        root.update_idletasks()
+        filter_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{count:>9} {open_ms:>10.1f} {scroll_ms:>12.2f} {filter_ms:>12.1f}")
+    root.destroy()
+
+
+def bench_catalog_memory(args):
+    """Load time and memory of the Catalog versus a list of tuples"""
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        print(f"{'rows':>9} {'tuples (s)':>11} {'tuples (MB)':>12} {'catalog (s)':>12} {'catalog (MB)':>13}")
+        for count in args.rows:
+            csv_path = os.path.join(tmp, f'catalog-{count}.csv')
+            write_catalog_csv(csv_path, make_catalog_rows(count))
+
+            tuples, tuple_time, tuple_bytes = measure(load_tuple_list, csv_path)
+            del tuples
+            catalog, catalog_time, catalog_bytes = measure(BackendHelpers.getCsvContents, csv_path)
+            del catalog
+
+            print(f"{count:>9} {tuple_time:>11.2f} {tuple_bytes / 1e6:>12.1f} "
+                  f"{catalog_time:>12.2f} {catalog_bytes / 1e6:>13.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_storage(args):
+    """Compare the CSV and SQLite catalog backends"""
+    from catalog import Catalog
+    from catalogStorage import CsvCatalogStorage, SqliteCatalogStorage
+
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        print(f"{'rows':>9} {'backend':>8} {'create (s)':>11} {'dedup (s)':>10} {'count (ms)':>11} "
+              f"{'search (ms)':>12} {'load (s)':>9}")
+        for count in args.rows:
+            rows = Catalog(make_catalog_rows(count))
+            rows.sort_by_drive()
+            for name, storage_class, extension in (('csv', CsvCatalogStorage, '.csv'),
+                                                   ('sqlite', SqliteCatalogStorage, '.db')):
+                storage = storage_class(os.path.join(tmp, f'catalog-{count}{extension}'))
+
+                start = time.perf_counter()
+                storage.add_rows(rows)
+                create_time = time.perf_counter() - start
+
+                # Every row is already present, so this is pure dedup cost
+                start = time.perf_counter()
+                storage.add_rows(rows)
+                dedup_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                storage.validate()
+                count_ms = (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                storage.search("project 00012")
+                search_ms = (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                storage.load()
+                load_time = time.perf_counter() - start
+
+                print(f"{count:>9} {name:>8} {create_time:>11.2f} {dedup_time:>10.2f} {count_ms:>11.1f} "
+                      f"{search_ms:>12.1f} {load_time:>9.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_sharded(args):
+    """Single-drive updates and validation of a monolithic CSV versus a sharded catalog"""
+    from catalog import Catalog
+    from catalogStorage import CsvCatalogStorage, ShardedCatalogStorage
+
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        print(f"{'rows':>9} {'backend':>8} {'create (s)':>11} {'update (s)':>11} {'validate (ms)':>14} "
+              f"{'load (s)':>9}")
+        for count in args.rows:
+            rows = Catalog(make_catalog_rows(count, args.drives))
+            rows.sort_by_drive()
+            # Rescanning one drive with folder metadata refreshes every row of that drive
+            drive = rows.drives[0]
+            folders = [folder for folder, row_drive in rows.iter_tuples() if row_drive == drive]
+            update = Catalog()
+            update.add_folders(folders, drive, [(1000, 10, 1700000000)] * len(folders))
+            for name, storage_class, extension in (('csv', CsvCatalogStorage, '.csv'),
+                                                   ('sharded', ShardedCatalogStorage, '.manifest')):
+                storage = storage_class(os.path.join(tmp, f'catalog-{count}{extension}'))
+
+                start = time.perf_counter()
+                storage.add_rows(rows)
+                create_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                storage.add_rows(update)
+                update_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                storage.validate()
+                validate_ms = (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                storage.load()
+                load_time = time.perf_counter() - start
+
+                print(f"{count:>9} {name:>8} {create_time:>11.2f} {update_time:>11.3f} {validate_ms:>14.1f} "
+                      f"{load_time:>9.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_snapshot(args):
+    """Catalog load time from CSV text versus a memory-mapped binary snapshot"""
+    from catalogSnapshot import CatalogSnapshot
+
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        print(f"{'rows':>9} {'format':>11} {'size (MB)':>10} {'build (s)':>10} {'load (s)':>9} {'page (ms)':>10}")
+        for count in args.rows:
+            csv_path = os.path.join(tmp, f'catalog-{count}.csv')
+            write_catalog_csv(csv_path, make_catalog_rows(count, odd_names=True))
+
+            start = time.perf_counter()
+            catalog = BackendHelpers.getCsvContents(csv_path)
+            parse_time = time.perf_counter() - start
+            print(f"{count:>9} {'csv':>11} {os.path.getsize(csv_path) / 1e6:>10.1f} {'':>10} {parse_time:>9.2f} "
+                  f"{'':>10}")
+
+            snapshot = CatalogSnapshot(csv_path)
+            for name, compress in (('snapshot', False), ('compressed', True)):
+                start = time.perf_counter()
+                snapshot.build(catalog, compress=compress)
+                build_time = time.perf_counter() - start
+
+                load_time = time_runs(snapshot.load, 3)['min']
+
+                # A page from the middle, as the viewer asks for while scrolling
+                def read_page():
+                    with snapshot.open() as view:
+                        view.get_page(count // 2, 100)
+                page_ms = time_runs(read_page, 5)['min'] * 1000
+
+                print(f"{count:>9} {name:>11} {os.path.getsize(snapshot.path) / 1e6:>10.1f} {build_time:>10.2f} "
+                      f"{load_time:>9.2f} {page_ms:>10.2f}")
+            del catalog
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_fuzzy(args):
+    """Fuzzy search latency on catalogs of realistic project names"""
+    from catalog import Catalog
+    from searchIndex import SearchIndex
+
+    queries = ['silvr harbr', 'midnight garden deluxe', 'velvet ghost v2 final', 'neon dessert vinyl', 'echo',
+               'ep', 'electirc dream stems', 'glass ep 355']
+    print(f"{'rows':>9} {'index (s)':>10} {'words (s)':>10} {'median (ms)':>12} {'max (ms)':>9}  slowest query")
+    for count in args.rows:
+        rows = Catalog(make_project_rows(count))
+        start = time.perf_counter()
+        index = SearchIndex(rows)
+        index_time = time.perf_counter() - start
+        # The first fuzzy search builds the word index
+        start = time.perf_counter()
+        index.fuzzy_search('x')
+        words_time = time.perf_counter() - start
+
+        timings = []
+        for query in queries:
+            timings.append((time_runs(lambda: index.fuzzy_search(query, args.limit), 3)['min'] * 1000, query))
+        timings.sort()
+        print(f"{count:>9} {index_time:>10.2f} {words_time:>10.2f} {timings[len(timings) // 2][0]:>12.1f} "
+              f"{timings[-1][0]:>9.1f}  {timings[-1][1]!r}")
+
+
+def bench_query(args):
+    """Fielded query latency, compiled once, against a full scan of every row"""
+    from catalog import Catalog
+    from catalogQuery import compile_query
+    from searchIndex import SearchIndex
+
+    queries = ['drive:10-20 folder:*velvet* -vinyl', 'velvet (stems OR ep) -demo', 'drive:3 OR drive:7',
+               'folder:/Silver \w+ Stems/', '"ghost velvet" drive:>30', 'midnight garden -drive:1-35']
+    rows = Catalog(make_project_rows(args.rows))
+    index = SearchIndex(rows)
+    print(f"{'query':<38} {'matches':>8} {'query (ms)':>11} {'full scan (ms)':>15}")
+    for query in queries:
+        compiled = compile_query(query)
+        matches = len(compiled.run(index))
+        query_time = time_runs(lambda: compiled.run(index), args.runs)['min'] * 1000
+        predicate = compiled.root.compile(index)
+        scan_time = time_runs(lambda: [i for i in range(len(rows)) if predicate(i)], 1)['min'] * 1000
+        print(f"{query!r:<38} {matches:>8} {query_time:>11.1f} {scan_time:>15.1f}")
+
+
+def bench_federation(args):
+    """Federated search over several catalog files: first read, unchanged repeat and one changed file"""
+    from catalogFederation import CatalogFederation
+
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        paths = []
+        for number in range(args.catalogs):
+            paths.append(os.path.join(tmp, f'room-{number}.csv'))
+            write_catalog_csv(paths[-1], make_project_rows(args.rows, seed=number + 1))
+        print(f"{args.catalogs} catalogs of {args.rows} rows")
+        print(f"{'workers':>8} {'first search (s)':>17} {'repeat (ms)':>12} {'one changed (s)':>16}")
+        for workers in args.workers:
+            # Snapshots are written by the first read; remove them so each run parses CSV
+            for path in paths:
+                if os.path.exists(path + '.snap'):
+                    os.remove(path + '.snap')
+            federation = CatalogFederation(paths, workers)
+            start = time.perf_counter()
+            federation.search('velvet stems')
+            first_time = time.perf_counter() - start
+            repeat_time = time_runs(lambda: federation.search('velvet stems'), 5)['min'] * 1000
+
+            with open(paths[0], 'a', newline='') as csvfile:
+                csv.writer(csvfile).writerow(['Velvet Stems Added Later', 'Audio Archive 99'])
+            start = time.perf_counter()
+            federation.search('velvet stems')
+            changed_time = time.perf_counter() - start
+            print(f"{workers:>8} {first_time:>17.2f} {repeat_time:>12.1f} {changed_time:>16.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_server(args):
+    """Load test of the catalog HTTP service with concurrent keep-alive clients"""
+    import threading
+    import http.client
+    from urllib.parse import urlsplit, quote
+    from catalogServer import CatalogService, CatalogServer
+
+    tmp = server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        # No service given: serve a generated catalog on a free local port
+        tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+        csv_path = os.path.join(tmp, 'catalog.csv')
+        write_catalog_csv(csv_path, make_project_rows(args.rows))
+        server = CatalogServer(CatalogService(csv_path), '127.0.0.1', 0)
+        host, port = server.server_address
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    words = ['velvet', 'silver harbor', 'midnight garden', 'stems', 'ghost', 'neon', 'deluxe', 'echo']
+    paths = ([f'/search?q={quote(word)}' for word in words] +
+             [f'/search?q={quote(word)}&mode=fuzzy&limit=20' for word in words[:4]] +
+             ['/search?q=' + quote('drive:10-20 velvet -demo') + '&mode=query',
+              '/lookup?folder=' + quote('Northfield Records - Silver Harbor Deluxe_v2_final')] +
+             [f'/rows?offset={offset}&limit=100' for offset in range(0, 5000, 1000)])
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(number):
+        rng = random.Random(number)
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        etags = {}  # Like a browser cache: revalidate what was fetched before
+        timings = []
+        seen = {}
+        for _ in range(args.requests):
+            path = rng.choice(paths)
+            headers = {'If-None-Match': etags[path]} if path in etags and rng.random() < args.revalidate else {}
+            start = time.perf_counter()
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            timings.append(time.perf_counter() - start)
+            seen[response.status] = seen.get(response.status, 0) + 1
+            if response.getheader('ETag'):
+                etags[path] = response.getheader('ETag')
+        connection.close()
+        with lock:
+            latencies.extend(timings)
+            for status, count in seen.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    try:
+        # The first request reads the catalog; keep it out of the timings
+        connection = http.client.HTTPConnection(host, port, timeout=300)
+        connection.request('GET', '/status')
+        print(f"Catalog: {json.loads(connection.getresponse().read())['rows']} rows at http://{host}:{port}/")
+        connection.close()
+
+        start = time.perf_counter()
+        clients = [threading.Thread(target=client, args=(number,)) for number in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} requests/s)")
+    print(f"latency (ms): p50 {percentile(0.5):.1f}  p95 {percentile(0.95):.1f}  p99 {percentile(0.99):.1f}  "
+          f"max {latencies[-1] * 1000:.1f}")
+    print("status codes: " + ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+
+
+def bench_cli_startup(args):
+    """Wall-clock startup time of the command line tool"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        csv_path = os.path.join(tmp, 'catalog.csv')
+        write_catalog_csv(csv_path, make_catalog_rows(1000))
+        commands = [
+            ('python (baseline)', [sys.executable, '-c', 'pass']),
+            ('cli.py --help', [sys.executable, os.path.join(here, 'cli.py'), '--help']),
+            ('cli.py validate', [sys.executable, os.path.join(here, 'cli.py'), 'validate', csv_path]),
+            ('import gui', [sys.executable, '-c', f'import sys; sys.path.insert(0, {here!r}); import gui']),
+        ]
+        print(f"{'command':<20} {'mean (ms)':>10} {'min (ms)':>9}")
+        for name, command in commands:
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{name:<20} {sum(timings) / len(timings):>10.1f} {min(timings):>9.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_deep_scan(args):
+    """Deep scan time of a large nested tree versus os.walk"""
+    from deepScanner import DeepScanner
+
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        mastering = os.path.join(tmp, 'mastering')
+        os.mkdir(mastering)
+        entries = make_nested_tree(mastering, args.clients, args.sessions, args.files)
+        print(f"Tree with {entries} entries")
+
+        def walk(root):
+            return [os.path.relpath(os.path.join(path, name), root) for path, dirs, _ in os.walk(root) for name in dirs]
+
+        print(f"{'method':<22} {'folders':>8} {'seconds':>8}")
+        for name, scan in [('os.walk', walk)] + [
+                (f"DeepScanner x{workers}", DeepScanner(None, max_workers=workers).scan)
+                for workers in args.workers]:
+            start = time.perf_counter()
+            folders = scan(mastering)
+            print(f"{name:<22} {len(folders):>8} {time.perf_counter() - start:>8.3f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_duplicates(args):
+    """Duplicate search time with a cold and a warm hash cache"""
+    from duplicateFinder import DuplicateFinder, HashCache, hash_files
+    from folderMetadata import FolderMetadata, MetadataCache
+    from progressEvents import RunStats, STAGE_HASH
+
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    try:
+        root = os.path.join(tmp, 'Volumes')
+        drives, exact = make_duplicate_tree(root, args.drives, args.projects, args.files, args.file_size)
+        BackendHelpers.volumesRoot = root
+        paths = [os.path.join(path, name) for drive in drives
+                 for path, _, names in os.walk(os.path.join(root, drive)) for name in names]
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        print(f"{args.drives} drives, {len(paths)} files, {total_bytes / 1e6:.0f} MB, {exact} identical copies")
+
+        cache_folder = os.path.join(tmp, 'cache')
+        scan_results = Folders2CSVBackend.scan_drives(
+            drives, metadata=FolderMetadata(MetadataCache(os.path.join(cache_folder, 'metadata'))))
+
+        # Hashing every file in full is what a search without the staged pipeline would cost
+        start = time.perf_counter()
+        hash_files(paths)
+        print(f"{'hash every file':<26} {time.perf_counter() - start:>8.3f}s")
+
+        print(f"{'run':<26} {'seconds':>8} {'groups':>7} {'files hashed':>13}")
+        for workers in args.workers:
+            cache = HashCache(os.path.join(cache_folder, f"hashes-{workers}"))
+            for run in ('cold', 'warm'):
+                stats = RunStats()
+                start = time.perf_counter()
+                groups = DuplicateFinder(cache, workers).find(scan_results, stats)
+                seconds = time.perf_counter() - start
+                hashed = stats.report()['counts'].get(STAGE_HASH, 0)
+                print(f"{f'{run} cache, {workers} workers':<26} {seconds:>8.3f} {len(groups):>7} {hashed:>13}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_progress_queue(args):
+    """Event rate the progress queue accepts and the cost of each UI frame's drain"""
+    import threading
+    from progressEvents import ProgressQueue, ProgressEvent, STAGE_LIST
+
+    queue = ProgressQueue()
+
+    def produce():
+        for i in range(args.events):
+            queue.put(ProgressEvent(STAGE_LIST, "event", f"Audio Archive {i % 16}", i, args.events))
+
+    producer = threading.Thread(target=produce)
+    start = time.perf_counter()
+    producer.start()
+    frames = 0
+    drain_times = []
+    while producer.is_alive() or queue.events:
+        drain_start = time.perf_counter()
+        queue.drain()
+        drain_times.append(time.perf_counter() - drain_start)
+        frames += 1
+        time.sleep(args.frame_ms / 1000)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.events} events in {elapsed:.2f}s ({args.events / elapsed:,.0f} events/s), {frames} frames")
+    print(f"drain per frame: mean {sum(drain_times) / len(drain_times) * 1000:.2f} ms, "
+          f"max {max(drain_times) * 1000:.2f} ms")
+
+
+def time_runs(run, runs, setup=None):
+    """
+    Time a function over several runs
+
+    Args:
+        run (callable): Function to time
+        runs (int): Number of timed runs
+        setup (callable): Called untimed before each run
+
+    Returns:
+        dict: Run count and mean, min and max seconds
+    """
+    timings = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return {
+        'runs': runs,
+        'mean': sum(timings) / len(timings),
+        'min': min(timings),
+        'max': max(timings),
+    }
+
+
+def get_git_revision():
+    """Get the current git commit, or None outside a checkout"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def remove_files(*paths):
+    """Delete files that exist, e.g. a catalog and its sidecar indexes"""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def bench_suite(args):
+    """Time the main backend operations and record the results to JSON"""
+    from searchIndex import SearchIndex
+
+    tmp = tempfile.mkdtemp(prefix='folders2csv-bench-')
+    saved_root = BackendHelpers.volumesRoot
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        print(f"{name:<32} {result['mean'] * 1000:>10.1f} {result['min'] * 1000:>9.1f}")
+
+    try:
+        volumes = os.path.join(tmp, 'Volumes')
+        os.mkdir(volumes)
+        BackendHelpers.volumesRoot = volumes
+        drives = make_volume_root(volumes, args.drives, args.folders, args.hidden, odd_names=True, decoys=True)
+        catalog_path = os.path.join(tmp, 'catalog.csv')
+        write_catalog_csv(catalog_path, make_catalog_rows(args.rows, odd_names=True))
+
+        print(f"{'benchmark':<32} {'mean (ms)':>10} {'min (ms)':>9}")
+        record('getDrives', time_runs(BackendHelpers.getDrives, args.runs))
+
+        def list_all_drives():
+            for drive in drives:
+                BackendHelpers.getFolderContents(BackendHelpers.getMasteringFolder(drive), drive)
+        record('getFolderContents', time_runs(list_all_drives, args.runs))
+
+        merge_path = os.path.join(tmp, 'merge.csv')
+        record('process_drives_to_csv (new)', time_runs(
+            lambda: Folders2CSVBackend.process_drives_to_csv(drives, merge_path, use_cache=False),
+            args.runs, lambda: remove_files(merge_path, merge_path + '.keys', merge_path + '.rowidx')))
+        # Every folder is already in the catalog, so this is the dedup path
+        record('process_drives_to_csv (merge)', time_runs(
+            lambda: Folders2CSVBackend.process_drives_to_csv(drives, merge_path, use_cache=False), args.runs))
+
+        record('get_csv_contents', time_runs(lambda: Folders2CSVBackend.get_csv_contents(catalog_path), args.runs))
+        record('validate_csv_file (cold)', time_runs(
+            lambda: Folders2CSVBackend.validate_csv_file(catalog_path), args.runs,
+            lambda: remove_files(catalog_path + '.keys')))
+        record('validate_csv_file (warm)', time_runs(
+            lambda: Folders2CSVBackend.validate_csv_file(catalog_path), args.runs))
+
+        catalog = Folders2CSVBackend.get_csv_contents(catalog_path)
+        record('viewer index build', time_runs(lambda: SearchIndex(catalog), args.runs))
+        index = SearchIndex(catalog)
+
+        def type_query():
+            # Each keystroke narrows the previous result, as in the viewer
+            for end in range(1, len(args.query) + 1):
+                index.search(args.query[:end])
+            index.search('')
+        record('viewer filter (typing)', time_runs(type_query, args.runs))
+        record('viewer filter (paste)', time_runs(lambda: SearchIndex(catalog).search(args.query), args.runs))
+    finally:
+        BackendHelpers.volumesRoot = saved_root
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        'label': args.label,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': get_git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'drives': args.drives,
+            'folders': args.folders,
+            'hidden': args.hidden,
+            'rows': args.rows,
+            'runs': args.runs,
+            'query': args.query,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def bench_compare(args):
+    """Compare two suite result files and flag regressions"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    if baseline.get('parameters') != current.get('parameters'):
+        print("Warning: the runs used different parameters, so timings may not be comparable")
+
+    regressions = []
+    print(f"{'benchmark':<32} {'baseline (ms)':>14} {'current (ms)':>13} {'change':>8}")
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<32} {'-':>14} {result['min'] * 1000:>13.1f} {'new':>8}")
+            continue
+        # Compare the fastest runs, which are the least affected by noise
+        change = result['min'] / before['min'] - 1 if before['min'] else 0
+        flag = ''
+        if change > args.threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<32} {before['min'] * 1000:>14.1f} {result['min'] * 1000:>13.1f} {change:>+8.0%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def bench_generate(args):
+    """Create a fake volume root and catalog on disk for manual testing"""
+    volumes = os.path.join(args.path, 'Volumes')
+    os.makedirs(volumes)
+    drives = make_volume_root(volumes, args.drives, args.folders, args.hidden, args.odd_names, args.decoys)
+    print(f"Created {len(drives)} drives under {volumes}")
+    if args.rows:
+        catalog_path = os.path.join(args.path, 'catalog.csv')
+        write_catalog_csv(catalog_path, make_catalog_rows(args.rows, odd_names=args.odd_names))
+        print(f"Created a catalog with {args.rows} rows at {catalog_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Folders2CSV benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    scan = subparsers.add_parser('scan-scaling', help="drive scan time versus drive count")
+    scan.add_argument('--drives', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    scan.add_argument('--folders', type=int, default=500, help="folders per drive")
+    scan.add_argument('--workers', type=int, default=8, help="parallel workers to compare against serial")
+    scan.add_argument('--latency', type=float, default=0.05,
+                      help="simulated per-drive seek latency in seconds (0 to disable)")
+    scan.set_defaults(func=bench_scan_scaling)
+
+    memory = subparsers.add_parser('catalog-memory', help="catalog load time and memory versus a tuple list")
+    memory.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    memory.set_defaults(func=bench_catalog_memory)
+
+    storage = subparsers.add_parser('storage', help="CSV versus SQLite catalog backends")
+    storage.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    storage.set_defaults(func=bench_storage)
+
+    sharded = subparsers.add_parser('sharded', help="one-drive updates of a CSV versus a sharded catalog")
+    sharded.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    sharded.add_argument('--drives', type=int, default=40, help="drives the rows are spread over")
+    sharded.set_defaults(func=bench_sharded)
+
+    snapshot = subparsers.add_parser('snapshot', help="catalog load time from CSV versus a binary snapshot")
+    snapshot.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    snapshot.set_defaults(func=bench_snapshot)
+
+    fuzzy = subparsers.add_parser('fuzzy', help="fuzzy search latency per query")
+    fuzzy.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    fuzzy.add_argument('--limit', type=int, default=100, help="rows returned per query")
+    fuzzy.set_defaults(func=bench_fuzzy)
+
+    query = subparsers.add_parser('query', help="fielded query latency versus a full scan")
+    query.add_argument('--rows', type=int, default=1000000)
+    query.add_argument('--runs', type=int, default=3)
+    query.set_defaults(func=bench_query)
+
+    federation = subparsers.add_parser('federation', help="search across several catalog files")
+    federation.add_argument('--catalogs', type=int, default=8)
+    federation.add_argument('--rows', type=int, default=100000, help="rows per catalog")
+    federation.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    federation.set_defaults(func=bench_federation)
+
+    server = subparsers.add_parser('server', help="load test of the catalog HTTP service")
+    server.add_argument('--url', help="service to test, e.g. http://127.0.0.1:8765 (default: serve a generated catalog)")
+    server.add_argument('--rows', type=int, default=100000, help="rows of the generated catalog")
+    server.add_argument('--clients', type=int, default=8)
+    server.add_argument('--requests', type=int, default=500, help="requests per client")
+    server.add_argument('--revalidate', type=float, default=0.5,
+                        help="share of repeat requests sent with If-None-Match (default: 0.5)")
+    server.set_defaults(func=bench_server)
+
+    startup = subparsers.add_parser('cli-startup', help="startup time of the command line tool")
+    startup.add_argument('--runs', type=int, default=20)
+    startup.set_defaults(func=bench_cli_startup)
+
+    viewer = subparsers.add_parser('viewer', help="CSV viewer open/scroll/filter latency (needs a display)")
+    viewer.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    viewer.set_defaults(func=bench_viewer)
+
+    deep = subparsers.add_parser('deep-scan', help="deep scan of a large nested tree versus os.walk")
+    deep.add_argument('--clients', type=int, default=200)
+    deep.add_argument('--sessions', type=int, default=50, help="sessions per client")
+    deep.add_argument('--files', type=int, default=47, help="files per session")
+    deep.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    deep.set_defaults(func=bench_deep_scan)
+
+    duplicates = subparsers.add_parser('duplicates', help="staged duplicate search with a cold and warm hash cache")
+    duplicates.add_argument('--drives', type=int, default=8)
+    duplicates.add_argument('--projects', type=int, default=40, help="projects per drive")
+    duplicates.add_argument('--files', type=int, default=12, help="files per project")
+    duplicates.add_argument('--file-size', type=int, default=1024 * 1024, help="bytes per file")
+    duplicates.add_argument('--workers', type=int, nargs='+', default=[1, 4], help="hashing processes to compare")
+    duplicates.set_defaults(func=bench_duplicates)
+
+    progress = subparsers.add_parser('progress-queue', help="progress events per second the UI queue can absorb")
+    progress.add_argument('--events', type=int, default=200000)
+    progress.add_argument('--frame-ms', type=int, default=50, help="interval between drains, as in the GUI")
+    progress.set_defaults(func=bench_progress_queue)
+
+    suite = subparsers.add_parser('suite', help="time the main backend operations and record them to JSON")
+    suite.add_argument('--drives', type=int, default=16)
+    suite.add_argument('--folders', type=int, default=500, help="folders per drive")
+    suite.add_argument('--hidden', type=int, default=5, help="hidden dot-folders per drive")
+    suite.add_argument('--rows', type=int, default=100000, help="rows in the catalog that is loaded and validated")
+    suite.add_argument('--runs', type=int, default=5)
+    suite.add_argument('--query', default="project 0001", help="search typed into the viewer filter")
+    suite.add_argument('--label', help="name for this run, e.g. a version number")
+    suite.add_argument('--output', '-o', help="JSON file to write the results to")
+    suite.set_defaults(func=bench_suite)
+
+    compare = subparsers.add_parser('compare', help="compare two suite result files")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help="slowdown that counts as a regression (default: 0.10 for 10%%)")
+    compare.set_defaults(func=bench_compare)
+
+    generate = subparsers.add_parser('generate', help="create a fake volume root and catalog for manual testing")
+    generate.add_argument('path', help="directory to create (must not exist)")
+    generate.add_argument('--drives', type=int, default=16)
+    generate.add_argument('--folders', type=int, default=500, help="folders per drive")
+    generate.add_argument('--hidden', type=int, default=5, help="hidden dot-folders per drive")
+    generate.add_argument('--rows', type=int, default=0, help="also write a catalog with this many rows")
+    generate.add_argument('--odd-names', action='store_true', help="include awkward drive and folder names")
+    generate.add_argument('--decoys', action='store_true', help="include system volumes that should be skipped")
+    generate.set_defaults(func=bench_generate)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+from array import array
+
+# Value stored in the metadata columns when a row's metadata is not known
+UNKNOWN = -1
+
+# Column numbers, in display order
+COLUMN_FOLDER = 0
+COLUMN_DRIVE = 1
+COLUMN_SIZE = 2
+COLUMN_FILES = 3
+COLUMN_NEWEST = 4
+
+
+class CatalogRow:
+    """Lightweight view of one catalog row, unpackable as (folder, drive)"""
+
+    __slots__ = ('catalog', 'index')
+
+    def __init__(self, catalog, index):
+        self.catalog = catalog
+        self.index = index
+
+    @property
+    def folder(self):
+        return self.catalog.folders[self.index]
+
+    @property
+    def drive(self):
+        return self.catalog.drives[self.catalog.drive_ids[self.index]]
+
+    @property
+    def metadata(self):
+        """(size in bytes, file count, newest mtime), or None if not known"""
+        return self.catalog.get_metadata(self.index)
+
+    def __iter__(self):
+        yield self.folder
+        yield self.drive
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, i):
+        return (self.folder, self.drive)[i]
+
+    def __eq__(self, other):
+        try:
+            return tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"CatalogRow{tuple(self)!r}"
+
+
+class CatalogSelection:
+    """Read-only sequence of a subset of catalog rows, given by row id"""
+
+    __slots__ = ('catalog', 'ids')
+
+    def __init__(self, catalog, ids):
+        self.catalog = catalog
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CatalogRow(self.catalog, i) for i in self.ids[index]]
+        return CatalogRow(self.catalog, self.ids[index])
+
+    def __iter__(self):
+        for i in self.ids:
+            yield CatalogRow(self.catalog, i)
+
+
+class Catalog:
+    """
+    Column-oriented list of (folder, drive) rows.
+    Each distinct drive name is stored once in a drive table and rows refer
+    to it by id, so a catalog with millions of rows and a few dozen drives
+    costs little more than its folder strings.
+    Rows can also carry metadata (size in bytes, file count and newest mtime
+    in whole seconds). The metadata columns are only created once a row has
+    metadata; rows without it hold UNKNOWN.
+    """
+
+    def __init__(self, rows=None):
+        self.folders = []
+        self.drive_ids = array('I')
+        self.drives = []  # Drive name per drive id
+        self.drive_lookup = {}  # Drive name to drive id
+        self.sizes = None  # Metadata columns, created by enable_metadata
+        self.file_counts = None
+        self.newest = None
+        if rows is not None:
+            self.extend(rows)
+
+    @property
+    def has_metadata(self):
+        return self.sizes is not None
+
+    def enable_metadata(self):
+        """Create the metadata columns, marking existing rows as unknown"""
+        if self.sizes is None:
+            unknown = [UNKNOWN] * len(self.folders)
+            self.sizes = array('q', unknown)
+            self.file_counts = array('q', unknown)
+            self.newest = array('q', unknown)
+
+    def get_metadata(self, index):
+        """Get a row's (size, file count, newest mtime), or None if not known"""
+        if self.sizes is None or self.sizes[index] == UNKNOWN:
+            return None
+        return self.sizes[index], self.file_counts[index], self.newest[index]
+
+    def get_drive_id(self, drive):
+        """Get the id of a drive name, adding it to the drive table if needed"""
+        drive_id = self.drive_lookup.get(drive)
+        if drive_id is None:
+            drive_id = self.drive_lookup[drive] = len(self.drives)
+            self.drives.append(drive)
+        return drive_id
+
+    def append(self, folder, drive, metadata=None):
+        """Add one row, with an optional (size, file count, newest mtime)"""
+        if metadata is not None:
+            self.enable_metadata()
+        self.folders.append(folder)
+        self.drive_ids.append(self.get_drive_id(drive))
+        if self.sizes is not None:
+            size, file_count, newest = metadata if metadata is not None else (UNKNOWN, UNKNOWN, UNKNOWN)
+            self.sizes.append(size)
+            self.file_counts.append(file_count)
+            self.newest.append(newest)
+
+    def add_folders(self, folders, drive, metadata=None):
+        """
+        Add many folders that are all on the same drive
+
+        Args:
+            folders (list): Folder names
+            drive (str): Drive name
+            metadata (list): Optional (size, file count, newest mtime) per folder
+        """
+        if metadata is not None:
+            self.enable_metadata()
+        drive_id = self.get_drive_id(drive)
+        start = len(self.folders)
+        self.folders.extend(folders)
+        count = len(self.folders) - start
+        self.drive_ids.extend([drive_id] * count)
+        if self.sizes is not None:
+            if metadata is None:
+                metadata = [(UNKNOWN, UNKNOWN, UNKNOWN)] * count
+            self.sizes.extend(size for size, _, _ in metadata)
+            self.file_counts.extend(file_count for _, file_count, _ in metadata)
+            self.newest.extend(newest for _, _, newest in metadata)
+
+    def extend(self, rows):
+        """
+        Add rows from another catalog or from tuples of
+        (folder, drive) or (folder, drive, size, file count, newest mtime)
+        """
+        if isinstance(rows, Catalog):
+            if rows.sizes is not None:
+                self.enable_metadata()
+            start = len(self.folders)
+            id_map = [self.get_drive_id(drive) for drive in rows.drives]
+            self.folders.extend(rows.folders)
+            self.drive_ids.extend(id_map[drive_id] for drive_id in rows.drive_ids)
+            if self.sizes is not None:
+                if rows.sizes is not None:
+                    self.sizes.extend(rows.sizes)
+                    self.file_counts.extend(rows.file_counts)
+                    self.newest.extend(rows.newest)
+                else:
+                    unknown = [UNKNOWN] * (len(self.folders) - start)
+                    self.sizes.extend(unknown)
+                    self.file_counts.extend(unknown)
+                    self.newest.extend(unknown)
+        else:
+            for row in rows:
+                self.append(row[0], row[1], tuple(row[2:5]) if len(row) >= 5 else None)
+
+    def iter_tuples(self):
+        """Iterate over rows as plain (folder, drive) tuples"""
+        drives = self.drives
+        for folder, drive_id in zip(self.folders, self.drive_ids):
+            yield folder, drives[drive_id]
+
+    def iter_records(self):
+        """
+        Iterate over rows with their metadata
+
+        Yields:
+            tuple: (folder, drive, size, file count, newest mtime), with None
+                for metadata that is not known
+        """
+        if self.sizes is None:
+            for folder, drive in self.iter_tuples():
+                yield folder, drive, None, None, None
+            return
+        drives = self.drives
+        for i, (folder, drive_id) in enumerate(zip(self.folders, self.drive_ids)):
+            if self.sizes[i] == UNKNOWN:
+                yield folder, drives[drive_id], None, None, None
+            else:
+                yield folder, drives[drive_id], self.sizes[i], self.file_counts[i], self.newest[i]
+
+    def get_sort_keys(self, column):
+        """
+        Get a sort key per row for one column
+
+        Args:
+            column (int): One of the COLUMN_ constants
+
+        Returns:
+            sequence: Key for each row id; names sort ignoring case and
+                unknown metadata sorts first
+        """
+        if column == COLUMN_FOLDER:
+            return [folder.lower() for folder in self.folders]
+        if column == COLUMN_DRIVE:
+            drive_keys = [drive.lower() for drive in self.drives]
+            return [drive_keys[drive_id] for drive_id in self.drive_ids]
+        if self.sizes is None:
+            return [UNKNOWN] * len(self.folders)
+        return {COLUMN_SIZE: self.sizes, COLUMN_FILES: self.file_counts, COLUMN_NEWEST: self.newest}[column]
+
+    def sorted_ids(self, column, ids=None, reverse=False):
+        """
+        Get row ids ordered by a column, keeping the original order of ties
+
+        Args:
+            column (int): One of the COLUMN_ constants
+            ids (sequence): Row ids to sort, or None for every row
+            reverse (bool): Sort descending
+
+        Returns:
+            list: Sorted row ids
+        """
+        keys = self.get_sort_keys(column)
+        if ids is None:
+            ids = range(len(self.folders))
+        return sorted(ids, key=keys.__getitem__, reverse=reverse)
+
+    def select(self, ids):
+        """
+        Get a view of some of the rows without copying them
+
+        Args:
+            ids (sequence): Row ids in the order they should appear
+
+        Returns:
+            CatalogSelection: Sequence of the selected rows
+        """
+        return CatalogSelection(self, ids)
+
+    def sort_by_drive(self):
+        """Stable sort of the rows by drive name"""
+        drives = self.drives
+        drive_ids = self.drive_ids
+        order = sorted(range(len(self.folders)), key=lambda i: drives[drive_ids[i]])
+        folders = self.folders
+        self.folders = [folders[i] for i in order]
+        self.drive_ids = array('I', (drive_ids[i] for i in order))
+        if self.sizes is not None:
+            self.sizes = array('q', (self.sizes[i] for i in order))
+            self.file_counts = array('q', (self.file_counts[i] for i in order))
+            self.newest = array('q', (self.newest[i] for i in order))
+
+    def __len__(self):
+        return len(self.folders)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CatalogRow(self, i) for i in range(*index.indices(len(self.folders)))]
+        if index < 0:
+            index += len(self.folders)
+        if not 0 <= index < len(self.folders):
+            raise IndexError("catalog index out of range")
+        return CatalogRow(self, index)
+
+    def __iter__(self):
+        for i in range(len(self.folders)):
+            yield CatalogRow(self, i)
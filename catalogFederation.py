@@ -0,0 +1,193 @@
+import os
+import heapq
+import threading
+from backend import Folders2CSVBackend
+from catalogQuery import compile_query
+from searchIndex import SearchIndex, DEFAULT_FUZZY_LIMIT
+
+# Catalogs read and indexed at the same time
+DEFAULT_FEDERATION_WORKERS = 4
+
+# Search modes
+MODE_CONTAINS = 'contains'
+MODE_FUZZY = 'fuzzy'
+MODE_QUERY = 'query'
+MODES = (MODE_CONTAINS, MODE_FUZZY, MODE_QUERY)
+
+
+class FederatedSource:
+    """One registered catalog file and the index of the version last read"""
+
+    def __init__(self, path, label, default_label=False):
+        self.path = path
+        self.label = label
+        self.default_label = default_label  # Label made up from the path, redone as catalogs are added
+        self.version = None  # (size, mtime_ns) of the file the index was built from
+        self.index = None
+
+    def get_version(self):
+        """Get the (size, mtime_ns) of the catalog file, or None if it is missing"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def load(self, version):
+        """Read and index the catalog; runs in a worker thread, and raises if the catalog can't be read"""
+        self.index = SearchIndex(Folders2CSVBackend.load_catalog(self.path))
+        self.version = version
+
+    def __len__(self):
+        return len(self.index.rows) if self.index is not None else 0
+
+
+class CatalogFederation:
+    """
+    Searches several catalog files as one, e.g. one catalog per studio room
+    and year. Catalogs may be CSV, SQLite or sharded; each is read and
+    indexed once and kept in memory. Before every search the files are
+    checked, and only those whose size or mtime changed since they were read
+    are read again, in a pool of worker threads. Matches are tagged with the
+    label of the catalog they came from.
+    """
+
+    def __init__(self, paths=(), max_workers=DEFAULT_FEDERATION_WORKERS):
+        self.max_workers = max_workers
+        self.sources = {}  # Absolute path to FederatedSource, in the order they were added
+        self.lock = threading.Lock()
+        for path in paths:
+            self.add(path)
+
+    def add(self, path, label=None):
+        """
+        Register a catalog file; it is read by the next search or refresh
+
+        Args:
+            path (str): Path to the catalog CSV or database
+            label (str): Name its matches are tagged with; if not given, the
+                file name without extension, or the path from the folder the
+                catalogs have in common when another catalog has the same name
+
+        Returns:
+            FederatedSource: The registered catalog
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            source = self.sources.get(path)
+            if source is None:
+                source = self.sources[path] = FederatedSource(path, label, default_label=label is None)
+                self.update_labels()
+            return source
+
+    def remove(self, path):
+        """Stop searching a catalog file and drop its index"""
+        with self.lock:
+            if self.sources.pop(os.path.abspath(path), None) is not None:
+                self.update_labels()
+
+    def update_labels(self):
+        """Give every catalog without a given label a unique one; call with the lock held"""
+        defaults = [source for source in self.sources.values() if source.default_label]
+        names = {}
+        for source in defaults:
+            names.setdefault(os.path.splitext(os.path.basename(source.path))[0], []).append(source)
+        # e.g. roomA/2024.csv and roomB/2024.csv are labelled roomA/2024 and roomB/2024
+        for name, same_name in names.items():
+            if len(same_name) == 1:
+                same_name[0].label = name
+                continue
+            parent = os.path.commonpath([os.path.dirname(source.path) for source in same_name])
+            for source in same_name:
+                source.label = os.path.splitext(os.path.relpath(source.path, parent))[0].replace(os.sep, '/')
+        # Anything still taken, like 2024.csv next to 2024.db, gets a number
+        taken = {source.label for source in self.sources.values() if not source.default_label}
+        for source in defaults:
+            label = source.label
+            number = 2
+            while source.label in taken:
+                source.label = f"{label} ({number})"
+                number += 1
+            taken.add(source.label)
+
+    def refresh(self):
+        """
+        Read the catalogs that are new or changed since they were last read
+
+        Returns:
+            list: Labels of the catalogs read; one that fails to read keeps
+                the index of its last version and is tried again next time
+        """
+        # Imported here to keep startup of the command line tool fast
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Searches wait for a refresh in progress, so they never see a half-read catalog
+        with self.lock:
+            stale = []
+            for source in self.sources.values():
+                version = source.get_version()
+                if version is None:
+                    # Missing files drop out until they come back
+                    source.index = source.version = None
+                elif version != source.version:
+                    stale.append((source, version))
+            read = []
+            if stale:
+                workers = max(1, min(self.max_workers, len(stale)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    loads = [executor.submit(source.load, version) for source, version in stale]
+                    for (source, _), load in zip(stale, loads):
+                        try:
+                            load.result()
+                            read.append(source.label)
+                        except Exception as e:
+                            # e.g. a share that dropped out for a moment; its version stays
+                            # unread, so the next search tries again
+                            print(f"Warning: Could not read catalog {source.path}: {e}")
+        return read
+
+    def search(self, query, mode=MODE_CONTAINS, limit=None):
+        """
+        Search every registered catalog, reading changed ones first
+
+        Args:
+            query (str): Text, words or query to search for, depending on the mode
+            mode (str): MODE_CONTAINS for substrings of folder or drive names,
+                MODE_FUZZY for the closest folder names, MODE_QUERY for a
+                fielded query (see catalogQuery.QueryParser)
+            limit (int): Maximum number of matches, None for all of them;
+                fuzzy searches return DEFAULT_FUZZY_LIMIT if not given
+
+        Returns:
+            list: (catalog label, CatalogRow) per match. Fuzzy matches are
+                ranked best first across all catalogs; other matches are
+                grouped by catalog, in the order the catalogs were added
+
+        Raises:
+            QueryError: If the mode is MODE_QUERY and the query can't be parsed
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        # Parsed before reading anything, so a mistake is reported at once
+        compiled = compile_query(query) if mode == MODE_QUERY else None
+        self.refresh()
+        with self.lock:
+            sources = [(source.label, source.index) for source in self.sources.values() if source.index is not None]
+
+        if mode == MODE_FUZZY:
+            limit = limit or DEFAULT_FUZZY_LIMIT
+            ranked = []
+            for position, (_, index) in enumerate(sources):
+                ranked.extend((score, -position, negative_id) for score, negative_id in index.rank_fuzzy(query, limit))
+            return [(sources[-negative_position][0], sources[-negative_position][1].rows[-negative_id])
+                    for _, negative_position, negative_id in heapq.nlargest(limit, ranked)]
+
+        matches = []
+        for label, index in sources:
+            rows = compiled.run(index) if compiled is not None else index.search(query)
+            if limit is not None:
+                rows = rows[:limit - len(matches)]
+            matches.extend((label, row) for row in rows)
+            if limit is not None and len(matches) >= limit:
+                break
+        return matches
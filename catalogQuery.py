@@ -0,0 +1,492 @@
+import re
+import heapq
+import fnmatch
+import datetime
+import functools
+from backendHelpers import BackendHelpers
+from catalog import UNKNOWN
+
+# Compiled queries kept for reuse, e.g. while a query is retyped or the viewer is re-sorted
+QUERY_CACHE_SIZE = 64
+
+FIELD_FOLDER = 'folder'
+FIELD_DRIVE = 'drive'
+FIELD_SIZE = 'size'
+FIELD_FILES = 'files'
+FIELD_NEWEST = 'newest'
+FIELDS = (FIELD_FOLDER, FIELD_DRIVE, FIELD_SIZE, FIELD_FILES, FIELD_NEWEST)
+
+OPERATORS = ('AND', 'OR', 'NOT')
+
+# Size suffixes, in the same 1000-based units the viewer shows
+SIZE_UNITS = {'': 1, 'b': 1, 'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4}
+SIZE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*([kmgt]?b?)', re.I)
+COMPARISON_PATTERN = re.compile(r'(<=|>=|<|>|=)?(.+)')
+# A glob character class, as fnmatch reads it: ']' right after '[' or '[!' is part of the class
+GLOB_CLASS_PATTERN = re.compile(r'\[!?\]?[^\]]*\]')
+
+
+class QueryError(ValueError):
+    """A query that can't be parsed, with a message for the user"""
+
+
+class Term:
+    """One field:value condition"""
+
+    def __init__(self, field, value, kind='text'):
+        """
+        Args:
+            field (str): One of FIELDS, or None to match the folder or drive name
+            value (str): Value as typed, without quotes or regex slashes
+            kind (str): 'text', 'quoted' or 'regex'
+        """
+        self.field = field
+        self.value = value
+        self.kind = kind
+        self.low = self.high = None
+        if field in (FIELD_SIZE, FIELD_FILES, FIELD_NEWEST) or (field == FIELD_DRIVE and Term.is_number_range(value)):
+            self.low, self.high = Term.parse_range(field, value)
+            self.match_text = None
+        else:
+            self.match_text = Term.get_text_matcher(value, kind)
+
+    @staticmethod
+    def is_number_range(value):
+        """Check if a drive value is a drive number or range rather than a name"""
+        return re.fullmatch(r'(<=|>=|<|>|=)?\d+|\d*(-|\.\.)\d*', value) is not None and value not in ('-', '..')
+
+    @staticmethod
+    def get_text_matcher(value, kind):
+        """Get a function that tests a lowercase name: a regex search, a glob or a substring test"""
+        if kind == 'regex':
+            try:
+                return re.compile(value, re.I).search
+            except re.error as e:
+                raise QueryError(f"Invalid regular expression /{value}/: {e}")
+        value = value.lower()
+        if kind == 'text' and ('*' in value or '?' in value):
+            return re.compile(fnmatch.translate(value), re.S).match
+        return lambda name: value in name
+
+    @staticmethod
+    def parse_value(field, text):
+        """
+        Parse one value of a numeric field
+
+        Returns:
+            tuple: (first, last) number the value stands for; a date without
+                a time stands for every second of that day
+        """
+        text = text.strip()
+        try:
+            if field == FIELD_SIZE:
+                m = SIZE_PATTERN.fullmatch(text)
+                if m is None:
+                    raise ValueError(text)
+                unit = m.group(2).lower()
+                if unit and not unit.endswith('b'):
+                    unit += 'b'
+                size = int(float(m.group(1)) * SIZE_UNITS[unit])
+                return size, size
+            if field == FIELD_NEWEST:
+                start = int(datetime.datetime.fromisoformat(text).timestamp())
+                return (start, start) if len(text) > 10 else (start, start + 86399)
+            number = int(text)
+            return number, number
+        except ValueError:
+            raise QueryError(f"Invalid {field} value: {text}")
+
+    @staticmethod
+    def parse_range(field, value):
+        """
+        Parse a comparison (>10, <=2GB), a range (10-20, 2024-01-01..2024-06-30) or a single value
+
+        Returns:
+            tuple: (low, high) bounds, inclusive; None for an open end
+        """
+        # Dates contain '-', so they only take '..' ranges
+        separator = '..' if '..' in value or field == FIELD_NEWEST else '-'
+        if separator in value and not value.startswith(('<', '>', '=')):
+            low, high = value.split(separator, 1)
+            return (Term.parse_value(field, low)[0] if low else None,
+                    Term.parse_value(field, high)[1] if high else None)
+        operator, text = COMPARISON_PATTERN.fullmatch(value).groups()
+        first, last = Term.parse_value(field, text)
+        if operator == '>':
+            return last + 1, None
+        if operator == '>=':
+            return first, None
+        if operator == '<':
+            return None, first - 1
+        if operator == '<=':
+            return None, last
+        return first, last
+
+    def in_range(self, number):
+        return (self.low is None or number >= self.low) and (self.high is None or number <= self.high)
+
+    def get_drive_ids(self, index):
+        """Get the ids of the drives this term can match on, or None if it doesn't depend on the drive"""
+        if self.field != FIELD_DRIVE:
+            return None
+        if self.match_text is not None:
+            return {drive_id for drive_id, key in enumerate(index.drive_keys) if self.match_text(key)}
+        drive_ids = set()
+        for drive_id, drive in enumerate(index.rows.drives):
+            number = BackendHelpers.getDriveNumber(drive)
+            if number is not None and self.in_range(number):
+                drive_ids.add(drive_id)
+        return drive_ids
+
+    def get_candidates(self, index):
+        """Get a sorted superset of the matching row ids from the trigram index, or None"""
+        if self.match_text is None or self.kind == 'regex' or self.field not in (None, FIELD_FOLDER):
+            return None
+        if self.kind == 'text' and ('*' in self.value or '?' in self.value):
+            if self.field is None:
+                return None
+            # The longest literal part of a glob has to be in the name; a
+            # character class stands for one unknown character, like '?'
+            pattern = GLOB_CLASS_PATTERN.sub('?', self.value.lower())
+            literal = max(re.split(r'[*?]+', pattern), key=len)
+            return index.find_folder_candidates(literal) if len(literal) >= 3 else None
+        # Text too short for a trigram would be checked against every row anyway
+        if len(self.value) < 3:
+            return None
+        if self.field is None:
+            # Matches on the drive name too, which the substring search covers
+            return index.search(self.value).ids
+        return index.find_folder_candidates(self.value.lower())
+
+    def compile(self, index):
+        """Get a function of a row id that tests this term"""
+        if self.field == FIELD_DRIVE:
+            drive_ids = self.get_drive_ids(index)
+            row_drives = index.row_drives
+            return lambda row_id: row_drives[row_id] in drive_ids
+        if self.field in (FIELD_SIZE, FIELD_FILES, FIELD_NEWEST):
+            rows = index.rows
+            if rows.sizes is None:
+                return lambda row_id: False
+            column = {FIELD_SIZE: rows.sizes, FIELD_FILES: rows.file_counts, FIELD_NEWEST: rows.newest}[self.field]
+            # Unknown metadata is UNKNOWN in every column, so it is left out by the low bound
+            low = max(self.low, UNKNOWN + 1) if self.low is not None else UNKNOWN + 1
+            high = self.high if self.high is not None else float('inf')
+            return lambda row_id: low <= column[row_id] <= high
+        folder_keys = index.folder_keys
+        match_text = self.match_text
+        if self.field == FIELD_FOLDER:
+            return lambda row_id: match_text(folder_keys[row_id])
+        # Unfielded terms match the folder or the drive name, like the plain search
+        drive_ids = {drive_id for drive_id, key in enumerate(index.drive_keys) if match_text(key)}
+        row_drives = index.row_drives
+        return lambda row_id: row_drives[row_id] in drive_ids or match_text(folder_keys[row_id])
+
+    def __repr__(self):
+        return f"Term({self.field!r}, {self.value!r}, {self.kind!r})"
+
+
+class And:
+    """Rows matching every part"""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def get_drive_ids(self, index):
+        drive_ids = None
+        for part in self.parts:
+            part_ids = part.get_drive_ids(index)
+            if part_ids is not None:
+                drive_ids = part_ids if drive_ids is None else drive_ids & part_ids
+        return drive_ids
+
+    def get_candidates(self, index):
+        # Intersecting the smallest first keeps the sets small
+        candidates = [ids for ids in (part.get_candidates(index) for part in self.parts) if ids is not None]
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for ids in candidates[1:]:
+            if not result:
+                break
+            result.intersection_update(ids)
+        return sorted(result)
+
+    def compile(self, index):
+        return functools.reduce(And.both, [part.compile(index) for part in self.parts])
+
+    @staticmethod
+    def both(first, second):
+        return lambda row_id: first(row_id) and second(row_id)
+
+    def __repr__(self):
+        return f"And({self.parts!r})"
+
+
+class Or:
+    """Rows matching any part"""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def get_drive_ids(self, index):
+        drive_ids = set()
+        for part in self.parts:
+            part_ids = part.get_drive_ids(index)
+            if part_ids is None:
+                return None
+            drive_ids |= part_ids
+        return drive_ids
+
+    def get_candidates(self, index):
+        candidates = set()
+        for part in self.parts:
+            ids = part.get_candidates(index)
+            if ids is None:
+                return None
+            candidates.update(ids)
+        return sorted(candidates)
+
+    def compile(self, index):
+        return functools.reduce(Or.either, [part.compile(index) for part in self.parts])
+
+    @staticmethod
+    def either(first, second):
+        return lambda row_id: first(row_id) or second(row_id)
+
+    def __repr__(self):
+        return f"Or({self.parts!r})"
+
+
+class Not:
+    """Rows not matching a part"""
+
+    def __init__(self, part):
+        self.part = part
+
+    def get_drive_ids(self, index):
+        # Only a condition on the drive alone rules drives out when negated
+        if isinstance(self.part, Term) and self.part.field == FIELD_DRIVE:
+            return set(range(len(index.rows.drives))) - self.part.get_drive_ids(index)
+        return None
+
+    def get_candidates(self, index):
+        return None
+
+    def compile(self, index):
+        test = self.part.compile(index)
+        return lambda row_id: not test(row_id)
+
+    def __repr__(self):
+        return f"Not({self.part!r})"
+
+
+class QueryParser:
+    """
+    Parser for catalog queries:
+
+        mix                     folder or drive name contains "mix"
+        "final mix"             the words together, as one phrase
+        folder:*mix*            glob over the whole folder name
+        folder:/^\\d{4} /        regular expression, ignoring case
+        drive:12  drive:10-20  drive:>=30
+                                Audio Archive drive numbers
+        drive:backup            drive name contains "backup"
+        size:>1GB  files:<10  newest:2024-01-01..2024-06-30
+                                folder metadata, when it was recorded
+        a b, a AND b            both
+        a OR b                  either; binds looser than AND
+        -a, NOT a               not
+        (a OR b) c              grouping
+        drive:(12 OR backup)    the field applies to every term in the group
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = list(QueryParser.tokenize(text))
+        self.position = 0
+        self.field = None  # Field of the group being parsed, for its terms without one
+
+    @staticmethod
+    def tokenize(text):
+        """
+        Split a query into tokens
+
+        Yields:
+            tuple: ('(' | ')' | 'AND' | 'OR' | 'NOT', None), ('term', Term), or
+                ('field', field name) before the '(' of a grouped field value
+        """
+        i = 0
+        length = len(text)
+        while i < length:
+            char = text[i]
+            if char.isspace():
+                i += 1
+                continue
+            if char in '()':
+                yield char, None
+                i += 1
+                continue
+            if char == '-' and i + 1 < length and not text[i + 1].isspace():
+                yield 'NOT', None
+                i += 1
+                continue
+
+            field = None
+            m = re.match(r'([A-Za-z]+):', text[i:])
+            if m and m.group(1).lower() in FIELDS:
+                field = m.group(1).lower()
+                i += m.end()
+                if i >= length or text[i].isspace() or text[i] == ')':
+                    raise QueryError(f"Missing value after {field}:")
+                if text[i] == '(':
+                    yield 'field', field
+                    continue
+
+            if i < length and text[i] in '"/':
+                # Quoted phrase or regular expression, with backslash escapes
+                quote = text[i]
+                end = i + 1
+                value = []
+                while end < length and text[end] != quote:
+                    if text[end] == '\\' and end + 1 < length:
+                        # Regexes keep their escapes; phrases drop them
+                        if quote == '/' and text[end + 1] != '/':
+                            value.append('\\')
+                        end += 1
+                    value.append(text[end])
+                    end += 1
+                if end >= length:
+                    raise QueryError(f"Missing closing {quote} in query")
+                yield 'term', Term(field, ''.join(value), 'regex' if quote == '/' else 'quoted')
+                i = end + 1
+                continue
+
+            end = i
+            while end < length and not text[end].isspace() and text[end] not in '()':
+                end += 1
+            word = text[i:end]
+            i = end
+            if field is None and word in OPERATORS:
+                yield word, None
+            else:
+                yield 'term', Term(field, word)
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        """
+        Parse the whole query
+
+        Returns:
+            Term, And, Or or Not: Root of the query tree, or None for an empty query
+        """
+        if not self.tokens:
+            return None
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError(f"Unexpected {self.peek()} in query")
+        return node
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else Or(parts)
+
+    def parse_and(self):
+        parts = [self.parse_unary()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            parts.append(self.parse_unary())
+        return parts[0] if len(parts) == 1 else And(parts)
+
+    def parse_unary(self):
+        kind = self.peek()
+        if kind is None:
+            raise QueryError("Query ends too early")
+        if kind == 'NOT':
+            self.take()
+            return Not(self.parse_unary())
+        if kind == '(':
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise QueryError("Missing ) in query")
+            self.take()
+            return node
+        if kind == 'field':
+            outer = self.field
+            self.field = self.take()[1]
+            try:
+                return self.parse_unary()
+            finally:
+                self.field = outer
+        if kind == 'term':
+            term = self.take()[1]
+            if term.field is None and self.field is not None:
+                term = Term(self.field, term.value, term.kind)
+            return term
+        raise QueryError(f"Unexpected {kind} in query")
+
+
+class CompiledQuery:
+    """
+    A parsed query, ready to run against any SearchIndex.
+    Running it first works out which drives can match at all from the drive
+    table alone, then narrows the rows further with the trigram index for
+    text that must be in the folder name, and only then tests the remaining
+    rows one by one.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.root = QueryParser(text).parse()
+
+    def run(self, index):
+        """
+        Find the rows matching the query
+
+        Args:
+            index (SearchIndex): Index of the catalog to search
+
+        Returns:
+            CatalogSelection: Matching rows in catalog order
+        """
+        if self.root is None:
+            return index.rows
+        drive_ids = self.root.get_drive_ids(index)
+        candidates = self.root.get_candidates(index)
+        if drive_ids is not None:
+            if not drive_ids:
+                return index.rows.select([])
+            if candidates is None:
+                # Whole drives are skipped without looking at their folders
+                candidates = heapq.merge(*(index.drive_rows[drive_id] for drive_id in sorted(drive_ids)))
+            else:
+                row_drives = index.row_drives
+                candidates = [row_id for row_id in candidates if row_drives[row_id] in drive_ids]
+        elif candidates is None:
+            candidates = range(len(index.rows))
+        test = self.root.compile(index)
+        return index.rows.select([row_id for row_id in candidates if test(row_id)])
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(text):
+    """
+    Parse a query, reusing the result for recently seen queries
+
+    Raises:
+        QueryError: If the query can't be parsed
+    """
+    return CompiledQuery(text)
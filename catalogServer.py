@@ -0,0 +1,355 @@
+import io
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from backend import Folders2CSVBackend
+from catalogFederation import MODE_CONTAINS, MODE_FUZZY, MODE_QUERY, MODES
+from catalogQuery import compile_query, QueryError
+from catalogStorage import get_catalog_storage, CsvCatalogStorage
+from csvCatalog import CsvCatalog
+from searchIndex import DEFAULT_FUZZY_LIMIT, SearchIndex
+
+# Only this machine can connect unless another address is given
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Rows per page of search results and listings
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Responses kept per catalog version, since many clients ask the same things
+RESPONSE_CACHE_SIZE = 256
+
+# Bytes before the end of the CSV as last read that must be unchanged for
+# growth of the file to be read as appended rows rather than a rewrite
+APPEND_CHECK_BYTES = 4096
+
+
+class RequestError(ValueError):
+    """A request with missing or invalid parameters, answered with 400"""
+
+
+class CatalogUnavailable(OSError):
+    """The catalog couldn't be read, answered with 503 until a read succeeds"""
+
+
+class CatalogService:
+    """
+    A catalog kept indexed in memory for answering many lookups.
+    Before every request the file is stat'ed. If a CSV catalog only grew,
+    as it does when drives are merged into it, just the new rows are read
+    and added to the index; any other change reads the catalog again. Each
+    version of the file has its own ETag, so clients can revalidate cached
+    responses without the service running the search again.
+    """
+
+    def __init__(self, catalog_path):
+        self.catalog_path = catalog_path
+        self.is_csv = isinstance(get_catalog_storage(catalog_path), CsvCatalogStorage)
+        self.index = None
+        self.version = None  # (size, mtime_ns) of the file the index is up to date with
+        self.read_size = 0  # Bytes of the CSV read into the index
+        self.tail_digest = None  # Digest of the last APPEND_CHECK_BYTES of those
+        self.etag = None
+        self.reloads = 0
+        self.appends = 0
+        self.responses = OrderedDict()  # Request key to response data, for the current version
+        # Held while a request reads the index, so it never changes under one
+        self.lock = threading.Lock()
+
+    def get_tail_digest(self, f, size):
+        """Hash the APPEND_CHECK_BYTES of an open CSV ending at size"""
+        start = max(0, size - APPEND_CHECK_BYTES)
+        f.seek(start)
+        return hashlib.blake2b(f.read(size - start), digest_size=16).digest()
+
+    def refresh(self):
+        """
+        Bring the index up to date with the catalog file; call with the lock held
+
+        Returns:
+            bool: True if the index changed
+
+        Raises:
+            CatalogUnavailable: If the catalog can't be read; the index and its
+                ETag stay at the last version read, and the next request tries again
+        """
+        try:
+            st = os.stat(self.catalog_path)
+            version = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            version = None
+        if self.index is not None and version == self.version:
+            return False
+        if not (version is not None and self.index is not None and self.is_csv and self.append_rows(version)):
+            self.reload(version)
+        self.version = version
+        self.responses.clear()
+        self.etag = '"{}"'.format(hashlib.blake2b(repr((self.catalog_path, version)).encode('utf-8'),
+                                                  digest_size=8).hexdigest())
+        return True
+
+    def reload(self, version):
+        """Read and index the whole catalog"""
+        # A failed read must not be indexed, and cached by clients, as an empty catalog
+        try:
+            index = SearchIndex(Folders2CSVBackend.load_catalog(self.catalog_path))
+        except Exception as e:
+            raise CatalogUnavailable(f"Could not read catalog: {e}")
+        # Built now rather than by the first fuzzy search, which would hold up every client
+        index.build_word_index()
+        self.index = index
+        self.reloads += 1
+        self.read_size = 0
+        self.tail_digest = None
+        if self.is_csv and version is not None:
+            try:
+                st = os.stat(self.catalog_path)
+                # If the file changed while it was read, the next refresh reads it again in full
+                if (st.st_size, st.st_mtime_ns) == version:
+                    with open(self.catalog_path, 'rb') as f:
+                        self.read_size = version[0]
+                        self.tail_digest = self.get_tail_digest(f, self.read_size)
+            except OSError:
+                pass
+
+    def append_rows(self, version):
+        """
+        Add the rows appended to the CSV since it was last read
+
+        Returns:
+            bool: False if the file was rewritten rather than appended to
+        """
+        if self.tail_digest is None or version[0] < self.read_size:
+            return False
+        catalog = CsvCatalog(self.catalog_path)
+        try:
+            with open(self.catalog_path, 'rb') as f:
+                if self.get_tail_digest(f, self.read_size) != self.tail_digest:
+                    return False
+                f.seek(self.read_size)
+                data = f.read(version[0] - self.read_size)
+        except OSError:
+            return False
+        # A record still being written is left for the next refresh
+        complete = 0
+        for start, record in CsvCatalog.iter_records(io.BytesIO(data)):
+            if record.endswith(b'\n') and record.count(b'"') % 2 == 0:
+                complete = start + len(record)
+        self.index.add_rows(catalog.parse_records(data[:complete]))
+        self.read_size += complete
+        with open(self.catalog_path, 'rb') as f:
+            self.tail_digest = self.get_tail_digest(f, self.read_size)
+        self.appends += 1
+        return True
+
+    def run(self, request, key=None, if_none_match=None):
+        """
+        Answer a request from the up to date index
+
+        Args:
+            request (callable): Given the SearchIndex, returns the response data
+            key (tuple): Identifies the request for the response cache; None to not cache it
+            if_none_match (str): If-None-Match header of the request
+
+        Returns:
+            tuple: (ETag of the catalog version, response data, or None if
+                the client's copy matches the ETag)
+        """
+        with self.lock:
+            self.refresh()
+            if if_none_match is not None and self.etag in (tag.strip() for tag in if_none_match.split(',')):
+                return self.etag, None
+            data = self.responses.get(key) if key is not None else None
+            if data is None:
+                data = request(self.index)
+                if key is not None:
+                    self.responses[key] = data
+                    if len(self.responses) > RESPONSE_CACHE_SIZE:
+                        self.responses.popitem(last=False)
+            else:
+                self.responses.move_to_end(key)
+            return self.etag, data
+
+    @staticmethod
+    def get_record(row):
+        """Get a catalog row as a JSON object, with its metadata if known"""
+        record = {'folder': row.folder, 'drive': row.drive}
+        metadata = row.metadata
+        if metadata is not None:
+            size, file_count, newest = metadata
+            # Folders without files have no newest mtime
+            record.update(size=size, files=file_count, newest=newest if newest >= 0 else None)
+        return record
+
+    @staticmethod
+    def get_page(rows, offset, limit):
+        """Get a page of a row sequence as JSON data"""
+        return {'total': len(rows), 'offset': offset,
+                'rows': [CatalogService.get_record(row) for row in rows[offset:offset + limit]]}
+
+    def search(self, query, mode=MODE_CONTAINS, offset=0, limit=DEFAULT_PAGE_SIZE, if_none_match=None):
+        """
+        Search the catalog
+
+        Args:
+            query (str): Text, words or query to search for, depending on the mode
+            mode (str): MODE_CONTAINS, MODE_FUZZY (closest folder names first)
+                or MODE_QUERY (see catalogQuery.QueryParser)
+            offset (int): Index of the first match to return
+            limit (int): Maximum number of matches to return
+
+        Returns:
+            tuple: (ETag, dict with total, offset and rows, or None if not modified)
+
+        Raises:
+            RequestError: If the mode is unknown or the query can't be parsed
+        """
+        if mode not in MODES:
+            raise RequestError(f"Unknown search mode: {mode}")
+        compiled = None
+        if mode == MODE_QUERY:
+            try:
+                compiled = compile_query(query)
+            except QueryError as e:
+                raise RequestError(f"Invalid query: {e}")
+
+        def request(index):
+            if mode == MODE_FUZZY:
+                rows = index.fuzzy_search(query, max(DEFAULT_FUZZY_LIMIT, offset + limit))
+            elif compiled is not None:
+                rows = compiled.run(index)
+            else:
+                rows = index.search(query)
+            return dict(CatalogService.get_page(rows, offset, limit), query=query, mode=mode)
+
+        return self.run(request, ('search', query, mode, offset, limit), if_none_match)
+
+    def lookup(self, folder, if_none_match=None):
+        """
+        Find the drives a folder is on, matching its whole name case-insensitively
+
+        Returns:
+            tuple: (ETag, dict with the folder and its rows, or None if not modified)
+        """
+        key = folder.strip().lower()
+
+        def request(index):
+            folder_keys = index.folder_keys
+            ids = [row_id for row_id in index.find_folder_candidates(key) if folder_keys[row_id] == key]
+            return {'folder': folder, 'rows': [CatalogService.get_record(row) for row in index.rows.select(ids)]}
+
+        return self.run(request, ('lookup', key), if_none_match)
+
+    def list_rows(self, offset=0, limit=DEFAULT_PAGE_SIZE, if_none_match=None):
+        """
+        Get a page of the catalog in file order
+
+        Returns:
+            tuple: (ETag, dict with total, offset and rows, or None if not modified)
+        """
+        return self.run(lambda index: CatalogService.get_page(index.rows, offset, limit), ('rows', offset, limit),
+                        if_none_match)
+
+    def get_status(self):
+        """Get the size of the catalog and how often it was read"""
+        def request(index):
+            return {'catalog': self.catalog_path, 'rows': len(index.rows), 'drives': len(index.rows.drives),
+                    'reloads': self.reloads, 'appends': self.appends}
+
+        return self.run(request)
+
+
+class CatalogRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON endpoints of a CatalogService:
+
+        GET /search?q=velvet&mode=contains|fuzzy|query&offset=0&limit=100
+        GET /lookup?folder=Client%20X   drives a folder is on
+        GET /rows?offset=0&limit=100    the catalog in file order
+        GET /status
+    """
+
+    # Keeps connections open between requests of the same client
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are sent separately; without this each response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    server_version = 'Folders2CSV'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        service = self.server.service
+        if_none_match = self.headers.get('If-None-Match')
+        try:
+            if url.path == '/search':
+                etag, data = service.search(params.get('q', ''), params.get('mode', MODE_CONTAINS),
+                                            *self.get_paging(params), if_none_match=if_none_match)
+            elif url.path == '/lookup':
+                if 'folder' not in params:
+                    raise RequestError("Missing parameter: folder")
+                etag, data = service.lookup(params['folder'], if_none_match)
+            elif url.path == '/rows':
+                etag, data = service.list_rows(*self.get_paging(params), if_none_match=if_none_match)
+            elif url.path == '/status':
+                etag, data = None, service.get_status()[1]
+            else:
+                self.send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown endpoint: {url.path}"})
+                return
+        except RequestError as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+            return
+        except CatalogUnavailable as e:
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)})
+            return
+        if data is None:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_json(HTTPStatus.OK, data, etag)
+
+    @staticmethod
+    def get_paging(params):
+        """Get the (offset, limit) of a request"""
+        try:
+            offset = int(params.get('offset', 0))
+            limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise RequestError("offset and limit must be whole numbers")
+        if offset < 0 or not 0 < limit <= MAX_PAGE_SIZE:
+            raise RequestError(f"offset must be 0 or more and limit 1 to {MAX_PAGE_SIZE}")
+        return offset, limit
+
+    def send_json(self, status, data, etag=None):
+        """Send a JSON response"""
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class CatalogServer(ThreadingHTTPServer):
+    """HTTP server answering each client in its own thread"""
+
+    daemon_threads = True
+
+    def __init__(self, service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__((host, port), CatalogRequestHandler)
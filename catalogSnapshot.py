@@ -0,0 +1,316 @@
+import os
+import mmap
+import zlib
+import struct
+from array import array
+from backendHelpers import BackendHelpers
+from catalog import Catalog, UNKNOWN
+from csvCatalog import CsvCatalog
+
+# Binary copy of the catalog kept next to the CSV for fast loading
+SNAPSHOT_SUFFIX = '.snap'
+SNAPSHOT_MAGIC = b'F2CS'
+SNAPSHOT_VERSION = 2
+# magic, version, csv size, csv mtime_ns, row count, drive count, flags, rows per compressed block,
+# reserved; 48 bytes, so the sections after it start 8-byte aligned
+SNAPSHOT_HEADER = struct.Struct('<4sIQQQIIII')
+
+FLAG_METADATA = 1
+FLAG_COMPRESSED = 2
+
+# Rows whose folder names are compressed together; one block is inflated per lookup
+COMPRESSED_BLOCK_ROWS = 4096
+# Inflated blocks kept for repeated lookups, e.g. while scrolling
+BLOCK_CACHE_SIZE = 8
+
+# Folder names can't contain NUL, so it separates them in the string table
+SEPARATOR = b'\0'
+
+
+class CatalogSnapshot:
+    """
+    Binary snapshot of a catalog CSV, stamped with the CSV's size and mtime.
+    The file is a header followed by 8-byte aligned sections, each prefixed
+    with its length:
+
+        drive names     NUL-separated UTF-8
+        folder offsets  uint64 per row plus one, into the folder string table
+        drive ids       uint32 per row
+        metadata        three int64 arrays (size, files, newest), if present
+        block offsets   uint64 per block plus one, if compressed
+        folder names    NUL-separated UTF-8, as one blob or as zlib blocks
+
+    Opening it maps the file instead of reading it, so a page or a single row
+    only touches the bytes it needs, and loading the whole catalog decodes
+    the string table in one call instead of parsing CSV row by row. A
+    snapshot whose stamp doesn't match the CSV is stale and gets rebuilt.
+    Snapshots are only written for catalogs that asked for one, since each
+    takes about as much disk space as the CSV.
+    """
+
+    def __init__(self, csv_file_path):
+        self.csv_file_path = csv_file_path
+        self.path = csv_file_path + SNAPSHOT_SUFFIX
+
+    def exists(self):
+        """Check if the catalog has a snapshot, up to date or not"""
+        return os.path.exists(self.path)
+
+    def get_csv_version(self):
+        """Get the (size, mtime_ns) of the CSV"""
+        st = os.stat(self.csv_file_path)
+        return st.st_size, st.st_mtime_ns
+
+    def build(self, catalog=None, compress=False):
+        """
+        Write the snapshot for the current version of the CSV
+
+        Args:
+            catalog (Catalog): Contents of the CSV, read from it if not given
+            compress (bool): Compress the folder names in blocks
+
+        Returns:
+            Catalog: The catalog the snapshot was written from
+        """
+        # Stamp the version read, so an edit made while reading leaves the snapshot stale
+        size, mtime_ns = self.get_csv_version()
+        if catalog is None:
+            catalog = BackendHelpers.getCsvContents(self.csv_file_path)
+        row_count = len(catalog)
+
+        encoded = [folder.encode('utf-8') for folder in catalog.folders]
+        offsets = array('Q', [0])
+        position = 0
+        for name in encoded:
+            position += len(name) + 1
+            offsets.append(position)
+        blob = SEPARATOR.join(encoded) + SEPARATOR if encoded else b''
+
+        flags = FLAG_METADATA if catalog.has_metadata else 0
+        sections = [SEPARATOR.join(drive.encode('utf-8') for drive in catalog.drives), offsets.tobytes(),
+                    catalog.drive_ids.tobytes()]
+        if catalog.has_metadata:
+            sections.extend((catalog.sizes.tobytes(), catalog.file_counts.tobytes(), catalog.newest.tobytes()))
+        if compress:
+            flags |= FLAG_COMPRESSED
+            blocks = []
+            block_offsets = array('Q', [0])
+            for start in range(0, row_count, COMPRESSED_BLOCK_ROWS):
+                end = min(start + COMPRESSED_BLOCK_ROWS, row_count)
+                blocks.append(zlib.compress(blob[offsets[start]:offsets[end]], 6))
+                block_offsets.append(block_offsets[-1] + len(blocks[-1]))
+            sections.extend((block_offsets.tobytes(), b''.join(blocks)))
+        else:
+            sections.append(blob)
+
+        def write(f):
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, size, mtime_ns, row_count,
+                                         len(catalog.drives), flags, COMPRESSED_BLOCK_ROWS, 0))
+            for section in sections:
+                f.write(struct.pack('<Q', len(section)))
+                f.write(section)
+                f.write(b'\0' * (-len(section) % 8))
+
+        try:
+            CsvCatalog.write_atomic(self.path, write, 'wb')
+        except OSError as e:
+            print(f"Warning: Could not write catalog snapshot: {e}")
+        return catalog
+
+    def open(self):
+        """
+        Map the snapshot if it matches the current version of the CSV
+
+        Returns:
+            SnapshotView: Open view of the snapshot, or None if it is missing or stale
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(SNAPSHOT_HEADER.size)
+                if len(header) != SNAPSHOT_HEADER.size:
+                    return None
+                magic, version, size, mtime_ns = SNAPSHOT_HEADER.unpack(header)[:4]
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    return None
+                if (size, mtime_ns) != self.get_csv_version():
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            return SnapshotView(mapped)
+        except (ValueError, TypeError, struct.error):
+            # Truncated or corrupt; rebuilt like a stale one
+            return None
+
+    def read_flags(self):
+        """Get the flags of the snapshot on disk, stale or not, or 0 if there is none"""
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(SNAPSHOT_HEADER.size)
+            magic, version = SNAPSHOT_HEADER.unpack(header)[:2]
+            if magic == SNAPSHOT_MAGIC and version == SNAPSHOT_VERSION:
+                return SNAPSHOT_HEADER.unpack(header)[6]
+        except (OSError, struct.error):
+            pass
+        return 0
+
+    def load(self, compress=None):
+        """
+        Load the catalog from the snapshot, rebuilding it from the CSV if it is stale
+
+        Args:
+            compress (bool): Compress the folder names if the snapshot is
+                rebuilt; None keeps the setting of the stale snapshot
+
+        Returns:
+            Catalog: Catalog of folder names and drive names
+        """
+        view = self.open()
+        if view is None:
+            if compress is None:
+                compress = bool(self.read_flags() & FLAG_COMPRESSED)
+            return self.build(compress=compress)
+        try:
+            return view.to_catalog()
+        finally:
+            view.close()
+
+    def remove(self):
+        """Delete the snapshot"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SnapshotView:
+    """
+    Read-only rows of a mapped snapshot.
+    Offsets, drive ids and metadata are memoryviews over the mapping, so
+    nothing is read until a row is asked for.
+    """
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+        self.buffer = memoryview(mapped)
+        (_, _, _, _, self.row_count, drive_count, flags,
+         self.block_rows, _) = SNAPSHOT_HEADER.unpack_from(self.buffer)
+        self.compressed = bool(flags & FLAG_COMPRESSED)
+        self.position = SNAPSHOT_HEADER.size
+        self.sizes = self.file_counts = self.newest = self.block_offsets = None
+        self.blocks = {}  # Block number to inflated bytes
+        try:
+            drive_names = bytes(self.read_section())
+            self.drives = drive_names.decode('utf-8').split('\0') if drive_count else []
+            self.offsets = self.read_section().cast('Q')
+            self.drive_ids = self.read_section().cast('I')
+            if flags & FLAG_METADATA:
+                self.sizes = self.read_section().cast('q')
+                self.file_counts = self.read_section().cast('q')
+                self.newest = self.read_section().cast('q')
+            if self.compressed:
+                self.block_offsets = self.read_section().cast('Q')
+            self.names = self.read_section()
+            if (len(self.offsets) != self.row_count + 1 or len(self.drive_ids) != self.row_count or
+                    len(self.drives) != drive_count):
+                raise ValueError("snapshot sections don't match its header")
+        except BaseException:
+            self.close()
+            raise
+
+    def read_section(self):
+        """Get the next section as a memoryview and move past it"""
+        length, = struct.unpack_from('<Q', self.buffer, self.position)
+        start = self.position + 8
+        end = start + length
+        if end > len(self.buffer):
+            raise ValueError("snapshot is truncated")
+        self.position = end + (-length % 8)
+        return self.buffer[start:end]
+
+    def get_block(self, block):
+        """Get the folder names of one compressed block, inflating it if needed"""
+        data = self.blocks.get(block)
+        if data is None:
+            if len(self.blocks) >= BLOCK_CACHE_SIZE:
+                del self.blocks[next(iter(self.blocks))]
+            data = self.blocks[block] = zlib.decompress(
+                self.names[self.block_offsets[block]:self.block_offsets[block + 1]])
+        return data
+
+    def get_names(self, start, end):
+        """Get the string table bytes of rows start to end"""
+        if not self.compressed:
+            return bytes(self.names[self.offsets[start]:self.offsets[end]])
+        parts = []
+        row = start
+        while row < end:
+            block = row // self.block_rows
+            base = self.offsets[block * self.block_rows]
+            block_end = min(end, (block + 1) * self.block_rows)
+            parts.append(self.get_block(block)[self.offsets[row] - base:self.offsets[block_end] - base])
+            row = block_end
+        return b''.join(parts)
+
+    def get_folders(self, start, end):
+        """Get the folder names of rows start to end"""
+        if start >= end:
+            return []
+        return self.get_names(start, end)[:-1].decode('utf-8').split('\0')
+
+    def get_metadata(self, index):
+        """Get a row's (size, file count, newest mtime), or None if not known"""
+        if self.sizes is None or self.sizes[index] == UNKNOWN:
+            return None
+        return self.sizes[index], self.file_counts[index], self.newest[index]
+
+    def get_page(self, offset, limit):
+        """
+        Get a page of rows, reading only their part of the snapshot
+
+        Returns:
+            tuple: (rows: list of (folder name, drive name) tuples, total row count: int)
+        """
+        end = min(self.row_count, offset + limit)
+        folders = self.get_folders(offset, end)
+        drives = self.drives
+        drive_ids = self.drive_ids
+        return [(folder, drives[drive_ids[offset + i]]) for i, folder in enumerate(folders)], self.row_count
+
+    def to_catalog(self):
+        """
+        Copy every row into a Catalog
+
+        Returns:
+            Catalog: Catalog of folder names and drive names
+        """
+        catalog = Catalog()
+        catalog.folders = self.get_folders(0, self.row_count)
+        catalog.drives = list(self.drives)
+        catalog.drive_lookup = {drive: drive_id for drive_id, drive in enumerate(catalog.drives)}
+        catalog.drive_ids = array('I', self.drive_ids.tobytes())
+        if self.sizes is not None:
+            catalog.sizes = array('q', self.sizes.tobytes())
+            catalog.file_counts = array('q', self.file_counts.tobytes())
+            catalog.newest = array('q', self.newest.tobytes())
+        return catalog
+
+    def __len__(self):
+        return self.row_count
+
+    def close(self):
+        """Release the views and unmap the file"""
+        for name in ('offsets', 'drive_ids', 'sizes', 'file_counts', 'newest', 'block_offsets', 'names'):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        self.blocks = {}
+        self.buffer.release()
+        self.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
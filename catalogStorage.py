@@ -0,0 +1,637 @@
+import os
+import re
+import csv
+import json
+import time
+import hashlib
+from array import array
+from catalog import Catalog
+from csvCatalog import CsvCatalog
+from catalogSnapshot import CatalogSnapshot
+from progressEvents import RunStats, STAGE_READ_EXISTING, STAGE_DEDUP, STAGE_WRITE
+
+# File extensions that select the SQLite storage backend
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Rows inserted per executemany call during batch upserts
+SQLITE_BATCH_SIZE = 10000
+
+# File extension that selects the sharded storage backend; the shards are
+# kept in a folder named like the manifest, with this suffix instead
+MANIFEST_EXTENSION = '.manifest'
+SHARDS_SUFFIX = '.shards'
+
+MANIFEST_VERSION = 1
+
+
+class CatalogStorage:
+    """Interface shared by the catalog storage backends"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        """Check if the catalog exists and has been written to"""
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def validate(self):
+        """
+        Check the catalog format
+
+        Returns:
+            tuple: (is_valid: bool, message: str, folder_count: int)
+        """
+        raise NotImplementedError
+
+    def count(self):
+        """Get the number of rows in the catalog"""
+        raise NotImplementedError
+
+    def load(self):
+        """
+        Load the whole catalog
+
+        Returns:
+            Catalog: Catalog of folder names and drive names
+        """
+        raise NotImplementedError
+
+    def add_rows(self, rows, stats=None):
+        """
+        Add rows that are not already in the catalog
+
+        Args:
+            rows (Catalog): Rows to add, sorted by drive name
+            stats (RunStats): Optional run timings to record the read, dedup and write stages in
+
+        Returns:
+            tuple: (new_count: int, total_count: int)
+        """
+        raise NotImplementedError
+
+    def iter_rows(self):
+        """
+        Iterate over the catalog's rows
+
+        Yields:
+            tuple: (folder name, drive name), with metadata when the catalog has it
+        """
+        catalog = self.load()
+        yield from catalog.iter_records() if catalog.has_metadata else catalog.iter_tuples()
+
+    def get_page(self, offset, limit):
+        """
+        Get one page of rows
+
+        Returns:
+            tuple: (rows: list of (folder name, drive name) tuples, total row count: int)
+        """
+        catalog = self.load()
+        return list(catalog.iter_tuples())[offset:offset + limit], len(catalog)
+
+    def search(self, query):
+        """
+        Find rows whose folder or drive name contains the query, ignoring case
+
+        Returns:
+            Catalog: Matching rows in catalog order
+        """
+        query = query.lower()
+        matches = Catalog()
+        for folder, drive, size, file_count, newest in self.load().iter_records():
+            if query in folder.lower() or query in drive.lower():
+                matches.append(folder, drive, None if size is None else (size, file_count, newest))
+        return matches
+
+    def compact(self):
+        """
+        Remove duplicate rows and sort the catalog by drive name
+
+        Returns:
+            int: Number of rows after compacting
+        """
+        raise NotImplementedError
+
+    def export_csv(self, csv_file_path):
+        """
+        Write the catalog to a CSV file
+
+        Returns:
+            int: Number of rows written
+        """
+        catalog = self.load()
+        rows = list(catalog.iter_records() if catalog.has_metadata else catalog.iter_tuples())
+        CsvCatalog(csv_file_path).write_rows(rows, catalog.has_metadata)
+        return len(rows)
+
+    def import_csv(self, csv_file_path):
+        """
+        Import the rows of a catalog CSV
+
+        Returns:
+            tuple: (new_count: int, total_count: int)
+        """
+        return self.add_rows(Catalog(CsvCatalog(csv_file_path).iter_rows()))
+
+
+class CsvCatalogStorage(CatalogStorage):
+    """Catalog stored as a CSV file with sidecar indexes"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.csv_catalog = CsvCatalog(path)
+
+    def validate(self):
+        with open(self.path, 'r', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, None)
+
+        if not header or len(header) < 2:
+            return False, "Invalid CSV format: missing or incorrect header", 0
+
+        if header[0].lower() not in ['folder name', 'folder'] or header[1].lower() not in ['drive name', 'drive']:
+            return False, "Invalid CSV format: incorrect column headers", 0
+
+        # Count existing rows from the key index
+        row_count = self.count()
+
+        return True, f"Valid CSV file with {row_count} existing entries", row_count
+
+    def count(self):
+        return len(self.csv_catalog.load_keys())
+
+    def load(self):
+        return Catalog(self.csv_catalog.iter_rows())
+
+    def iter_rows(self):
+        return self.csv_catalog.iter_rows()
+
+    def get_page(self, offset, limit):
+        # An up to date snapshot answers without reading the CSV at all
+        view = CatalogSnapshot(self.path).open()
+        if view is not None:
+            with view:
+                return view.get_page(offset, limit)
+        return self.csv_catalog.get_page(offset, limit)
+
+    def add_rows(self, rows, stats=None):
+        if stats is None:
+            stats = RunStats()
+        if rows.has_metadata:
+            return self.add_rows_with_metadata(rows, stats)
+        file_exists = self.exists()
+
+        # Load the keys of existing rows to avoid duplicates; the sidecar
+        # index means this normally doesn't read the CSV itself
+        with stats.stage(STAGE_READ_EXISTING):
+            existing_keys = self.csv_catalog.load_keys() if file_exists else array('Q')
+        stats.add_count(STAGE_READ_EXISTING, len(existing_keys))
+
+        with stats.stage(STAGE_DEDUP):
+            seen = set(existing_keys)
+            new_data = []
+            for folder, drive in rows.iter_tuples():
+                key = CsvCatalog.get_row_key(folder, drive)
+                if key not in seen:
+                    seen.add(key)
+                    new_data.append((folder, drive))
+        stats.add_count(STAGE_DEDUP, len(rows))
+
+        with stats.stage(STAGE_WRITE):
+            if file_exists:
+                # Rows appended to a catalog with metadata columns keep its width, with them blank
+                self.csv_catalog.append_rows(new_data, existing_keys, metadata=self.csv_catalog.has_metadata_columns())
+            else:
+                self.csv_catalog.write_rows(new_data)
+        stats.add_count(STAGE_WRITE, len(new_data))
+        if file_exists:
+            return len(new_data), len(existing_keys)
+        return len(new_data), len(new_data)
+
+    def add_rows_with_metadata(self, rows, stats):
+        """
+        Add rows that carry metadata, refreshing the metadata of rows already
+        in the CSV. New rows are appended as plain rows are; the CSV is only
+        rewritten when it lacks the metadata columns or the metadata of a row
+        already in it changed.
+        """
+        file_exists = self.exists()
+        has_columns = file_exists and self.csv_catalog.has_metadata_columns()
+        with stats.stage(STAGE_READ_EXISTING):
+            existing_keys = self.csv_catalog.load_keys() if has_columns else array('Q')
+            # Only rescanned rows with metadata can change existing ones, and
+            # only then does the CSV itself need reading
+            key_set = set(existing_keys)
+            read = file_exists and (not has_columns or any(
+                record[2] is not None and CsvCatalog.get_row_key(record[0], record[1]) in key_set
+                for record in rows.iter_records()))
+            merged = self.csv_catalog.read_rows(width=5) if read else []
+        stats.add_count(STAGE_READ_EXISTING, len(merged) if read else len(existing_keys))
+
+        existing_count = len(merged)
+        # Adding the metadata columns means writing every row anyway
+        changed = file_exists and not has_columns
+        new_rows = []
+        with stats.stage(STAGE_DEDUP):
+            # Metadata goes on the last copy of a row, which compact keeps
+            positions = {(row[0], row[1]): i for i, row in enumerate(merged)}
+            for record in rows.iter_records():
+                position = positions.get(record[:2])
+                if position is None:
+                    if not read and CsvCatalog.get_row_key(record[0], record[1]) in key_set:
+                        continue  # Already in the CSV, and there's no metadata to update
+                    positions[record[:2]] = len(merged)
+                    merged.append(record)
+                    new_rows.append(record)
+                elif record[2] is not None:
+                    if position < existing_count and not changed:
+                        old = merged[position]
+                        changed = list(old[2:5]) != CsvCatalog.format_metadata(*record[2:5])
+                    merged[position] = record
+        stats.add_count(STAGE_DEDUP, len(rows))
+
+        with stats.stage(STAGE_WRITE):
+            if changed or not file_exists:
+                self.csv_catalog.write_rows(merged, metadata=True)
+                stats.add_count(STAGE_WRITE, len(merged))
+                return len(new_rows), len(merged)
+            # Extends existing_keys with the new rows
+            self.csv_catalog.append_rows(new_rows, existing_keys, metadata=True)
+        stats.add_count(STAGE_WRITE, len(new_rows))
+        return len(new_rows), len(existing_keys)
+
+    def compact(self):
+        return self.csv_catalog.compact()
+
+
+class SqliteCatalogStorage(CatalogStorage):
+    """
+    Catalog stored in an SQLite database.
+    Rows are unique on (folder, drive) and indexed by drive, and an FTS5
+    trigram index answers substring searches when SQLite supports it.
+    """
+
+    def connect(self):
+        """Open the database, creating the schema if needed"""
+        # Imported here so CSV-only use doesn't pay for loading SQLite
+        import sqlite3
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (
+                id INTEGER PRIMARY KEY,
+                folder TEXT NOT NULL,
+                drive TEXT NOT NULL,
+                size INTEGER,
+                file_count INTEGER,
+                newest INTEGER,
+                UNIQUE (folder, drive)
+            );
+            CREATE INDEX IF NOT EXISTS rows_drive ON rows (drive);
+        """)
+        # Databases created before folder metadata existed lack its columns
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(rows)")}
+        for column in ('size', 'file_count', 'newest'):
+            if column not in columns:
+                connection.execute(f"ALTER TABLE rows ADD COLUMN {column} INTEGER")
+        SqliteCatalogStorage.create_fts(connection)
+        return connection
+
+    @staticmethod
+    def read_catalog(cursor):
+        """Build a Catalog from (folder, drive, size, file_count, newest) result rows"""
+        catalog = Catalog()
+        for folder, drive, size, file_count, newest in cursor:
+            metadata = None
+            if size is not None:
+                metadata = (size, file_count, -1 if newest is None else newest)
+            catalog.append(folder, drive, metadata)
+        return catalog
+
+    @staticmethod
+    def create_fts(connection):
+        """Create the full-text index, returning False if unsupported"""
+        import sqlite3
+        # The index is updated in bulk by add_rows and compact rather than by
+        # triggers, which are several times slower for large batches
+        try:
+            connection.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS rows_fts USING fts5(
+                    folder, drive, content='rows', content_rowid='id', tokenize='trigram'
+                )
+            """)
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def has_fts(self, connection):
+        """Check if the full-text index exists"""
+        row = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rows_fts'").fetchone()
+        return row is not None
+
+    def connect_read_only(self):
+        """
+        Open the database without creating or changing anything, e.g. to check a file that may not be a catalog
+
+        Returns:
+            Connection: Read-only connection, or None if the database has no catalog table
+        """
+        import sqlite3
+        from urllib.request import pathname2url
+        connection = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro", uri=True)
+        try:
+            row = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rows'").fetchone()
+        except sqlite3.DatabaseError:
+            connection.close()
+            raise
+        if row is None:
+            connection.close()
+            return None
+        return connection
+
+    def validate(self):
+        import sqlite3
+        if not self.exists():
+            # An empty file is an empty database, which the first write makes a catalog
+            return True, "New catalog database will be created", 0
+        try:
+            connection = self.connect_read_only()
+            if connection is None:
+                return False, "Invalid catalog database: no catalog table", 0
+            try:
+                row_count = connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+            finally:
+                connection.close()
+        except sqlite3.DatabaseError as e:
+            return False, f"Invalid catalog database: {e}", 0
+        return True, f"Valid catalog database with {row_count} existing entries", row_count
+
+    def count(self):
+        if not self.exists():
+            return 0
+        connection = self.connect_read_only()
+        if connection is None:
+            return 0
+        try:
+            return connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        finally:
+            connection.close()
+
+    def load(self):
+        connection = self.connect()
+        try:
+            return SqliteCatalogStorage.read_catalog(
+                connection.execute("SELECT folder, drive, size, file_count, newest FROM rows ORDER BY id"))
+        finally:
+            connection.close()
+
+    def add_rows(self, rows, stats=None):
+        if stats is None:
+            stats = RunStats()
+        connection = self.connect()
+        try:
+            with stats.stage(STAGE_READ_EXISTING):
+                before = connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+                last_id = connection.execute("SELECT COALESCE(MAX(id), 0) FROM rows").fetchone()[0]
+            stats.add_count(STAGE_READ_EXISTING, before)
+            # Duplicates are dropped by the unique index while inserting, so
+            # dedup and write are one stage here
+            if rows.has_metadata:
+                # Rows already in the catalog get their metadata refreshed
+                insert = ("INSERT INTO rows (folder, drive, size, file_count, newest) VALUES (?, ?, ?, ?, ?) "
+                          "ON CONFLICT (folder, drive) DO UPDATE SET size = excluded.size, "
+                          "file_count = excluded.file_count, newest = excluded.newest WHERE excluded.size IS NOT NULL")
+                records = rows.iter_records()
+            else:
+                insert = "INSERT OR IGNORE INTO rows (folder, drive) VALUES (?, ?)"
+                records = rows.iter_tuples()
+            with stats.stage(STAGE_WRITE):
+                # One transaction for the whole batch
+                with connection:
+                    batch = []
+                    for row in records:
+                        batch.append(row)
+                        if len(batch) >= SQLITE_BATCH_SIZE:
+                            connection.executemany(insert, batch)
+                            batch = []
+                    if batch:
+                        connection.executemany(insert, batch)
+                    # New rows get ids above the previous maximum
+                    if self.has_fts(connection):
+                        connection.execute(
+                            "INSERT INTO rows_fts (rowid, folder, drive) SELECT id, folder, drive FROM rows "
+                            "WHERE id > ?", (last_id,))
+                total = connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+            stats.add_count(STAGE_WRITE, total - before)
+            return total - before, total
+        finally:
+            connection.close()
+
+    def search(self, query):
+        connection = self.connect()
+        try:
+            if len(query) >= 3 and self.has_fts(connection):
+                # A quoted phrase matches any substring with the trigram tokenizer
+                phrase = '"' + query.replace('"', '""') + '"'
+                cursor = connection.execute(
+                    "SELECT rows.folder, rows.drive, size, file_count, newest FROM rows_fts "
+                    "JOIN rows ON rows.id = rows_fts.rowid WHERE rows_fts MATCH ? ORDER BY rows_fts.rowid", (phrase,))
+            else:
+                pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                cursor = connection.execute(
+                    "SELECT folder, drive, size, file_count, newest FROM rows "
+                    "WHERE folder LIKE ? ESCAPE '\\' OR drive LIKE ? ESCAPE '\\' ORDER BY id", (pattern, pattern))
+            return SqliteCatalogStorage.read_catalog(cursor)
+        finally:
+            connection.close()
+
+    def compact(self):
+        # Rows are unique already; rebuild them in drive order
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute("CREATE TEMP TABLE sorted AS "
+                                   "SELECT folder, drive, size, file_count, newest FROM rows ORDER BY drive, id")
+                connection.execute("DELETE FROM rows")
+                connection.execute("INSERT INTO rows (folder, drive, size, file_count, newest) "
+                                   "SELECT folder, drive, size, file_count, newest FROM sorted")
+                connection.execute("DROP TABLE sorted")
+                if self.has_fts(connection):
+                    connection.execute("INSERT INTO rows_fts (rows_fts) VALUES ('rebuild')")
+            connection.execute("VACUUM")
+            return connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        finally:
+            connection.close()
+
+
+class ShardedCatalogStorage(CatalogStorage):
+    """
+    Catalog split into one CSV shard per drive, listed in a JSON manifest.
+    The manifest records each shard's row count, checksum and when its drive
+    was last written, so counting and validating don't read the shards and
+    adding a drive rewrites only that drive's shard. Each shard is a normal
+    catalog CSV with its own sidecar indexes.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.shards_folder = os.path.splitext(path)[0] + SHARDS_SUFFIX
+
+    def read_manifest(self):
+        """
+        Read the manifest
+
+        Returns:
+            dict: Manifest with a 'shards' dict of drive name to shard entry
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"unsupported manifest version {manifest.get('version')}")
+        return manifest
+
+    def write_manifest(self, manifest):
+        CsvCatalog.write_atomic(self.path, lambda f: json.dump(manifest, f, indent=1, sort_keys=True))
+
+    def get_shard_path(self, entry):
+        return os.path.join(self.shards_folder, entry['file'])
+
+    def iter_shards(self, manifest):
+        """Iterate over (drive name, shard storage, entry) in drive order"""
+        for drive in sorted(manifest['shards']):
+            entry = manifest['shards'][drive]
+            yield drive, CsvCatalogStorage(self.get_shard_path(entry)), entry
+
+    @staticmethod
+    def get_shard_file_name(drive):
+        """Get a file name for a drive's shard that is readable and unique to the drive"""
+        digest = hashlib.blake2b(drive.encode('utf-8'), digest_size=4).hexdigest()
+        return f"{re.sub(r'[^A-Za-z0-9._-]+', '_', drive).strip('._')}-{digest}.csv"
+
+    @staticmethod
+    def get_checksum(path):
+        """Hash a shard file's contents"""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def update_entry(self, entry, row_count, scanned=True):
+        """Record a shard's row count, file state and checksum after writing it"""
+        path = self.get_shard_path(entry)
+        st = os.stat(path)
+        entry.update(rows=row_count, bytes=st.st_size, mtime_ns=st.st_mtime_ns,
+                     checksum=ShardedCatalogStorage.get_checksum(path))
+        if scanned:
+            entry['scanned'] = time.time()
+
+    def validate(self):
+        try:
+            manifest = self.read_manifest()
+        except (OSError, ValueError) as e:
+            return False, f"Invalid catalog manifest: {e}", 0
+        recounted = False
+        for drive, shard, entry in self.iter_shards(manifest):
+            try:
+                st = os.stat(self.get_shard_path(entry))
+            except OSError:
+                return False, f"Shard missing for drive {drive}", 0
+            # Only shards touched outside the catalog are read, to compare checksums
+            if ((st.st_size, st.st_mtime_ns) != (entry['bytes'], entry['mtime_ns']) and
+                    ShardedCatalogStorage.get_checksum(self.get_shard_path(entry)) != entry['checksum']):
+                # Edited by hand, or written by a run stopped before it updated the
+                # manifest: still usable if it is a valid catalog, once recounted
+                is_valid, message, row_count = shard.validate()
+                if not is_valid:
+                    return False, f"Shard for drive {drive} was changed outside the catalog: {message}", 0
+                self.update_entry(entry, row_count, scanned=False)
+                recounted = True
+        if recounted:
+            try:
+                self.write_manifest(manifest)
+            except OSError as e:
+                print(f"Warning: Could not update catalog manifest: {e}")
+        row_count = sum(entry['rows'] for entry in manifest['shards'].values())
+        return (True, f"Valid sharded catalog with {row_count} existing entries on {len(manifest['shards'])} drives",
+                row_count)
+
+    def count(self):
+        return sum(entry['rows'] for entry in self.read_manifest()['shards'].values())
+
+    def load(self):
+        catalog = Catalog()
+        for _, shard, _ in self.iter_shards(self.read_manifest()):
+            catalog.extend(shard.load())
+        return catalog
+
+    def iter_rows(self):
+        for _, shard, _ in self.iter_shards(self.read_manifest()):
+            yield from shard.iter_rows()
+
+    def get_page(self, offset, limit):
+        # Row counts in the manifest lead straight to the shards holding the page
+        manifest = self.read_manifest()
+        total = sum(entry['rows'] for entry in manifest['shards'].values())
+        rows = []
+        start = 0
+        for _, shard, entry in self.iter_shards(manifest):
+            if len(rows) >= limit:
+                break
+            end = start + entry['rows']
+            if offset < end:
+                page, _ = shard.get_page(max(0, offset - start), limit - len(rows))
+                rows.extend(page)
+            start = end
+        return rows, total
+
+    def add_rows(self, rows, stats=None):
+        manifest = self.read_manifest() if self.exists() else {'version': MANIFEST_VERSION, 'shards': {}}
+        os.makedirs(self.shards_folder, exist_ok=True)
+        new_count = 0
+        folders = rows.folders
+        ids_by_drive = {}
+        for i, drive_id in enumerate(rows.drive_ids):
+            ids_by_drive.setdefault(drive_id, []).append(i)
+        for drive_id, ids in ids_by_drive.items():
+            drive = rows.drives[drive_id]
+            shard_rows = Catalog()
+            metadata = None
+            if rows.has_metadata:
+                metadata = [(rows.sizes[i], rows.file_counts[i], rows.newest[i]) for i in ids]
+            shard_rows.add_folders([folders[i] for i in ids], drive, metadata)
+
+            entry = manifest['shards'].setdefault(drive, {'file': ShardedCatalogStorage.get_shard_file_name(drive)})
+            new, total = CsvCatalogStorage(self.get_shard_path(entry)).add_rows(shard_rows, stats)
+            new_count += new
+            self.update_entry(entry, total)
+            # Written after every shard, so an interrupted run leaves it in step with the shards
+            self.write_manifest(manifest)
+        return new_count, sum(entry['rows'] for entry in manifest['shards'].values())
+
+    def compact(self):
+        manifest = self.read_manifest()
+        for _, shard, entry in self.iter_shards(manifest):
+            self.update_entry(entry, shard.compact())
+        self.write_manifest(manifest)
+        return sum(entry['rows'] for entry in manifest['shards'].values())
+
+
+def get_catalog_storage(path):
+    """
+    Get the storage backend for a catalog path
+
+    Args:
+        path (str): Path to a catalog CSV or SQLite database
+
+    Returns:
+        CatalogStorage: SQLite storage for .db/.sqlite files, sharded storage for
+            .manifest files, CSV storage otherwise
+    """
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SqliteCatalogStorage(path)
+    if path.lower().endswith(MANIFEST_EXTENSION):
+        return ShardedCatalogStorage(path)
+    return CsvCatalogStorage(path)
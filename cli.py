@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Command line interface for Folders2CSV.
+Runs the backend without the GUI (and without importing tkinter), for cron
+jobs and scripts. Add --json for machine-readable output.
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import signal
+import threading
+import contextlib
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2  # Used by argparse for bad arguments
+EXIT_NO_RESULTS = 3
+
+
+def get_backend(args):
+    """Import the backend, pointing it at the requested volume root"""
+    from backend import Folders2CSVBackend
+    from backendHelpers import BackendHelpers
+
+    if args.volumes_root:
+        BackendHelpers.volumesRoot = args.volumes_root
+    return Folders2CSVBackend
+
+
+def output(args, result, lines):
+    """Print a result as JSON or as tab-separated lines"""
+    if args.json:
+        json.dump(result, args.out)
+        args.out.write('\n')
+    else:
+        for line in lines:
+            print(line, file=args.out)
+
+
+def report_progress(args):
+    """Get a progress callback that writes to stderr unless --quiet is given"""
+    if args.quiet:
+        return None
+    return lambda message: print(message, file=sys.stderr)
+
+
+def resolve_drives(backend, args):
+    """Get the drives named on the command line, or every available drive"""
+    return args.drives or backend.get_available_drives()
+
+
+def get_scanner(args):
+    """Get a deep scanner if --deep was given"""
+    if not args.deep:
+        return None
+    from deepScanner import DeepScanner
+    return DeepScanner(args.max_depth or None, args.include, args.exclude, args.follow_symlinks)
+
+
+def get_metadata(args):
+    """Get a folder measurer if --metadata was given"""
+    if not args.metadata:
+        return None
+    from folderMetadata import FolderMetadata, MetadataCache
+    return FolderMetadata(MetadataCache() if not args.no_cache else None, force_rescan=args.force_rescan)
+
+
+def output_records(args, records):
+    """Print (folder, drive, size, files, newest) records, with the metadata only where it is known"""
+    # Folders without files have no newest mtime
+    records = [(folder, drive, size, file_count, None if newest is not None and newest < 0 else newest)
+               for folder, drive, size, file_count, newest in records]
+    if not any(record[2] is not None for record in records):
+        output(args, [{'folder': folder, 'drive': drive} for folder, drive, _, _, _ in records],
+               (f"{folder}\t{drive}" for folder, drive, _, _, _ in records))
+        return records
+    output(args, [{'folder': folder, 'drive': drive, 'size': size, 'files': file_count, 'newest': newest}
+                  for folder, drive, size, file_count, newest in records],
+           ('\t'.join('' if value is None else str(value) for value in record) for record in records))
+    return records
+
+
+def cmd_drives(args):
+    """List available drives with their folder counts"""
+    backend = get_backend(args)
+    infos = [backend.get_drive_info(drive) for drive in backend.get_available_drives()]
+    output(args, infos, (f"{info['drive_name']}\t{info['stripped_name']}\t{info['folder_count']}\t{info['status']}"
+                         for info in infos))
+    return EXIT_OK if infos else EXIT_NO_RESULTS
+
+
+def cmd_scan(args):
+    """Scan drives and print their folders without writing a catalog"""
+    backend = get_backend(args)
+    drives = resolve_drives(backend, args)
+    if not drives:
+        print("No drives found", file=sys.stderr)
+        return EXIT_NO_RESULTS
+    cache = backend.get_scan_cache() if not args.no_cache else None
+    results = backend.scan_drives(drives, report_progress(args), args.workers, cache, args.force_rescan,
+                                  scanner=get_scanner(args), metadata=get_metadata(args))
+    if cache is not None:
+        cache.save()
+    rows = output_records(args, (record for _, _, folder_data in results for record in folder_data.iter_records()))
+    return EXIT_OK if rows else EXIT_NO_RESULTS
+
+
+def cmd_merge(args):
+    """Scan drives and add their folders to a catalog"""
+    from progressEvents import RunStats
+    backend = get_backend(args)
+    drives = resolve_drives(backend, args)
+    if not drives:
+        print("No drives found", file=sys.stderr)
+        return EXIT_NO_RESULTS
+    # The first Ctrl-C stops after the drives being scanned and keeps them for
+    # the next run; a second one quits at once
+    cancel_event = threading.Event()
+
+    def cancel(signum, frame):
+        print("Cancelling; scanned drives are kept for the next run (Ctrl-C again to quit)", file=sys.stderr)
+        cancel_event.set()
+        signal.signal(signal.SIGINT, previous_handler)
+
+    stats = RunStats()
+    previous_handler = signal.signal(signal.SIGINT, cancel)
+    try:
+        success, message, count = backend.process_drives_to_csv(
+            drives, args.catalog, report_progress(args), args.workers,
+            use_cache=not args.no_cache, force_rescan=args.force_rescan, profile=args.profile or None,
+            scanner=get_scanner(args), collect_metadata=args.metadata, cancel_event=cancel_event,
+            resume=not args.no_resume, stats=stats)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+    if args.timings and not args.json:
+        print(stats.format_report(), file=sys.stderr)
+    if success and args.compact:
+        success, message, count = backend.compact_csv(args.catalog)
+    output(args, {'success': success, 'message': message, 'count': count, 'timings': stats.report(),
+                  'profile': stats.profile_path}, [message])
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_duplicates(args):
+    """Find project folders stored on more than one drive"""
+    backend = get_backend(args)
+    drives = resolve_drives(backend, args)
+    if not drives:
+        print("No drives found", file=sys.stderr)
+        return EXIT_NO_RESULTS
+    groups = backend.find_duplicates(drives, report_progress(args), args.workers, use_cache=not args.no_cache,
+                                     force_rescan=args.force_rescan, similarity=args.similar,
+                                     hash_workers=args.hash_workers)
+    # One line per copy, numbered by group, so the text output is easy to grep and sort
+    output(args, [{'size': group.size, 'files': group.file_count, 'similarity': group.similarity,
+                   'wasted': group.wasted, 'folders': [{'folder': folder, 'drive': drive}
+                                                      for drive, folder in group.folders]} for group in groups],
+           (f"{number}\t{group.wasted}\t{group.similarity:.3f}\t{folder}\t{drive}"
+            for number, group in enumerate(groups, 1) for drive, folder in group.folders))
+    return EXIT_OK if groups else EXIT_NO_RESULTS
+
+
+def cmd_validate(args):
+    """Check a catalog's format and count its rows"""
+    backend = get_backend(args)
+    is_valid, message, count = backend.validate_csv_file(args.catalog)
+    output(args, {'valid': is_valid, 'message': message, 'count': count}, [message])
+    return EXIT_OK if is_valid else EXIT_FAILURE
+
+
+def cmd_query(args):
+    """Find catalog rows whose folder or drive name contains the query"""
+    backend = get_backend(args)
+    if not os.path.exists(args.catalog):
+        print(f"Catalog not found: {args.catalog}", file=sys.stderr)
+        return EXIT_FAILURE
+    if args.fuzzy:
+        from searchIndex import DEFAULT_FUZZY_LIMIT
+        matches = backend.fuzzy_search_catalog(args.catalog, args.query, args.limit or DEFAULT_FUZZY_LIMIT)
+    elif args.syntax:
+        from catalogQuery import QueryError
+        try:
+            matches = backend.query_catalog(args.catalog, args.query)
+        except QueryError as e:
+            print(f"Invalid query: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    else:
+        matches = backend.search_catalog(args.catalog, args.query)
+    records = matches.iter_records()
+    if args.limit:
+        records = itertools.islice(records, args.limit)
+    rows = output_records(args, records)
+    return EXIT_OK if rows else EXIT_NO_RESULTS
+
+
+def cmd_search(args):
+    """Search several catalogs at once, printing which catalog each match is in"""
+    get_backend(args)
+    from catalogFederation import CatalogFederation, DEFAULT_FEDERATION_WORKERS, MODE_CONTAINS, MODE_FUZZY, MODE_QUERY
+    from catalogQuery import QueryError
+
+    federation = CatalogFederation(max_workers=args.workers or DEFAULT_FEDERATION_WORKERS)
+    for catalog in args.catalogs:
+        # PATH=LABEL names a catalog's matches, unless an existing file has that name
+        label = None
+        if '=' in catalog and not os.path.exists(catalog):
+            catalog, label = catalog.rsplit('=', 1)
+        if not os.path.exists(catalog):
+            print(f"Catalog not found: {catalog}", file=sys.stderr)
+        federation.add(catalog, label or None)
+    mode = MODE_FUZZY if args.fuzzy else MODE_QUERY if args.syntax else MODE_CONTAINS
+    try:
+        matches = federation.search(args.query, mode, args.limit)
+    except QueryError as e:
+        print(f"Invalid query: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    output(args, [{'folder': row.folder, 'drive': row.drive, 'catalog': label} for label, row in matches],
+           (f"{row.folder}\t{row.drive}\t{label}" for label, row in matches))
+    return EXIT_OK if matches else EXIT_NO_RESULTS
+
+
+def cmd_export(args):
+    """Write a catalog (CSV or SQLite) to a CSV file"""
+    backend = get_backend(args)
+    success, message, count = backend.export_csv(args.catalog, args.output)
+    output(args, {'success': success, 'message': message, 'count': count}, [message])
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_snapshot(args):
+    """Rewrite the binary snapshot a CSV catalog is loaded from"""
+    backend = get_backend(args)
+    success, message, count = backend.build_snapshot(args.catalog, args.compress)
+    output(args, {'success': success, 'message': message, 'count': count}, [message])
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_watch(args):
+    """Catalog Audio Archive drives automatically as they are mounted"""
+    get_backend(args)
+    from driveWatcher import DriveWatcher
+
+    def on_processed(drives, result):
+        success, message, count = result
+        output(args, {'drives': drives, 'success': success, 'message': message, 'count': count},
+               [f"{', '.join(drives)}: {message}"])
+        args.out.flush()
+
+    watcher = DriveWatcher(args.catalog, args.interval, args.settle, args.process_existing,
+                           report_progress(args), on_processed)
+    print(f"Watching {args.volumes_root or '/Volumes'} for Audio Archive drives (Ctrl-C to stop)", file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    return EXIT_OK
+
+
+def cmd_serve(args):
+    """Answer catalog searches from other machines over HTTP, keeping the catalog indexed in memory"""
+    get_backend(args)
+    from catalogServer import CatalogService, CatalogServer, CatalogUnavailable
+
+    if not os.path.exists(args.catalog):
+        print(f"Catalog not found: {args.catalog}", file=sys.stderr)
+        return EXIT_FAILURE
+    service = CatalogService(args.catalog)
+    try:
+        rows = service.get_status()[1]['rows']
+    except CatalogUnavailable as e:
+        print(e, file=sys.stderr)
+        return EXIT_FAILURE
+    try:
+        server = CatalogServer(service, args.host, args.port, args.verbose)
+    except OSError as e:
+        print(f"Could not listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+    print(f"Serving {rows} folders on http://{args.host}:{server.server_address[1]}/ (Ctrl-C to stop)",
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='folders2csv', description="Catalog Audio Archive drives without the GUI")
+    parser.add_argument('--json', action='store_true', help="print machine-readable JSON")
+    parser.add_argument('--quiet', '-q', action='store_true', help="don't print progress to stderr")
+    parser.add_argument('--volumes-root', help="directory drives are mounted under (default: /Volumes)")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    drives = subparsers.add_parser('drives', help="list available drives")
+    drives.set_defaults(func=cmd_drives)
+
+    def add_scan_arguments(subparser):
+        subparser.add_argument('drives', nargs='*', help="drive names (default: every available drive)")
+        subparser.add_argument('--workers', type=int, help="drives scanned in parallel")
+        subparser.add_argument('--force-rescan', action='store_true', help="ignore cached listings")
+        subparser.add_argument('--no-cache', action='store_true', help="don't read or update the scan cache")
+        subparser.add_argument('--deep', action='store_true',
+                               help="also list nested folders, as paths relative to the mastering folder")
+        subparser.add_argument('--max-depth', type=int, default=3,
+                               help="levels listed by --deep (default: 3, 0 for no limit)")
+        subparser.add_argument('--include', action='append', metavar='GLOB',
+                               help="with --deep, only write folders matching this pattern (repeatable)")
+        subparser.add_argument('--exclude', action='append', metavar='GLOB',
+                               help="with --deep, skip folders matching this pattern and their contents (repeatable)")
+        subparser.add_argument('--follow-symlinks', action='store_true',
+                               help="with --deep, descend into symlinked folders")
+        subparser.add_argument('--metadata', action='store_true',
+                               help="also record each folder's size in bytes, file count and newest modified time")
+
+    scan = subparsers.add_parser('scan', help="scan drives and print their folders")
+    add_scan_arguments(scan)
+    scan.set_defaults(func=cmd_scan)
+
+    merge = subparsers.add_parser('merge', help="scan drives and add their folders to a catalog")
+    merge.add_argument('catalog', help="catalog CSV or SQLite database")
+    add_scan_arguments(merge)
+    merge.add_argument('--compact', action='store_true', help="sort and deduplicate the catalog afterwards")
+    merge.add_argument('--no-resume', action='store_true',
+                       help="scan every drive even if a cancelled run already scanned some of them")
+    merge.add_argument('--timings', action='store_true', help="print how long each stage took to stderr")
+    merge.add_argument('--profile', action='store_true',
+                       help="write a cProfile report to the config directory's profiles folder")
+    merge.set_defaults(func=cmd_merge)
+
+    duplicates = subparsers.add_parser('duplicates', help="find project folders stored on more than one drive")
+    duplicates.add_argument('drives', nargs='*', help="drive names (default: every available drive)")
+    duplicates.add_argument('--workers', type=int, help="drives scanned in parallel")
+    duplicates.add_argument('--hash-workers', type=int, help="processes hashing files (default: one per CPU)")
+    duplicates.add_argument('--force-rescan', action='store_true', help="ignore cached listings, sizes and hashes")
+    duplicates.add_argument('--no-cache', action='store_true', help="don't read or update the caches")
+    duplicates.add_argument('--similar', type=float, nargs='?', const=0.9, metavar='SHARE',
+                            help="also report same-named folders sharing this share of their bytes (default: 0.9)")
+    duplicates.set_defaults(func=cmd_duplicates)
+
+    validate = subparsers.add_parser('validate', help="check a catalog and count its rows")
+    validate.add_argument('catalog')
+    validate.set_defaults(func=cmd_validate)
+
+    query = subparsers.add_parser('query', help="search a catalog by folder or drive name")
+    query.add_argument('catalog')
+    query.add_argument('query')
+    query.add_argument('--limit', type=int, help="maximum number of rows to print")
+    query_mode = query.add_mutually_exclusive_group()
+    query_mode.add_argument('--fuzzy', action='store_true',
+                            help="print the closest folder names first, allowing typos and reordered words")
+    query_mode.add_argument('--syntax', action='store_true',
+                            help="read the query as fielded terms, e.g. 'drive:10-20 folder:*mix* -demo'")
+    query.set_defaults(func=cmd_query)
+
+    search = subparsers.add_parser('search', help="search several catalogs at once")
+    search.add_argument('query')
+    search.add_argument('catalogs', nargs='+', metavar='catalog',
+                        help="catalog to search, or PATH=LABEL to name its matches LABEL")
+    search.add_argument('--limit', type=int, help="maximum number of rows to print")
+    search.add_argument('--workers', type=int, help="catalogs read at the same time")
+    search_mode = search.add_mutually_exclusive_group()
+    search_mode.add_argument('--fuzzy', action='store_true',
+                             help="print the closest folder names of all catalogs first")
+    search_mode.add_argument('--syntax', action='store_true',
+                             help="read the query as fielded terms, e.g. 'drive:10-20 folder:*mix* -demo'")
+    search.set_defaults(func=cmd_search)
+
+    export = subparsers.add_parser('export', help="write a catalog to CSV")
+    export.add_argument('catalog')
+    export.add_argument('output', help="CSV file to write")
+    export.set_defaults(func=cmd_export)
+
+    snapshot = subparsers.add_parser('snapshot', help="write the binary snapshot a CSV catalog is then loaded from")
+    snapshot.add_argument('catalog')
+    snapshot.add_argument('--compress', action='store_true', help="compress folder names to save disk space")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    watch = subparsers.add_parser('watch', help="catalog drives automatically as they are mounted")
+    watch.add_argument('catalog', help="catalog CSV or SQLite database")
+    watch.add_argument('--interval', type=float, default=2.0, help="seconds between checks (default: 2)")
+    watch.add_argument('--settle', type=float, default=5.0,
+                       help="seconds to wait after the last mount before scanning (default: 5)")
+    watch.add_argument('--process-existing', action='store_true', help="also catalog drives already mounted")
+    watch.set_defaults(func=cmd_watch)
+
+    serve = subparsers.add_parser('serve', help="answer catalog searches over HTTP")
+    serve.add_argument('catalog', help="catalog CSV or SQLite database")
+    serve.add_argument('--host', default='127.0.0.1',
+                       help="address to listen on; 0.0.0.0 lets other machines connect (default: 127.0.0.1)")
+    serve.add_argument('--port', type=int, default=8765, help="(default: 8765)")
+    serve.add_argument('--verbose', action='store_true', help="log every request to stderr")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # The backend prints warnings to stdout; keep stdout for results only
+    args.out = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            return args.func(args)
+    except KeyboardInterrupt:
+        return EXIT_FAILURE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,452 @@
+import io
+import os
+import datetime
+import csv
+import struct
+import locale
+import hashlib
+from array import array
+
+CSV_HEADER = ['Folder Name', 'Drive Name']
+# Extra columns written when folder metadata was collected
+METADATA_HEADER = ['Size (bytes)', 'Files', 'Newest Modified']
+
+# Sidecar holding a 64-bit hash of every (folder, drive) row in the CSV
+KEY_INDEX_SUFFIX = '.keys'
+KEY_INDEX_MAGIC = b'F2CK'
+KEY_INDEX_VERSION = 1
+# magic, version, csv size, csv mtime_ns, row count
+KEY_INDEX_HEADER = struct.Struct('<4sIQQQ')
+
+# Sidecar holding the byte offset of every valid data row in the CSV
+ROW_INDEX_SUFFIX = '.rowidx'
+ROW_INDEX_MAGIC = b'F2CR'
+ROW_INDEX_VERSION = 1
+ROW_INDEX_HEADER = KEY_INDEX_HEADER
+
+
+class CsvCatalog:
+    """
+    Catalog CSV file with a sidecar key index.
+    New rows are appended to the end of the file instead of rewriting it, and
+    the sidecar lets duplicates be detected without reading the CSV again.
+    """
+
+    def __init__(self, csv_file_path):
+        self.csv_file_path = csv_file_path
+        self.key_index_path = csv_file_path + KEY_INDEX_SUFFIX
+        self.row_index_path = csv_file_path + ROW_INDEX_SUFFIX
+        # Same encoding open() uses for the CSV in text mode
+        self.encoding = locale.getpreferredencoding(False)
+
+    @staticmethod
+    def get_row_key(folder, drive):
+        """Get the 64-bit dedup key of a catalog row"""
+        digest = hashlib.blake2b(f"{folder}\0{drive}".encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    @staticmethod
+    def write_atomic(path, write, mode='w'):
+        """
+        Write a file through a temporary file and rename it into place
+
+        Args:
+            path (str): Destination path
+            write (callable): Called with the open temporary file
+            mode (str): File mode, 'w' or 'wb'
+        """
+        tmp_path = f"{path}.tmp"
+        newline = None if 'b' in mode else ''
+        try:
+            with open(tmp_path, mode, newline=newline) as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def exists(self):
+        """Check if the CSV file exists"""
+        return os.path.exists(self.csv_file_path)
+
+    def get_file_version(self):
+        """Get the (size, mtime_ns) of the CSV, used to detect outside edits"""
+        st = os.stat(self.csv_file_path)
+        return st.st_size, st.st_mtime_ns
+
+    def read_header(self):
+        """Get the header row of the CSV, or an empty list"""
+        with open(self.csv_file_path, 'r', newline='') as csvfile:
+            return next(csv.reader(csvfile), [])
+
+    def has_metadata_columns(self):
+        """Check if the CSV has the folder metadata columns"""
+        return self.exists() and len(self.read_header()) >= len(CSV_HEADER) + len(METADATA_HEADER)
+
+    def read_rows(self, width=2):
+        """
+        Read every row of the CSV
+
+        Args:
+            width (int): Number of columns to keep; missing columns are read as ''
+
+        Returns:
+            list: List of (folder name, drive name) tuples, plus the raw
+                metadata fields when width is 5
+        """
+        padding = [''] * width
+        with open(self.csv_file_path, 'r', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader, None)  # Skip header
+            if width == 2:
+                return [(row[0], row[1]) for row in reader if len(row) >= 2]
+            return [tuple((row + padding)[:width]) for row in reader if len(row) >= 2]
+
+    @staticmethod
+    def parse_metadata(fields):
+        """
+        Parse the size, file count and newest modified fields of a row
+
+        Returns:
+            tuple: (size, file count, newest mtime in seconds), or None if the fields are blank or invalid
+        """
+        try:
+            size, file_count, newest = fields
+            if not size.strip():
+                return None
+            newest = newest.strip()
+            mtime = int(datetime.datetime.fromisoformat(newest).timestamp()) if newest else -1
+            return int(size), int(file_count), mtime
+        except ValueError:
+            return None
+
+    @staticmethod
+    def format_metadata(size, file_count, newest):
+        """Format metadata for the CSV, leaving unknown values blank"""
+        if size is None or size < 0:
+            return ['', '', '']
+        if newest is None or newest < 0:
+            newest_text = ''
+        else:
+            newest_text = datetime.datetime.fromtimestamp(newest).isoformat(sep=' ', timespec='seconds')
+        return [str(size), str(file_count), newest_text]
+
+    @staticmethod
+    def clean_row(row):
+        """
+        Strip a parsed CSV row, returning None if it is not a valid catalog row
+
+        Returns:
+            tuple: (folder name, drive name), or (folder name, drive name, size,
+                file count, newest mtime) if the row has metadata
+        """
+        if len(row) < 2:
+            return None
+        folder_name = row[0].strip()
+        drive_name = row[1].strip()
+        if folder_name and drive_name:
+            if len(row) >= 5:
+                metadata = CsvCatalog.parse_metadata(row[2:5])
+                if metadata is not None:
+                    return (folder_name, drive_name) + metadata
+            return folder_name, drive_name
+        return None
+
+    def iter_rows(self):
+        """
+        Stream the valid rows of the CSV with constant memory
+
+        Yields:
+            tuple: (folder name, drive name) with surrounding whitespace removed
+        """
+        with open(self.csv_file_path, 'r', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader, None)  # Skip header
+            for row in reader:
+                row = CsvCatalog.clean_row(row)
+                if row is not None:
+                    yield row
+
+    @staticmethod
+    def iter_records(f):
+        """
+        Split a binary CSV file into records, keeping quoted newlines together
+
+        Yields:
+            tuple: (byte offset, record bytes)
+        """
+        offset = f.tell()
+        start = offset
+        record = b''
+        for line in f:
+            if not record:
+                start = offset
+            record += line
+            offset += len(line)
+            # A record is complete once its quotes are balanced
+            if record.count(b'"') % 2 == 0:
+                yield start, record
+                record = b''
+        if record:
+            yield start, record
+
+    def parse_records(self, data):
+        """Parse raw CSV bytes into valid, stripped catalog rows"""
+        reader = csv.reader(io.StringIO(data.decode(self.encoding, errors='replace'), newline=''))
+        rows = []
+        for row in reader:
+            row = CsvCatalog.clean_row(row)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def load_row_offsets(self):
+        """
+        Load the byte offset of every valid row, building the sidecar once
+        per version of the CSV
+
+        Returns:
+            array: Byte offset of each valid data row in file order
+        """
+        offsets = self.read_row_index()
+        if offsets is None:
+            offsets = self.build_row_offsets()
+            self.write_row_index(offsets)
+        return offsets
+
+    def build_row_offsets(self):
+        """Scan the CSV for the byte offset of every valid data row"""
+        offsets = array('Q')
+        with open(self.csv_file_path, 'rb') as f:
+            records = CsvCatalog.iter_records(f)
+            next(records, None)  # Skip header
+            for start, record in records:
+                if self.parse_records(record):
+                    offsets.append(start)
+        return offsets
+
+    def read_row_index(self):
+        """Read the row index sidecar, returning None if it is missing or out of date"""
+        try:
+            with open(self.row_index_path, 'rb') as f:
+                header = f.read(ROW_INDEX_HEADER.size)
+                if len(header) != ROW_INDEX_HEADER.size:
+                    return None
+                magic, version, size, mtime_ns, count = ROW_INDEX_HEADER.unpack(header)
+                if magic != ROW_INDEX_MAGIC or version != ROW_INDEX_VERSION:
+                    return None
+                if (size, mtime_ns) != self.get_file_version():
+                    return None
+                offsets = array('Q')
+                offsets.frombytes(f.read(count * offsets.itemsize))
+                return offsets if len(offsets) == count else None
+        except (OSError, ValueError):
+            return None
+
+    def write_row_index(self, offsets):
+        """Rewrite the row index sidecar for the current version of the CSV"""
+        size, mtime_ns = self.get_file_version()
+
+        def write(f):
+            f.write(ROW_INDEX_HEADER.pack(ROW_INDEX_MAGIC, ROW_INDEX_VERSION, size, mtime_ns, len(offsets)))
+            f.write(offsets.tobytes())
+
+        try:
+            CsvCatalog.write_atomic(self.row_index_path, write, 'wb')
+        except OSError as e:
+            print(f"Warning: Could not write CSV row index: {e}")
+
+    def get_page(self, offset, limit):
+        """
+        Read a page of rows without parsing the rest of the file
+
+        Args:
+            offset (int): Index of the first row to return
+            limit (int): Maximum number of rows to return
+
+        Returns:
+            tuple: (rows: list of (folder name, drive name) tuples, total row count: int)
+        """
+        offsets = self.load_row_offsets()
+        total = len(offsets)
+        if offset >= total or limit <= 0:
+            return [], total
+        end = offset + limit
+        with open(self.csv_file_path, 'rb') as f:
+            f.seek(offsets[offset])
+            if end < total:
+                data = f.read(offsets[end] - offsets[offset])
+            else:
+                data = f.read()
+        return self.parse_records(data)[:limit], total
+
+    def load_keys(self):
+        """
+        Load the row keys of the CSV, rebuilding the sidecar if it is stale
+
+        Returns:
+            array: Key of every row in file order
+        """
+        keys = self.read_key_index()
+        if keys is None:
+            keys = array('Q', (CsvCatalog.get_row_key(folder, drive) for folder, drive in self.read_rows()))
+            self.write_key_index(keys)
+        return keys
+
+    def read_key_index(self):
+        """Read the sidecar, returning None if it is missing or out of date"""
+        try:
+            with open(self.key_index_path, 'rb') as f:
+                header = f.read(KEY_INDEX_HEADER.size)
+                if len(header) != KEY_INDEX_HEADER.size:
+                    return None
+                magic, version, size, mtime_ns, count = KEY_INDEX_HEADER.unpack(header)
+                if magic != KEY_INDEX_MAGIC or version != KEY_INDEX_VERSION:
+                    return None
+                if (size, mtime_ns) != self.get_file_version():
+                    return None
+                keys = array('Q')
+                keys.frombytes(f.read(count * keys.itemsize))
+                return keys if len(keys) == count else None
+        except (OSError, ValueError):
+            return None
+
+    def write_key_index(self, keys):
+        """Rewrite the sidecar for the current version of the CSV"""
+        size, mtime_ns = self.get_file_version()
+
+        def write(f):
+            f.write(KEY_INDEX_HEADER.pack(KEY_INDEX_MAGIC, KEY_INDEX_VERSION, size, mtime_ns, len(keys)))
+            f.write(keys.tobytes())
+
+        try:
+            CsvCatalog.write_atomic(self.key_index_path, write, 'wb')
+        except OSError as e:
+            print(f"Warning: Could not write CSV key index: {e}")
+
+    def append_key_index(self, new_keys, row_count):
+        """
+        Append keys to the sidecar after rows were appended to the CSV.
+        The keys are written before the header, so an interrupted update
+        leaves a header that no longer matches the CSV and gets rebuilt.
+        """
+        size, mtime_ns = self.get_file_version()
+        try:
+            with open(self.key_index_path, 'r+b') as f:
+                f.seek(KEY_INDEX_HEADER.size + (row_count - len(new_keys)) * new_keys.itemsize)
+                f.write(new_keys.tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+                f.seek(0)
+                f.write(KEY_INDEX_HEADER.pack(KEY_INDEX_MAGIC, KEY_INDEX_VERSION, size, mtime_ns, row_count))
+        except OSError as e:
+            print(f"Warning: Could not update CSV key index: {e}")
+
+    @staticmethod
+    def encode_rows(rows, header=False, metadata=False):
+        """
+        Format rows as CSV text
+
+        Args:
+            rows (list): (folder, drive) tuples, or (folder, drive, size, file
+                count, newest mtime) tuples whose metadata is numbers or
+                already formatted strings
+            header (bool): Start with the header row
+            metadata (bool): Write the metadata columns
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(CSV_HEADER + METADATA_HEADER if metadata else CSV_HEADER)
+        if not metadata:
+            writer.writerows(row[:2] for row in rows)
+            return buffer.getvalue()
+        for row in rows:
+            if len(row) < 5:
+                writer.writerow([row[0], row[1], '', '', ''])
+            elif isinstance(row[2], str):
+                writer.writerow(row[:5])
+            else:
+                writer.writerow([row[0], row[1]] + CsvCatalog.format_metadata(*row[2:5]))
+        return buffer.getvalue()
+
+    def write_rows(self, rows, metadata=False):
+        """
+        Atomically replace the CSV with the given rows
+
+        Args:
+            rows (list): List of (folder name, drive name) tuples, with metadata
+                as in encode_rows
+            metadata (bool): Write the metadata columns
+        """
+        text = CsvCatalog.encode_rows(rows, header=True, metadata=metadata)
+        CsvCatalog.write_atomic(self.csv_file_path, lambda f: f.write(text))
+        self.write_key_index(array('Q', (CsvCatalog.get_row_key(row[0], row[1]) for row in rows)))
+
+    def append_rows(self, rows, keys, metadata=False):
+        """
+        Append rows to the end of the CSV without touching existing rows
+
+        Args:
+            rows (list): List of (folder name, drive name) tuples to append
+            keys (array): Current row keys from load_keys, extended in place
+            metadata (bool): Write the metadata columns; only for CSVs that have them
+        """
+        if not rows:
+            return
+        row_texts = [CsvCatalog.encode_rows([row], metadata=metadata) for row in rows]
+        text = ''.join(row_texts)
+        # Only an index that matches the file before the append can be extended
+        row_offsets = self.read_row_index()
+
+        # Make sure the new rows don't get joined onto an unterminated last line
+        with open(self.csv_file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            start = f.tell()
+            if start > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) not in (b'\n', b'\r'):
+                    text = '\r\n' + text
+                    start += 2
+
+        # A single write, so a crash can at worst leave a partial last row
+        with open(self.csv_file_path, 'a', newline='') as csvfile:
+            csvfile.write(text)
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+
+        new_keys = array('Q', (CsvCatalog.get_row_key(row[0], row[1]) for row in rows))
+        keys.extend(new_keys)
+        self.append_key_index(new_keys, len(keys))
+
+        if row_offsets is not None:
+            for row, row_text in zip(rows, row_texts):
+                if CsvCatalog.clean_row(row[:2]) is not None:
+                    row_offsets.append(start)
+                start += len(row_text.encode(self.encoding))
+            self.write_row_index(row_offsets)
+
+    def compact(self):
+        """
+        Remove duplicate rows and sort the CSV by drive name
+
+        Returns:
+            int: Number of rows in the compacted CSV
+        """
+        if self.has_metadata_columns():
+            # Keep each folder's latest metadata, at its first position
+            rows = {}
+            for row in self.read_rows(width=5):
+                rows[row[:2]] = row
+            rows = list(rows.values())
+            metadata = True
+        else:
+            rows = list(dict.fromkeys(self.read_rows()))
+            metadata = False
+        rows.sort(key=lambda x: x[1])
+        self.write_rows(rows, metadata)
+        return len(rows)
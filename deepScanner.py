@@ -0,0 +1,158 @@
+import os
+import re
+import fnmatch
+import threading
+
+# Nesting levels listed by default; 1 is the top level of the mastering folder
+DEFAULT_MAX_DEPTH = 3
+# Subtrees of the mastering folder walked at the same time
+DEFAULT_DEEP_SCAN_WORKERS = 4
+
+
+class DeepScanner:
+    """
+    Lists the folders of a mastering folder recursively.
+    Built on os.scandir, whose entries carry the directory type from the
+    listing itself, so folders are told apart from files without a stat call
+    per entry. Each top-level folder's subtree is walked by its own worker.
+    Paths are returned relative to the mastering folder, joined with "/".
+    """
+
+    def __init__(self, max_depth=DEFAULT_MAX_DEPTH, include=None, exclude=None, follow_symlinks=False,
+                 max_workers=DEFAULT_DEEP_SCAN_WORKERS):
+        """
+        Args:
+            max_depth (int): Deepest level to list, or None for no limit
+            include (list): Glob patterns; only matching folders are written, but
+                every folder is still searched for matching subfolders
+            exclude (list): Glob patterns; matching folders are skipped along with
+                everything inside them
+            follow_symlinks (bool): Descend into symlinked folders, visiting each real folder once
+            max_workers (int): Subtrees walked in parallel
+        """
+        self.max_depth = max_depth
+        # As given, to tell whether an earlier run's listings used the same options
+        self.settings = {'max_depth': max_depth, 'include': list(include or []), 'exclude': list(exclude or []),
+                         'follow_symlinks': follow_symlinks}
+        self.include = DeepScanner.compile_patterns(include)
+        self.exclude = DeepScanner.compile_patterns(exclude)
+        self.follow_symlinks = follow_symlinks
+        self.max_workers = max_workers
+
+    @staticmethod
+    def compile_patterns(patterns):
+        """
+        Compile glob patterns into one case-insensitive regex per kind
+
+        Patterns containing "/" are matched against the relative path and the
+        rest against the folder name alone.
+
+        Returns:
+            tuple: (name regex or None, path regex or None), or None if there are no patterns
+        """
+        if not patterns:
+            return None
+        names = [fnmatch.translate(p) for p in patterns if '/' not in p]
+        paths = [fnmatch.translate(p.strip('/')) for p in patterns if '/' in p]
+        return (
+            re.compile('|'.join(names), re.I) if names else None,
+            re.compile('|'.join(paths), re.I) if paths else None,
+        )
+
+    @staticmethod
+    def matches(patterns, name, path):
+        name_regex, path_regex = patterns
+        return bool((name_regex and name_regex.match(name)) or (path_regex and path_regex.match(path)))
+
+    def scan(self, mastering_folder):
+        """
+        List the folders under a mastering folder
+
+        Args:
+            mastering_folder (str): Path to the mastering folder
+
+        Returns:
+            list: Relative folder paths, each folder followed by its subfolders
+        """
+        # Imported here to keep startup of the command line tool fast
+        from concurrent.futures import ThreadPoolExecutor
+
+        visited = set()
+        visited_lock = threading.Lock()
+        if self.follow_symlinks:
+            st = os.stat(mastering_folder)
+            visited.add((st.st_dev, st.st_ino))
+
+        top_level = self.list_folder(mastering_folder, '', visited, visited_lock)
+        if self.max_depth is not None and self.max_depth <= 1:
+            return [path for path, _, keep in top_level if keep]
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            subtrees = [executor.submit(self.walk, full_path, path, visited, visited_lock)
+                        for path, full_path, _ in top_level]
+            folders = []
+            for (path, _, keep), subtree in zip(top_level, subtrees):
+                if keep:
+                    folders.append(path)
+                folders.extend(subtree.result())
+        return folders
+
+    def walk(self, folder, relative_path, visited, visited_lock):
+        """List every folder below one top-level folder, each followed by its subfolders"""
+        folders = []
+        # Each stack entry is (full path, relative path, depth, keep); the
+        # top-level folder itself is written by scan
+        stack = [(folder, relative_path, 1, False)]
+        while stack:
+            full_path, path, depth, keep = stack.pop()
+            if keep:
+                folders.append(path)
+            if self.max_depth is not None and depth >= self.max_depth:
+                continue
+            children = self.list_folder(full_path, path + '/', visited, visited_lock)
+            # Pushed in reverse so they come off the stack in listing order
+            for child_path, child_full_path, child_keep in reversed(children):
+                stack.append((child_full_path, child_path, depth + 1, child_keep))
+        return folders
+
+    def list_folder(self, full_path, prefix, visited, visited_lock):
+        """
+        List the subfolders of one folder
+
+        Returns:
+            list: (relative path, full path, keep) per subfolder, where keep
+                is False for folders filtered out by the include patterns
+        """
+        children = []
+        try:
+            with os.scandir(full_path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith('.'):
+                        continue
+                    path = prefix + name
+                    if self.exclude and DeepScanner.matches(self.exclude, name, path):
+                        continue
+                    try:
+                        if entry.is_symlink():
+                            if not self.follow_symlinks or not entry.is_dir():
+                                continue
+                        elif not entry.is_dir(follow_symlinks=False):
+                            continue
+                        if self.follow_symlinks:
+                            # Skip folders already reached another way, so links back
+                            # up the tree can't loop forever
+                            st = entry.stat()
+                            key = (st.st_dev, st.st_ino)
+                            with visited_lock:
+                                if key in visited:
+                                    continue
+                                visited.add(key)
+                    except OSError:
+                        continue
+                    keep = not self.include or DeepScanner.matches(self.include, name, path)
+                    children.append((path, entry.path, keep))
+        except OSError:
+            # Unreadable folders are skipped rather than failing the whole drive
+            pass
+        return children
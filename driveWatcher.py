@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from backend import Folders2CSVBackend
+from backendHelpers import BackendHelpers
+from progressEvents import ProgressEvent, STAGE_DISCOVER
+
+# Seconds between checks of the volume root
+DEFAULT_POLL_INTERVAL = 2.0
+# Seconds without new mounts before pending drives are processed, so a burst
+# of drives plugged in together is cataloged in one run
+DEFAULT_SETTLE_SECONDS = 5.0
+# The volume root is listed at least this often even if its mtime is unchanged
+FULL_LIST_INTERVAL = 60.0
+
+
+class DriveWatcher:
+    """
+    Watches the volume root for newly mounted Audio Archive drives and adds
+    only those drives to the catalog.
+    Each poll is a single stat of the volume root; it is only listed again
+    when its mtime changes (a mount point was added or removed) or every
+    FULL_LIST_INTERVAL seconds as a fallback.
+    """
+
+    def __init__(self, csv_file_path, poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 process_existing=False, progress_callback=None, on_processed=None):
+        self.csv_file_path = csv_file_path
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.progress_callback = progress_callback
+        self.on_processed = on_processed
+        self.root_mtime_ns = None
+        self.last_full_list = 0
+        self.pending = set()
+        self.last_event = 0
+        self.stop_event = threading.Event()
+
+        # Drives mounted before the watcher started are left alone unless asked
+        self.known = set() if process_existing else set(self.list_drives())
+        self.pending.update(set(self.list_drives()) - self.known)
+        self.known.update(self.pending)
+
+    def list_drives(self):
+        """List the Audio Archive drives under the volume root"""
+        try:
+            return BackendHelpers.getDrives()
+        except OSError:
+            return []
+
+    def poll(self, now=None):
+        """
+        Check for mount changes once
+
+        Args:
+            now (float): Current time, for tests
+
+        Returns:
+            list: Drives that are ready to be processed
+        """
+        if now is None:
+            now = time.monotonic()
+        try:
+            root_mtime_ns = os.stat(BackendHelpers.volumesRoot).st_mtime_ns
+        except OSError:
+            root_mtime_ns = None
+
+        if root_mtime_ns != self.root_mtime_ns or now - self.last_full_list >= FULL_LIST_INTERVAL:
+            self.root_mtime_ns = root_mtime_ns
+            self.last_full_list = now
+            current = set(self.list_drives())
+            mounted = current - self.known
+            if mounted:
+                self.pending.update(mounted)
+                self.last_event = now
+                self.report(f"Detected drives: {', '.join(sorted(mounted))}")
+            # Forget unmounted drives so they are cataloged again when reattached
+            self.known = current
+            self.pending &= current
+
+        if self.pending and now - self.last_event >= self.settle_seconds:
+            ready = sorted(self.pending)
+            self.pending.clear()
+            return ready
+        return []
+
+    def process(self, drives):
+        """Add the given drives to the catalog"""
+        result = Folders2CSVBackend.process_drives_to_csv(drives, self.csv_file_path, self.progress_callback)
+        if self.on_processed:
+            self.on_processed(drives, result)
+        return result
+
+    def report(self, message):
+        if self.progress_callback:
+            self.progress_callback(ProgressEvent(STAGE_DISCOVER, message))
+
+    def run(self):
+        """Poll until stop() is called, processing drives as they settle"""
+        self.last_event = time.monotonic()
+        while not self.stop_event.is_set():
+            ready = self.poll()
+            if ready:
+                self.process(ready)
+            self.stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        """Stop a running watcher"""
+        self.stop_event.set()
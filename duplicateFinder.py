@@ -0,0 +1,359 @@
+import os
+import hashlib
+from folderMetadata import MetadataCache
+from progressEvents import RunStats, STAGE_HASH
+
+# Bytes hashed from the start, middle and end of a file for its partial hash;
+# files up to three times this size are hashed whole
+DEFAULT_SAMPLE_SIZE = 64 * 1024
+# Files hashed per task sent to a worker process
+HASH_BATCH_SIZE = 16
+# Read size when hashing whole files
+HASH_CHUNK_SIZE = 1024 * 1024
+# Share of bytes two same-named folders need in common to count as near-identical
+DEFAULT_SIMILARITY = 0.9
+
+HASH_CACHE_VERSION = 1
+
+# Fields of a file's hash cache entry
+FILE_SIZE, FILE_MTIME, FILE_PARTIAL, FILE_FULL = range(4)
+
+
+def hash_file(path, sample_size=None):
+    """
+    Hash a file's contents
+
+    Args:
+        path (str): File to read
+        sample_size (int): Only hash this many bytes from the start, middle and
+            end of the file, or None to hash all of it
+
+    Returns:
+        str: Hex digest, or None if the file can't be read
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if sample_size is None or size <= 3 * sample_size:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            else:
+                for offset in (0, (size - sample_size) // 2, size - sample_size):
+                    f.seek(offset)
+                    digest.update(f.read(sample_size))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def hash_files(paths, sample_size=None):
+    """Hash a batch of files; runs in a worker process"""
+    return [hash_file(path, sample_size) for path in paths]
+
+
+class HashCache(MetadataCache):
+    """
+    File hashes from earlier duplicate searches, one JSON file per drive.
+    Each file is stored under its path relative to the mastering folder as
+    [size, mtime_ns, partial hash, full hash], the full hash being None
+    until some other folder had the same partial hashes. Entries are only
+    used while the file's size and mtime are unchanged.
+    """
+
+    folder_name = 'hash_cache'
+    version = HASH_CACHE_VERSION
+
+
+class FolderCopy:
+    """One scanned folder taking part in a duplicate search"""
+
+    __slots__ = ('drive_name', 'mastering_folder', 'folder', 'drive', 'size', 'file_count', 'files')
+
+    def __init__(self, drive_name, mastering_folder, folder, drive, size, file_count):
+        self.drive_name = drive_name  # Mounted name, used for paths and the cache
+        self.mastering_folder = mastering_folder
+        self.folder = folder
+        self.drive = drive  # Name as written to the catalog
+        self.size = size
+        self.file_count = file_count
+        # (relative path, hash cache entry) per file, listed once the folder is a candidate
+        self.files = None
+
+
+class DuplicateGroup:
+    """
+    Folders found to hold the same files.
+    similarity is 1.0 for identical copies; near-identical folders have the
+    share of bytes they have in common.
+    """
+
+    __slots__ = ('folders', 'size', 'file_count', 'similarity', 'wasted')
+
+    def __init__(self, folders, size, file_count, similarity=1.0, wasted=None):
+        self.folders = folders  # (drive, folder) pairs
+        self.size = size
+        self.file_count = file_count
+        self.similarity = similarity
+        # Bytes freed by keeping only one copy
+        self.wasted = size * (len(folders) - 1) if wasted is None else wasted
+
+    def __repr__(self):
+        return f"DuplicateGroup({self.folders!r}, size={self.size}, similarity={self.similarity:.3f})"
+
+
+class DuplicateFinder:
+    """
+    Finds project folders copied onto more than one drive.
+    Candidates are narrowed in stages, each more expensive than the last:
+    folders with the same total size and file count (from the scan's folder
+    metadata), then the same file paths, sizes and partial hashes (samples
+    from the start, middle and end of each file), then the same full hashes.
+    Most folders are ruled out before any file is opened, and only files in
+    folders that still match are read in full.
+
+    Hashing runs in a process pool. Hashes are cached per drive by (size,
+    mtime), so a rerun only reads files that changed.
+    """
+
+    def __init__(self, cache=None, max_workers=None, sample_size=DEFAULT_SAMPLE_SIZE, force_rescan=False,
+                 similarity=None):
+        """
+        Args:
+            cache (HashCache): Optional cache of earlier file hashes
+            max_workers (int): Worker processes; defaults to the number of CPUs
+            sample_size (int): Bytes per sample in partial hashes
+            force_rescan (bool): Hash every file again, ignoring the cache
+            similarity (float): Also report same-named folders sharing at least this
+                share of their bytes, compared by partial hashes; None to only
+                report identical folders
+        """
+        self.cache = cache
+        self.max_workers = max_workers
+        self.sample_size = sample_size
+        self.force_rescan = force_rescan
+        self.similarity = similarity
+        self.hashes = {}  # Drive name to its hash cache entries
+        self.executor = None
+
+    def find(self, scan_results, stats=None):
+        """
+        Find duplicate folders among scanned drives
+
+        Args:
+            scan_results (list): (drive name, mastering folder, Catalog) tuples from
+                Folders2CSVBackend.scan_drives, measured with folder metadata
+            stats (RunStats): Optional run timings; hashing is recorded in the hash stage
+
+        Returns:
+            list: DuplicateGroup per set of duplicate folders, most wasted space first
+        """
+        if stats is None:
+            stats = RunStats()
+        copies = []
+        for drive_name, mastering_folder, folder_data in scan_results:
+            for i, folder in enumerate(folder_data.folders):
+                metadata = folder_data.get_metadata(i)
+                # Empty folders all look alike, so they are never reported
+                if metadata is not None and metadata[1] > 0:
+                    drive = folder_data.drives[folder_data.drive_ids[i]]
+                    copies.append(FolderCopy(drive_name, mastering_folder, folder, drive, metadata[0], metadata[1]))
+
+        try:
+            with stats.stage(STAGE_HASH):
+                groups = DuplicateFinder.group_by(copies, lambda copy: (copy.size, copy.file_count))
+                stats.emit(STAGE_HASH, f"{sum(len(group) for group in groups)} folders have the same size as another")
+                groups = self.narrow(groups, FILE_PARTIAL, stats)
+                groups = self.narrow(groups, FILE_FULL, stats)
+                found = [DuplicateGroup([(copy.drive, copy.folder) for copy in group], group[0].size,
+                                        group[0].file_count) for group in groups]
+                if self.similarity is not None:
+                    # An identical group is compared through one copy per folder name,
+                    # so a near copy elsewhere is reported once rather than not at all
+                    matched = {id(copy) for group in groups for copy in group}
+                    representatives = [list({copy.folder.lower(): copy for copy in reversed(group)}.values())
+                                       for group in groups]
+                    candidates = [copy for copy in copies if id(copy) not in matched]
+                    candidates.extend(copy for group in representatives for copy in group)
+                    found.extend(self.find_similar(candidates, stats))
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+        self.save_cache(scan_results)
+        found.sort(key=lambda group: group.wasted, reverse=True)
+        return found
+
+    @staticmethod
+    def group_by(copies, key):
+        """Group folders by a key, keeping only groups of two or more"""
+        groups = {}
+        for copy in copies:
+            value = key(copy)
+            if value is not None:
+                groups.setdefault(value, []).append(copy)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def narrow(self, groups, field, stats):
+        """Split candidate groups by their folders' partial or full hashes"""
+        self.hash_folders([copy for group in groups for copy in group], field, stats)
+        narrowed = []
+        for group in groups:
+            narrowed.extend(DuplicateFinder.group_by(group, lambda copy: DuplicateFinder.fingerprint(copy, field)))
+        return narrowed
+
+    @staticmethod
+    def fingerprint(copy, field):
+        """Combine the paths, sizes and hashes of a folder's files, or None if any file is unreadable"""
+        digest = hashlib.blake2b(digest_size=16)
+        for path, file in copy.files:
+            if file[field] is None:
+                return None
+            digest.update(f"{path}\0{file[FILE_SIZE]}\0{file[field]}\n".encode('utf-8', 'surrogateescape'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def list_files(full_path):
+        """
+        List every file below a folder, without following symlinks
+
+        Returns:
+            list: (relative path, [size, mtime_ns, None, None]) per file, sorted by path
+        """
+        files = []
+        stack = [(full_path, '')]
+        while stack:
+            path, prefix = stack.pop()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append((entry.path, prefix + entry.name + '/'))
+                            elif entry.is_file(follow_symlinks=False):
+                                st = entry.stat(follow_symlinks=False)
+                                files.append((prefix + entry.name, [st.st_size, st.st_mtime_ns, None, None]))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        files.sort()
+        return files
+
+    def get_hashes(self, drive_name):
+        """Get a drive's cached hash entries, loading them the first time"""
+        hashes = self.hashes.get(drive_name)
+        if hashes is None:
+            hashes = self.hashes[drive_name] = self.cache.load(drive_name) if self.cache is not None else {}
+        return hashes
+
+    def hash_folders(self, copies, field, stats):
+        """
+        Fill in the partial or full hash of every file in some folders
+
+        Cached hashes are used where the file is unchanged; the rest are read
+        by the worker processes.
+        """
+        pending = []
+        for copy in copies:
+            if copy.files is None:
+                copy.files = DuplicateFinder.list_files(os.path.join(copy.mastering_folder, copy.folder))
+            hashes = self.get_hashes(copy.drive_name)
+            for i, (path, file) in enumerate(copy.files):
+                # Files share their entry with the cache, so new hashes are cached as they are set
+                key = copy.folder + '/' + path
+                entry = hashes.get(key)
+                if (entry is not None and entry[FILE_SIZE] == file[FILE_SIZE] and entry[FILE_MTIME] == file[FILE_MTIME]
+                        and not self.force_rescan):
+                    file = entry
+                else:
+                    hashes[key] = file
+                copy.files[i] = (path, file)
+                if file[field] is None:
+                    pending.append((file, os.path.join(copy.mastering_folder, copy.folder, path)))
+
+        if not pending:
+            return
+        sample_size = self.sample_size if field == FILE_PARTIAL else None
+        kind = "partial" if field == FILE_PARTIAL else "full"
+        batches = [pending[i:i + HASH_BATCH_SIZE] for i in range(0, len(pending), HASH_BATCH_SIZE)]
+        done = 0
+        for batch, digests in zip(batches, self.map_batches(batches, sample_size)):
+            for (file, _), digest in zip(batch, digests):
+                file[field] = digest
+                # Small files are hashed whole for their partial hash, so it doubles as the full hash
+                if field == FILE_PARTIAL and file[FILE_SIZE] <= 3 * self.sample_size:
+                    file[FILE_FULL] = digest
+            done += len(batch)
+            stats.emit(STAGE_HASH, f"Computed {kind} hashes of {done} of {len(pending)} files",
+                       done=done, total=len(pending))
+        stats.add_count(STAGE_HASH, len(pending))
+
+    def map_batches(self, batches, sample_size):
+        """Hash batches of (file, path) in the process pool, yielding results in order"""
+        if len(batches) == 1:
+            # Starting worker processes costs more than hashing a few files
+            yield hash_files([path for _, path in batches[0]], sample_size)
+            return
+        if self.executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        futures = [self.executor.submit(hash_files, [path for _, path in batch], sample_size)
+                   for batch in batches]
+        for future in futures:
+            yield future.result()
+
+    def find_similar(self, copies, stats):
+        """
+        Find pairs of same-named folders on different drives that share most of their bytes
+
+        Files are matched by relative path, size and partial hash, or full
+        hash where both files already have one.
+
+        Returns:
+            list: DuplicateGroup per pair, with the shared bytes as wasted space
+        """
+        pairs = []
+        for group in DuplicateFinder.group_by(copies, lambda copy: copy.folder.lower()):
+            for i, first in enumerate(group):
+                for second in group[i + 1:]:
+                    # A pair can't reach the threshold if one folder is much bigger
+                    if (first.drive != second.drive and
+                            min(first.size, second.size) >= self.similarity * max(first.size, second.size)):
+                        pairs.append((first, second))
+        if not pairs:
+            return []
+
+        stats.emit(STAGE_HASH, f"Comparing {len(pairs)} pairs of similar folders")
+        self.hash_folders(list({id(copy): copy for pair in pairs for copy in pair}.values()), FILE_PARTIAL, stats)
+        found = []
+        for first, second in pairs:
+            files = dict(first.files)
+            shared = sum(file[FILE_SIZE] for path, file in second.files
+                         if DuplicateFinder.same_file(files.get(path), file))
+            similarity = shared / max(first.size, second.size)
+            if similarity >= self.similarity:
+                found.append(DuplicateGroup([(first.drive, first.folder), (second.drive, second.folder)],
+                                            min(first.size, second.size), min(first.file_count, second.file_count),
+                                            similarity, shared))
+        return found
+
+    @staticmethod
+    def same_file(first, second):
+        """Compare two hash cache entries by the most precise hash both have"""
+        if first is None or first[FILE_SIZE] != second[FILE_SIZE] or first[FILE_PARTIAL] is None:
+            return False
+        if first[FILE_FULL] is not None and second[FILE_FULL] is not None:
+            return first[FILE_FULL] == second[FILE_FULL]
+        return first[FILE_PARTIAL] == second[FILE_PARTIAL]
+
+    def save_cache(self, scan_results):
+        """Save the hashes of every drive involved, dropping files in folders no longer on the drive"""
+        if self.cache is None:
+            return
+        folders = {drive_name: set(folder_data.folders) for drive_name, _, folder_data in scan_results}
+        for drive_name, hashes in self.hashes.items():
+            current = folders.get(drive_name, ())
+            self.cache.save(drive_name, {key: entry for key, entry in hashes.items()
+                                         if key.split('/', 1)[0] in current})
+        self.hashes = {}
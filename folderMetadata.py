@@ -0,0 +1,240 @@
+import os
+import json
+import stat
+import time
+import hashlib
+from backendHelpers import BackendHelpers
+from catalog import Catalog, UNKNOWN
+
+# Folders whose subtrees are measured at the same time
+DEFAULT_METADATA_WORKERS = 4
+# Drives not measured for this many days are dropped from the cache
+DEFAULT_MAX_AGE_DAYS = 90
+
+METADATA_CACHE_VERSION = 1
+
+
+class MetadataCache:
+    """
+    Per-directory aggregates from earlier metadata scans, one JSON file per
+    drive in the config directory. Each directory is stored under its path
+    relative to the mastering folder as
+    [inode, mtime_ns, bytes, file count, newest mtime, subfolder names],
+    where the totals cover only the files directly inside it.
+
+    A directory's mtime changes when entries are added, removed or renamed
+    in it, but not when a file inside it is rewritten in place. Such edits
+    are picked up by a forced rescan, which ignores the cache.
+    """
+
+    # Folder in the config directory and format version; subclasses storing
+    # other per-drive entries override these
+    folder_name = 'metadata_cache'
+    version = METADATA_CACHE_VERSION
+
+    def __init__(self, cache_folder=None, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        if cache_folder is None:
+            cache_folder = os.path.join(BackendHelpers.getAppSupportFolder(), self.folder_name)
+        self.cache_folder = cache_folder
+        self.max_age_days = max_age_days
+
+    def get_path(self, drive_name):
+        """Get the cache file of a drive; names are hashed so any drive name is a safe file name"""
+        digest = hashlib.blake2b(drive_name.encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.cache_folder, f"{digest}.json")
+
+    def load(self, drive_name):
+        """
+        Load a drive's entries
+
+        Returns:
+            dict: Relative path to entry, empty if there is no usable cache
+        """
+        try:
+            with open(self.get_path(drive_name), 'r') as f:
+                cache = json.load(f)
+            if cache.get('version') == self.version and cache.get('drive') == drive_name:
+                return cache.get('entries', {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def save(self, drive_name, entries):
+        """Replace a drive's entries, writing atomically"""
+        cache = {'version': self.version, 'drive': drive_name, 'last_seen': time.time(), 'entries': entries}
+        path = self.get_path(drive_name)
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not save {self.folder_name.replace('_', ' ')}: {e}")
+
+    def evict(self):
+        """Delete the caches of drives not measured within max_age_days"""
+        cutoff = time.time() - self.max_age_days * 86400
+        try:
+            names = os.listdir(self.cache_folder)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class FolderMetadata:
+    """
+    Measures total bytes, file count and newest file mtime of mastering
+    subfolders, like running du on each of them.
+    Each top-level folder's subtree is walked by its own worker with
+    os.scandir. Directories whose (inode, mtime) match the cache are not
+    listed again, so a repeat scan stats each directory once and only lists
+    the ones that changed. Symlinks are not followed or counted.
+    """
+
+    def __init__(self, cache=None, max_workers=DEFAULT_METADATA_WORKERS, force_rescan=False, cancel_event=None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.force_rescan = force_rescan
+        # Walks stop early once this is set; the caller discards their totals
+        self.cancel_event = cancel_event
+
+    def measure(self, mastering_folder, drive_name, folders):
+        """
+        Measure folders of one drive
+
+        Args:
+            mastering_folder (str): Path to the drive's mastering folder
+            drive_name (str): Name of the drive, used as the cache key
+            folders (list): Paths relative to the mastering folder, as listed by a scan
+
+        Returns:
+            list: (bytes, file count, newest mtime in seconds) per folder; newest
+                is UNKNOWN for folders without files
+        """
+        # Imported here to keep startup of the command line tool fast
+        from concurrent.futures import ThreadPoolExecutor
+
+        cached = self.cache.load(drive_name) if self.cache is not None and not self.force_rescan else {}
+
+        # Nested rows from a deep scan are covered by their top-level folder's walk
+        top_level = list(dict.fromkeys(folder.split('/', 1)[0] for folder in folders))
+        totals = {}
+        visited = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            walks = [executor.submit(self.walk, mastering_folder, folder, cached) for folder in top_level]
+            for walk in walks:
+                subtree_totals, subtree_dirs = walk.result()
+                totals.update(subtree_totals)
+                visited.update(subtree_dirs)
+
+        # Only directories seen in this scan are kept, so deleted ones drop out,
+        # unless the walk was cancelled before seeing them all
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            visited = dict(cached, **visited)
+        if self.cache is not None:
+            self.cache.save(drive_name, visited)
+        return [totals.get(folder, (UNKNOWN, UNKNOWN, UNKNOWN)) for folder in folders]
+
+    def walk(self, mastering_folder, folder, cached):
+        """
+        Measure one top-level folder and every directory below it
+
+        Returns:
+            tuple: (dict of relative path to (bytes, files, newest) totals,
+                dict of relative path to cache entry)
+        """
+        path = os.path.join(mastering_folder, folder)
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return {}, {}
+        if not stat.S_ISDIR(st.st_mode):
+            # Loose files in the mastering folder are listed too
+            return {folder: (st.st_size, 1, int(st.st_mtime))}, {}
+
+        # Pre-order list of (relative path, parent position, own totals)
+        order = []
+        dirs = {}
+        stack = [(folder, path, -1, st)]
+        while stack:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                break
+            relative_path, full_path, parent, st = stack.pop()
+            entry = cached.get(relative_path)
+            if entry is None or entry[0] != st.st_ino or entry[1] != st.st_mtime_ns:
+                entry = FolderMetadata.list_directory(full_path, st)
+            dirs[relative_path] = entry
+            position = len(order)
+            order.append([relative_path, parent, entry[2], entry[3], entry[4]])
+            for name in entry[5]:
+                child_path = os.path.join(full_path, name)
+                try:
+                    child_st = os.stat(child_path, follow_symlinks=False)
+                except OSError:
+                    continue
+                stack.append((relative_path + '/' + name, child_path, position, child_st))
+
+        # Children come after their parent, so adding in reverse rolls every
+        # subtree up into its root
+        for relative_path, parent, size, file_count, newest in reversed(order):
+            if parent >= 0:
+                totals = order[parent]
+                totals[2] += size
+                totals[3] += file_count
+                totals[4] = max(totals[4], newest)
+        return {item[0]: (item[2], item[3], item[4]) for item in order}, dirs
+
+    @staticmethod
+    def list_directory(full_path, st):
+        """
+        Total the files directly inside a directory
+
+        Returns:
+            list: Cache entry [inode, mtime_ns, bytes, file count, newest mtime, subfolder names]
+        """
+        size = 0
+        file_count = 0
+        newest = UNKNOWN
+        subfolders = []
+        try:
+            with os.scandir(full_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subfolders.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            entry_st = entry.stat(follow_symlinks=False)
+                            size += entry_st.st_size
+                            file_count += 1
+                            newest = max(newest, int(entry_st.st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return [st.st_ino, st.st_mtime_ns, size, file_count, newest, subfolders]
+
+    def add_metadata(self, mastering_folder, drive_name, folder_data):
+        """
+        Get a copy of a drive's listing with metadata for every folder
+
+        Args:
+            mastering_folder (str): Path to the drive's mastering folder
+            drive_name (str): Name of the drive
+            folder_data (Catalog): Folders found on the drive
+
+        Returns:
+            Catalog: The same rows with size, file count and newest mtime
+        """
+        measured = Catalog()
+        if not folder_data:
+            return measured
+        metadata = self.measure(mastering_folder, drive_name, folder_data.folders)
+        measured.add_folders(folder_data.folders, folder_data.drives[0], metadata)
+        return measured
@@ -3,7 +3,42 @@ from tkinter import ttk, filedialog, messagebox
 import threading
 import os
 import json
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from backend import Folders2CSVBackend
+from backendHelpers import BackendHelpers
+from catalog import Catalog, CatalogSelection
+from deepScanner import DeepScanner, DEFAULT_MAX_DEPTH
+from progressEvents import ProgressQueue, RunStats, get_run_progress, STAGE_LIST, STAGE_WRITE
+from scanSession import ScanSession
+from searchIndex import SearchIndex
+from catalogQuery import compile_query, QueryError
+from virtualTable import VirtualTable
+
+# Delay after the last keystroke before a search runs
+SEARCH_DEBOUNCE_MS = 150
+# Ways the search box can match: substring, ranked fuzzy match or query language
+SEARCH_MODE_CONTAINS = "Contains"
+SEARCH_MODE_FUZZY = "Fuzzy"
+SEARCH_MODE_QUERY = "Query"
+SEARCH_MODES = (SEARCH_MODE_CONTAINS, SEARCH_MODE_FUZZY, SEARCH_MODE_QUERY)
+# Rows shown while the rest of the CSV loads in the background
+FIRST_SCREEN_ROWS = 200
+# Drives whose folder counts are gathered at the same time
+DRIVE_INFO_WORKERS = 8
+# Interval between progress updates while processing (about 20 per second)
+PROGRESS_FRAME_MS = 50
+# File dialog choices for catalogs; sharded catalogs are opened by their manifest
+CATALOG_FILE_TYPES = [("CSV files", "*.csv"), ("SQLite catalogs", "*.db *.sqlite"), ("Sharded catalogs", "*.manifest"),
+                      ("All files", "*.*")]
+# Viewer columns, with the metadata columns shown when the catalog has them
+COLUMNS = ("Folder Name", "Drive Name")
+COLUMN_WIDTHS = (360, 160)
+METADATA_COLUMNS = COLUMNS + ("Size", "Files", "Newest Modified")
+METADATA_COLUMN_WIDTHS = (260, 120, 80, 60, 130)
+# Progress bar captions for the processing stages
+STAGE_LABELS = {STAGE_LIST: "Drives scanned", STAGE_WRITE: "Saving"}
 
 
 class Folders2CSVApp:
@@ -19,17 +54,47 @@ class Folders2CSVApp:
         self.selected_drives = []
         self.available_drives = []  # Store actual drive names
         self.drive_checkboxes = []  # Store checkbox variables
+        self.drive_checkbuttons = []  # Store checkbox widgets, updated as drive info arrives
+        self.drive_labels = []  # Checkbox texts without a processing status
+        self.refresh_generation = 0
+        self.scan_session = ScanSession()  # Listings from the last refresh, reused by processing
+        self.pending_drive_info = 0
+        self.drive_info_executor = ThreadPoolExecutor(max_workers=DRIVE_INFO_WORKERS)
         self.mode_var = tk.StringVar( )  # Toggle between add_drives and view_csv
         
         self.drives_loaded = False
         self.search_text = tk.StringVar(value="")
-        self.csv_data = []  # Store CSV data for viewing
+        self.search_mode_var = tk.StringVar(value=SEARCH_MODE_CONTAINS)
+        self.search_error = tk.StringVar(value="")  # Why the last query couldn't be run
+        self.force_rescan_var = tk.BooleanVar(value=False)
+        self.deep_scan_var = tk.BooleanVar(value=False)  # List nested folders too
+        self.deep_scan_depth = tk.IntVar(value=DEFAULT_MAX_DEPTH)
+        self.deep_scanner = None
+        self.collect_metadata_var = tk.BooleanVar(value=False)  # Measure folder sizes while processing
+        self.progress_var = tk.DoubleVar(value=0.0)
+        self.progress_status = tk.StringVar(value="")
+        self.progress_queue = ProgressQueue()  # Events from the processing thread
+        self.processing = False
+        self.progress_after_id = None
+        self.cancel_event = threading.Event()  # Set to stop the processing thread after its current drives
+        self.closed = False  # Set once the window is destroyed, so worker threads stop calling into Tk
+        self.csv_data = Catalog()  # Store CSV data for viewing
+        self.csv_load_generation = 0
+        self.search_catalog_path = None  # Set when the catalog has its own search index
+        self.search_index = None
+        self.search_after_id = None
+        self.search_generation = 0
+        self.sort_column = None  # Viewer column the rows are sorted by, if any
+        self.sort_reverse = False
+        # Index builds and searches run one at a time, in order, off the Tk thread
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
 
         # Load saved configuration
         self.load_saved_config()
 
         self.create_widgets()
-        self.refresh_drives()
+        if not self.drives_loaded:
+            self.refresh_drives()
         
     
     def create_widgets(self):
@@ -141,6 +206,37 @@ class Folders2CSVApp:
         
         self.process_button = ttk.Button(process_frame, text="Process Selected Drives", command=self.process_drives)
         self.process_button.grid(row=0, column=0, pady=(0, 10))
+        
+        self.compact_button = ttk.Button(process_frame, text="Sort & Compact CSV", command=self.compact_csv)
+        self.compact_button.grid(row=0, column=1, pady=(0, 10))
+        
+        self.cancel_button = ttk.Button(process_frame, text="Cancel", command=self.cancel_processing, state="disabled")
+        self.cancel_button.grid(row=0, column=2, pady=(0, 10))
+        
+        ttk.Checkbutton(
+            process_frame,
+            text="Force rescan (ignore cached listings)",
+            variable=self.force_rescan_var
+        ).grid(row=1, column=0)
+        
+        deep_scan_frame = ttk.Frame(process_frame)
+        deep_scan_frame.grid(row=1, column=1)
+        ttk.Checkbutton(
+            deep_scan_frame,
+            text="Deep scan, levels:",
+            variable=self.deep_scan_var
+        ).grid(row=0, column=0)
+        ttk.Spinbox(deep_scan_frame, from_=1, to=20, width=3, textvariable=self.deep_scan_depth).grid(row=0, column=1)
+        
+        ttk.Checkbutton(
+            process_frame,
+            text="Record folder sizes and file counts",
+            variable=self.collect_metadata_var
+        ).grid(row=2, column=0)
+        
+        self.progress_bar = ttk.Progressbar(process_frame, variable=self.progress_var, maximum=1.0, mode='determinate')
+        self.progress_bar.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        ttk.Label(process_frame, textvariable=self.progress_status).grid(row=4, column=0, columnspan=2, sticky=tk.W)
 
 
     def create_view_csv_section(self):
@@ -158,6 +254,12 @@ class Folders2CSVApp:
         search_entry = ttk.Entry(search_container, width=30, textvariable=self.search_text)
         search_entry.grid(row=1, column=0, sticky=(tk.W, tk.E))
         search_entry.bind('<KeyRelease>', self.on_search_entry_changed)
+        search_mode = ttk.Combobox(search_container, textvariable=self.search_mode_var, values=SEARCH_MODES,
+                                   state="readonly", width=9)
+        search_mode.grid(row=1, column=1, sticky=tk.W, padx=(10, 0))
+        search_mode.bind('<<ComboboxSelected>>', lambda event: self.run_search())
+        ttk.Label(search_container, textvariable=self.search_error, foreground="red").grid(
+            row=2, column=0, columnspan=2, sticky=tk.W)
 
         data_frame = ttk.LabelFrame(self.view_csv_frame, padding="10")
         data_frame.grid(row=1, column=0, sticky=(tk.N, tk.S, tk.E, tk.W), pady=(0, 10))
@@ -169,6 +271,11 @@ class Folders2CSVApp:
         databox_frame.columnconfigure(0, weight=1)
         databox_frame.rowconfigure(0, weight=1)
         
+        # Only the visible rows are ever turned into widgets
+        self.csv_table = VirtualTable(databox_frame, on_sort=self.on_sort_column)
+        self.csv_table.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.no_data_label = ttk.Label(databox_frame, text="No data to display")
+        
         # Store reference for later use
         self.databox_frame = databox_frame
 
@@ -254,11 +361,7 @@ class Folders2CSVApp:
 
     def get_config_path(self):
         """Get path to config file in Application Support dir"""
-        app_support = os.path.expanduser('~/Library/Application Support')
-        app_folder = os.path.join(app_support, 'Folders2CSV')
-        if not os.path.exists(app_folder):
-            os.makedirs(app_folder, exist_ok=True)
-        return os.path.join(app_folder, 'config.json')
+        return os.path.join(BackendHelpers.getAppSupportFolder(), 'config.json')
     
     def on_drives_frame_configure(self, event):
         """Update canvas scroll region when frame size changes"""
@@ -278,7 +381,7 @@ class Folders2CSVApp:
         """Browse for an existing CSV file"""
         file_path = filedialog.askopenfilename(
             title="Select Existing CSV File",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes=CATALOG_FILE_TYPES,
             initialdir=os.path.expanduser('~/Downloads')
         )
         if file_path:
@@ -294,7 +397,7 @@ class Folders2CSVApp:
         file_path = filedialog.asksaveasfilename(
             title="Create New CSV File",
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes=CATALOG_FILE_TYPES,
             initialdir=os.path.expanduser('~/Downloads'),
             initialfile="mastering_folders.csv"
         )
@@ -305,114 +408,208 @@ class Folders2CSVApp:
             self.validate_csv_selection(file_path)
             # Clear data display for new files
             if self.mode_var.get() == "view_csv":
-                self.csv_data = []
-                self.display_csv_data()
+                self.csv_load_generation += 1
+                self.search_catalog_path = None
+                self.set_csv_data(Catalog())
 
     def load_and_display_csv_data(self):
         """Load CSV data and update the display"""
+        self.csv_load_generation += 1
         csv_path = self.csv_file_path.get()
+        self.search_catalog_path = None
         if not csv_path:
-            self.csv_data = []
-            self.display_csv_data()
+            self.set_csv_data(Catalog())
             return
         
+        # Indexed catalogs are searched on disk instead of in memory
+        if Folders2CSVBackend.has_search_index(csv_path):
+            self.search_catalog_path = csv_path
+        
+        # Show the first screen straight away, then load the rest in the background
         try:
-            self.csv_data = Folders2CSVBackend.get_csv_contents(csv_path)
-            self.display_csv_data()
+            first_rows = itertools.islice(Folders2CSVBackend.iter_csv_contents(csv_path), FIRST_SCREEN_ROWS)
+            self.set_csv_data(Catalog(first_rows))
         except Exception as e:
             messagebox.showerror("Error", f"Could not load CSV file: {e}")
-            self.csv_data = []
+            self.set_csv_data(Catalog())
+            return
+        
+        thread = threading.Thread(target=self.load_csv_thread, args=(self.csv_load_generation, csv_path))
+        thread.daemon = True
+        thread.start()
+
+    def load_csv_thread(self, generation, csv_path):
+        """Load the full CSV in a separate thread"""
+        data = Folders2CSVBackend.get_csv_contents(csv_path)
+        self.run_in_ui(self.csv_load_complete, generation, data)
+
+    def csv_load_complete(self, generation, data):
+        """Called when the full CSV has been loaded"""
+        # Ignore loads superseded by another file or a newer load
+        if generation == self.csv_load_generation:
+            self.set_csv_data(data)
+
+    def set_csv_data(self, data):
+        """Replace the viewer data, rebuild its search index and redisplay"""
+        self.csv_data = data
+        # Drop results of searches still running against the old data
+        self.search_generation += 1
+        self.search_executor.submit(self.build_search_index, data)
+        if data.has_metadata:
+            self.csv_table.set_columns(METADATA_COLUMNS, METADATA_COLUMN_WIDTHS, self.format_metadata_row)
+        else:
+            self.csv_table.set_columns(COLUMNS, COLUMN_WIDTHS)
+        self.csv_table.set_sort_indicator(self.sort_column, self.sort_reverse)
+        if self.search_text.get() or self.sort_column is not None:
+            self.run_search()
+        else:
             self.display_csv_data()
 
-    def display_csv_data(self):
+    def build_search_index(self, data):
+        """Build the search index for newly loaded data (search thread)"""
+        self.search_index = None if self.search_catalog_path else SearchIndex(data)
+
+    def display_csv_data(self, filtered_data=None):
         """Display the CSV data in the view section"""
-        # Use the stored reference to databox_frame
-        databox_frame = self.databox_frame
-        
-        if not databox_frame:
-            return
-        
-        # Clear existing content
-        for widget in databox_frame.winfo_children():
-            widget.destroy()
+        if filtered_data is None:
+            filtered_data = self.csv_data
         
         if not self.csv_data:
-            ttk.Label(databox_frame, text="No data to display").grid(row=0, column=0, sticky=(tk.W, tk.E), padx=10, pady=10)
-            return
-        
-        # Create scrollable canvas with same style as drives section
-        canvas = tk.Canvas(
-            databox_frame,
-            height=300,
-            borderwidth=0,
-            highlightthickness=0,
-            relief="flat",
-            takefocus=0
-        )
-        scrollbar = ttk.Scrollbar(databox_frame, orient=tk.VERTICAL, command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas_window = canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Handle canvas resize
-        def on_canvas_configure(event):
-            canvas_width = event.width
-            canvas.itemconfig(canvas_window, width=canvas_width)
-        
-        canvas.bind("<Configure>", on_canvas_configure)
-        
-        # Filter data based on search text
-        search_term = self.search_text.get().lower()
-        filtered_data = self.csv_data
-        if search_term:
-            filtered_data = [
-                (folder, drive) for folder, drive in self.csv_data
-                if search_term in folder.lower() or search_term in drive.lower()
-            ]
-                
-        # Display data rows
-        for i, (folder_name, drive_name) in enumerate(filtered_data):
-            row_frame = ttk.Frame(scrollable_frame)
-            row_frame.grid(row=i, column=0, sticky=(tk.W, tk.E), padx=5, pady=1)
-            row_frame.columnconfigure(0, weight=3)  # Match header column weight
-            row_frame.columnconfigure(1, weight=2)  # Match header column weight
-            
-            ttk.Label(row_frame, text=folder_name, width=40).grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
-            ttk.Label(row_frame, text=drive_name, width=20).grid(row=0, column=1, sticky=tk.W)
-        
-        canvas.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+            self.csv_table.grid_remove()
+            self.no_data_label.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=10, pady=10)
+        else:
+            self.no_data_label.grid_remove()
+            self.csv_table.grid()
         
-        # Configure grid weights
-        databox_frame.columnconfigure(0, weight=1)
-        databox_frame.rowconfigure(0, weight=1)
+        self.csv_table.set_rows(filtered_data)
 
     def on_search_entry_changed(self, event):
         """Handle search entry changes"""
-        self.display_csv_data()  # Refresh display with filtered data
+        # Wait for typing to pause before searching
+        if self.search_after_id:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        """Start a search for the current search text"""
+        self.search_after_id = None
+        self.search_generation += 1
+        self.search_executor.submit(self.search_thread, self.search_generation, self.search_text.get(),
+                                    self.sort_column, self.sort_reverse, self.search_mode_var.get())
+
+    def on_sort_column(self, column):
+        """Sort the viewer by a column, reversing the order on a second click"""
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self.csv_table.set_sort_indicator(self.sort_column, self.sort_reverse)
+        self.run_search()
+
+    @staticmethod
+    def sort_rows(rows, column, reverse):
+        """Get a view of a catalog or selection sorted by a column"""
+        if isinstance(rows, CatalogSelection):
+            catalog, ids = rows.catalog, rows.ids
+        else:
+            catalog, ids = rows, None
+        return catalog.select(catalog.sorted_ids(column, ids, reverse))
+
+    @staticmethod
+    def format_size(size):
+        """Format a byte count for display, e.g. 1.5 GB"""
+        for unit in ('bytes', 'KB', 'MB', 'GB'):
+            if size < 1000:
+                return f"{size} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+            size /= 1000
+        return f"{size:.1f} TB"
+
+    def format_metadata_row(self, row):
+        """Get the viewer values of a catalog row with metadata columns"""
+        metadata = row.metadata
+        if metadata is None:
+            return row.folder, row.drive, "", "", ""
+        size, file_count, newest = metadata
+        newest_text = time.strftime("%Y-%m-%d %H:%M", time.localtime(newest)) if newest >= 0 else ""
+        return row.folder, row.drive, self.format_size(size), file_count, newest_text
+
+    def search_thread(self, generation, query, sort_column=None, sort_reverse=False, mode=SEARCH_MODE_CONTAINS):
+        """Run a search in the search thread"""
+        # Skip searches that were superseded while queued
+        if generation != self.search_generation:
+            return
+        if self.search_index is None and (mode != SEARCH_MODE_CONTAINS or not self.search_catalog_path):
+            # Indexed catalogs only get an in-memory index once another mode is used;
+            # text typed before a catalog is loaded is searched in the empty data
+            self.search_index = SearchIndex(self.csv_data)
+        if mode != SEARCH_MODE_CONTAINS and query:
+            if mode == SEARCH_MODE_FUZZY:
+                results = self.search_index.fuzzy_search(query)
+            else:
+                try:
+                    results = compile_query(query).run(self.search_index)
+                except QueryError as e:
+                    self.run_in_ui(self.search_failed, generation, str(e))
+                    return
+        elif self.search_catalog_path:
+            results = Folders2CSVBackend.search_catalog(self.search_catalog_path, query) if query else self.csv_data
+        else:
+            results = self.search_index.search(query)
+        if sort_column is not None:
+            results = self.sort_rows(results, sort_column, sort_reverse)
+        self.run_in_ui(self.search_complete, generation, results)
+
+    def search_complete(self, generation, results):
+        """Called when a search is complete"""
+        if generation == self.search_generation:
+            self.search_error.set("")
+            self.display_csv_data(results)
+
+    def search_failed(self, generation, message):
+        """Show why a query couldn't be run, keeping the previous results"""
+        if generation == self.search_generation:
+            self.search_error.set(message)
 
     def refresh_drives(self):
         """Refresh the list of available Audio Archive drives"""
         self.drives_loaded = False
+        # Results from an earlier refresh still in progress are ignored
+        self.refresh_generation += 1
+        self.scan_session = ScanSession()
         
         # Clear current checkboxes
         for widget in self.drives_checkboxes_frame.winfo_children():
             widget.destroy()
         self.drive_checkboxes.clear()
+        self.drive_checkbuttons.clear()
+        self.drive_labels.clear()
+        self.available_drives = []
+        
+        ttk.Label(self.drives_checkboxes_frame, text="Looking for drives…").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
         
-        # Get drives from backend
-        self.available_drives = self.get_available_drives()
+        # Listing the volumes can block on a spun-down disk, so do it off the main thread
+        thread = threading.Thread(target=self.discover_drives_thread, args=(self.refresh_generation,))
+        thread.daemon = True
+        thread.start()
+    
+    def discover_drives_thread(self, generation):
+        """Find available drives in a separate thread"""
+        drives = self.get_available_drives()
+        self.run_in_ui(self.drives_discovered, generation, drives)
+    
+    def drives_discovered(self, generation, drives):
+        """Create a checkbox per drive and start gathering each drive's info"""
+        if generation != self.refresh_generation:
+            return
+        
+        for widget in self.drives_checkboxes_frame.winfo_children():
+            widget.destroy()
+        self.available_drives = drives
         
         # Create checkboxes for each drive
         for i, drive in enumerate(self.available_drives):
-            drive_info = Folders2CSVBackend.get_drive_info(drive)
-            display_text = f"{drive_info['stripped_name']} ({drive_info['folder_count']} folders)"
+            display_text = f"{BackendHelpers.stripDriveName(drive)} (scanning…)"
             
             # Create checkbox variable
             var = tk.BooleanVar()
@@ -425,12 +622,42 @@ class Folders2CSVApp:
                 variable=var
             )
             checkbox.grid(row=i, column=0, sticky=(tk.W, tk.E), padx=5, pady=2)
+            self.drive_checkbuttons.append(checkbox)
+            self.drive_labels.append(display_text)
             
+            self.drive_info_executor.submit(self.drive_info_thread, generation, i, drive, self.scan_session)
+        
+        self.pending_drive_info = len(self.available_drives)
+        if not self.available_drives:
+            ttk.Label(self.drives_checkboxes_frame, text="No drives found").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+            self.drives_loaded = True
+        
         # Update canvas scroll region
         self.drives_checkboxes_frame.update_idletasks()
         self.drives_canvas.configure(scrollregion=self.drives_canvas.bbox("all"))
-
-        self.drives_loaded = True
+    
+    def drive_info_thread(self, generation, index, drive, session):
+        """Get a drive's info in a worker thread"""
+        if generation != self.refresh_generation:
+            return
+        drive_info = Folders2CSVBackend.get_drive_info(drive, session)
+        self.run_in_ui(self.drive_info_ready, generation, index, drive_info)
+    
+    def drive_info_ready(self, generation, index, drive_info):
+        """Show a drive's folder count once it is known"""
+        if generation != self.refresh_generation:
+            return
+        
+        display_text = f"{drive_info['stripped_name']} ({drive_info['folder_count']} folders)"
+        self.drive_labels[index] = display_text
+        if not self.processing:
+            self.drive_checkbuttons[index].config(text=display_text)
+        
+        self.pending_drive_info -= 1
+        if self.pending_drive_info == 0:
+            # Persist listings gathered for the folder counts
+            self.drive_info_executor.submit(Folders2CSVBackend.save_scan_cache)
+            self.drives_loaded = True
     
     def process_drives(self):
         """Process the selected drives"""
@@ -448,36 +675,167 @@ class Folders2CSVApp:
         self.selected_drives = [self.available_drives[i] for i in selected_indices if i < len(self.available_drives)]
         
         
+        # Build the deep scanner from the options before the thread starts
+        self.deep_scanner = None
+        if self.deep_scan_var.get():
+            try:
+                depth = self.deep_scan_depth.get()
+            except tk.TclError:
+                depth = DEFAULT_MAX_DEPTH
+            self.deep_scanner = DeepScanner(max(1, depth))
+        
         # Disable process button and start progress
         self.process_button.config(state="disabled")
+        self.compact_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.cancel_event = threading.Event()
+        self.progress_queue = ProgressQueue()
+        self.progress_var.set(0.0)
+        self.progress_status.set("Starting…")
+        for drive in self.selected_drives:
+            self.set_drive_status(drive, "waiting…")
+        self.processing = True
+        self.progress_after_id = self.root.after(PROGRESS_FRAME_MS, self.drain_progress)
         
         # Run processing in separate thread
         thread = threading.Thread(target=self.process_drives_thread)
         thread.daemon = True
         thread.start()
     
+    def set_drive_status(self, drive, status):
+        """Show a status next to a drive's checkbox"""
+        if drive in self.available_drives:
+            index = self.available_drives.index(drive)
+            if index < len(self.drive_checkbuttons):
+                self.drive_checkbuttons[index].config(text=f"{BackendHelpers.stripDriveName(drive)} — {status}")
+    
+    def drain_progress(self):
+        """Apply the progress events queued since the last frame"""
+        progress, drive_events, latest = self.progress_queue.drain()
+        for drive, event in drive_events.items():
+            self.set_drive_status(drive, "scanning…" if event.done is None else event.message)
+        
+        if progress is not None:
+            fraction = get_run_progress(progress)
+            self.progress_var.set(fraction)
+            label = STAGE_LABELS.get(progress.stage, progress.stage.capitalize())
+            status = f"{label}: {progress.done}/{progress.total}" if progress.total else ""
+            if progress.throughput:
+                status += f" ({progress.throughput:.1f}/s)"
+            # Remaining time assuming the rest of the run goes at the average rate so far
+            if 0.05 < fraction < 1:
+                remaining = progress.elapsed * (1 - fraction) / fraction
+                status += f" — about {int(remaining) // 60}:{int(remaining) % 60:02d} left"
+            self.progress_status.set(status or latest.message)
+        elif latest is not None:
+            self.progress_status.set(latest.message)
+        
+        if self.processing:
+            self.progress_after_id = self.root.after(PROGRESS_FRAME_MS, self.drain_progress)
+    
+    def compact_csv(self):
+        """Sort the CSV by drive and remove duplicate rows"""
+        if not self.csv_file_path.get():
+            messagebox.showerror("Error", "Please select or create a CSV file first")
+            return
+        # Processing and compacting both rewrite the catalog, so only one runs at a time
+        self.process_button.config(state="disabled")
+        self.compact_button.config(state="disabled")
+        self.progress_status.set("Sorting and compacting…")
+        
+        # Run compaction in separate thread; large catalogs take a while
+        thread = threading.Thread(target=self.compact_csv_thread, args=(self.csv_file_path.get(),))
+        thread.daemon = True
+        thread.start()
+    
+    def compact_csv_thread(self, csv_path):
+        """Compact the CSV in a separate thread"""
+        success, message, count = Folders2CSVBackend.compact_csv(csv_path)
+        self.run_in_ui(self.compact_complete, success, message)
+    
+    def compact_complete(self, success, message):
+        """Called when compaction is complete"""
+        self.process_button.config(state="normal")
+        self.compact_button.config(state="normal")
+        self.progress_status.set(message)
+        if success:
+            messagebox.showinfo("Success", message)
+            # The rows are in a new order now
+            if self.mode_var.get() == "view_csv":
+                self.load_and_display_csv_data()
+        else:
+            messagebox.showerror("Error", message)
+    
     def process_drives_thread(self):
         """Process drives in a separate thread"""
         try:
-            def progress_callback(message):
-                print(message)
-            
+            stats = RunStats()
             success, message, count = Folders2CSVBackend.process_drives_to_csv(
                 self.selected_drives, 
                 self.csv_file_path.get(),
-                progress_callback
+                self.progress_queue.put,
+                force_rescan=self.force_rescan_var.get(),
+                session=self.scan_session,
+                scanner=self.deep_scanner,
+                collect_metadata=self.collect_metadata_var.get(),
+                cancel_event=self.cancel_event,
+                stats=stats
             )
+            print(stats.format_report())
             
             # Update UI in main thread
-            self.root.after(0, self.processing_complete, success, message, count)
+            self.run_in_ui(self.processing_complete, success, message, count)
         except Exception as e:
-            self.root.after(0, self.processing_error, str(e))
+            self.run_in_ui(self.processing_error, str(e))
+    
+    def cancel_processing(self):
+        """Stop processing once the drives being scanned finish; finished drives are kept for the next run"""
+        self.cancel_event.set()
+        self.cancel_button.config(state="disabled")
+        self.progress_status.set("Cancelling…")
+    
+    def on_close(self):
+        """Close the window, checkpointing an unfinished run so it can be resumed"""
+        if self.processing:
+            self.cancel_event.set()
+        self.closed = True
+        self.root.destroy()
+    
+    def run_in_ui(self, callback, *args):
+        """Call a function on the Tk thread from a worker thread, unless the window is closed"""
+        if self.closed:
+            return
+        try:
+            self.root.after(0, callback, *args)
+        except (RuntimeError, tk.TclError):
+            # The window closed while the worker was finishing
+            pass
+    
+    def stop_progress(self, status):
+        """Stop the progress loop after showing any remaining events"""
+        self.processing = False
+        if self.progress_after_id is not None:
+            self.root.after_cancel(self.progress_after_id)
+            self.progress_after_id = None
+        self.drain_progress()
+        self.progress_status.set(status)
+        # The drives' statuses were only for this run
+        for index, checkbox in enumerate(self.drive_checkbuttons):
+            checkbox.config(text=self.drive_labels[index])
     
     def processing_complete(self, success, message, count):
         """Called when processing is complete"""
         self.process_button.config(state="normal")
-        
+        self.compact_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.stop_progress(message)
         if success:
+            self.progress_var.set(1.0)
+        
+        if self.cancel_event.is_set():
+            print(f"✗ {message}")
+            messagebox.showinfo("Cancelled", message)
+        elif success:
             print(f"✓ {message}")
             messagebox.showinfo("Success", message)
             # Refresh CSV data if we're in view mode
@@ -490,6 +848,9 @@ class Folders2CSVApp:
     def processing_error(self, error_msg):
         """Called when processing encounters an error"""
         self.process_button.config(state="normal")
+        self.compact_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.stop_progress(f"Error: {error_msg}")
         print(f"✗ Error: {error_msg}")
         messagebox.showerror("Error", f"An error occurred: {error_msg}")
     
@@ -513,7 +874,8 @@ class Folders2CSVApp:
 
 def main():
     root = tk.Tk()
-    Folders2CSVApp(root)
+    app = Folders2CSVApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
 
@@ -0,0 +1,255 @@
+import os
+import time
+import collections
+import threading
+import contextlib
+from backendHelpers import BackendHelpers
+
+# Stages of a processing run, in the order they happen
+STAGE_DISCOVER = 'discover'
+STAGE_LIST = 'list'
+# Runs per drive in the scan workers, so its time is summed over drives
+STAGE_METADATA = 'metadata'
+# Only in duplicate searches, where it follows the scan
+STAGE_HASH = 'hash'
+STAGE_READ_EXISTING = 'read existing'
+STAGE_DEDUP = 'dedup'
+STAGE_SORT = 'sort'
+STAGE_WRITE = 'write'
+STAGES = (STAGE_DISCOVER, STAGE_LIST, STAGE_METADATA, STAGE_HASH, STAGE_SORT, STAGE_READ_EXISTING, STAGE_DEDUP,
+          STAGE_WRITE)
+
+# Part of the overall progress bar covered by each stage, as (start, end)
+STAGE_PROGRESS = {
+    STAGE_DISCOVER: (0.0, 0.05),
+    STAGE_LIST: (0.05, 0.85),
+    STAGE_METADATA: (0.05, 0.85),
+    STAGE_HASH: (0.85, 1.0),
+    STAGE_SORT: (0.85, 0.87),
+    STAGE_READ_EXISTING: (0.87, 0.9),
+    STAGE_DEDUP: (0.9, 0.93),
+    STAGE_WRITE: (0.93, 1.0),
+}
+
+# Set this environment variable to profile every processing run
+PROFILE_ENV_VAR = 'FOLDERS2CSV_PROFILE'
+
+
+class ProgressEvent:
+    """
+    One progress update from a processing run.
+    Converts to its message with str(), so callbacks written for the old
+    string messages keep working.
+    """
+
+    __slots__ = ('stage', 'drive', 'done', 'total', 'elapsed', 'throughput', 'message')
+
+    def __init__(self, stage, message, drive=None, done=None, total=None, elapsed=0.0, throughput=None):
+        self.stage = stage
+        self.message = message
+        self.drive = drive
+        self.done = done  # Items finished in this stage, or None for status-only events
+        self.total = total  # Items expected in this stage, if known
+        self.elapsed = elapsed  # Seconds since the run started
+        self.throughput = throughput  # Items per second in this stage
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"ProgressEvent({self.stage!r}, {self.message!r}, done={self.done}, total={self.total})"
+
+
+def get_run_progress(event):
+    """
+    Estimate how far through a run an event is
+
+    Args:
+        event (ProgressEvent): Event with a done count
+
+    Returns:
+        float: Fraction of the run that is finished, from 0 to 1
+    """
+    start, end = STAGE_PROGRESS.get(event.stage, (0.0, 1.0))
+    if event.done is None or not event.total:
+        return start
+    return start + (end - start) * min(1.0, event.done / event.total)
+
+
+class ProgressQueue:
+    """
+    Thread-safe queue of progress events from a worker thread.
+    put() only appends to a deque, so it can be used directly as a
+    progress callback however often the backend reports; the UI takes
+    everything queued in one drain() per frame.
+    """
+
+    def __init__(self):
+        self.events = collections.deque()
+
+    def put(self, event):
+        """Queue an event; safe to call from any thread"""
+        self.events.append(event)
+
+    def drain(self):
+        """
+        Take every queued event, coalesced
+
+        Returns:
+            tuple: (latest event with a done count or None, dict of drive name
+                to that drive's latest event, latest event of any kind or None)
+        """
+        progress = None
+        latest = None
+        drives = {}
+        events = self.events
+        # Only the events queued so far; workers adding events as fast as
+        # they are taken would otherwise keep the UI thread here
+        for _ in range(len(events)):
+            latest = events.popleft()
+            if latest.done is not None:
+                progress = latest
+            if latest.drive is not None:
+                drives[latest.drive] = latest
+        return progress, drives, latest
+
+
+class RunStats:
+    """
+    Per-stage wall-clock timings of one processing run, and the progress
+    events it sends. A stage entered more than once accumulates its time.
+    """
+
+    def __init__(self, progress_callback=None):
+        self.progress_callback = progress_callback
+        self.started = time.perf_counter()
+        self.finished = None
+        self.stages = {}  # Stage name to seconds
+        self.stage_started = {}  # Stage name to when it was first entered
+        self.counts = {}  # Stage name to items processed
+        self.drives = {}  # Drive name to seconds spent listing it
+        self.profile_path = None
+        # Reentrant so a callback can read the timings while handling an event
+        self.lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a block of work as part of a stage"""
+        start = time.perf_counter()
+        with self.lock:
+            self.stage_started.setdefault(name, start)
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name, count):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    def add_drive_time(self, drive, seconds):
+        with self.lock:
+            self.drives[drive] = seconds
+
+    def elapsed(self):
+        """Get seconds since the run started, or its total once finished"""
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def finish(self):
+        """Stop the run clock"""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def emit(self, stage, message, drive=None, done=None, total=None):
+        """
+        Send a progress event to the callback
+
+        Args:
+            stage (str): Stage the run is in
+            message (str): Human-readable description
+            drive (str): Drive the event is about, if any
+            done (int): Items finished in this stage so far
+            total (int): Items expected in this stage
+        """
+        if not self.progress_callback:
+            return
+        now = time.perf_counter()
+        throughput = None
+        with self.lock:
+            since = now - self.stage_started.get(stage, self.started)
+            if done is not None and since > 0:
+                throughput = done / since
+            # Worker threads share the callback, so serialize the calls
+            event = ProgressEvent(stage, message, drive, done, total, now - self.started, throughput)
+            try:
+                self.progress_callback(event)
+            except Exception as e:
+                # Progress is only reported; a failing callback mustn't stop the work
+                print(f"Warning: Progress callback failed: {e}")
+
+    def report(self):
+        """
+        Get the timings as plain data
+
+        Returns:
+            dict: Total seconds, seconds per stage, items per stage and listing seconds per drive
+        """
+        with self.lock:
+            return {
+                'total': self.elapsed(),
+                'stages': {name: self.stages[name] for name in STAGES if name in self.stages},
+                'counts': dict(self.counts),
+                'drives': dict(self.drives),
+            }
+
+    def format_report(self):
+        """Format the timings as a short text table"""
+        report = self.report()
+        lines = [f"{'stage':<14} {'seconds':>8} {'items':>9}"]
+        for name, seconds in report['stages'].items():
+            count = report['counts'].get(name)
+            lines.append(f"{name:<14} {seconds:>8.3f} {'' if count is None else count:>9}")
+        lines.append(f"{'total':<14} {report['total']:>8.3f}")
+        if report['drives']:
+            slowest = max(report['drives'], key=report['drives'].get)
+            lines.append(f"Slowest drive: {slowest} ({report['drives'][slowest]:.3f}s)")
+        return '\n'.join(lines)
+
+
+def run_profiled(stats, function, *args, **kwargs):
+    """
+    Run a function under cProfile and write the profile to the config directory
+
+    Two files are written to a "profiles" folder: a .prof file for pstats or
+    snakeviz, and a .txt report with the stage timings followed by the top
+    functions by cumulative time. Only the calling thread is profiled; time
+    spent in scan worker threads shows up in the stage timings instead.
+
+    Args:
+        stats (RunStats): Timings of the run, added to the text report
+        function (callable): Function to run
+
+    Returns:
+        The function's return value. The report path is stored in stats.profile_path.
+    """
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        stats.finish()
+        folder = os.path.join(BackendHelpers.getAppSupportFolder(), 'profiles')
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, time.strftime('run-%Y%m%d-%H%M%S'))
+        profiler.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w') as f:
+            f.write(stats.format_report() + '\n\n')
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(40)
+        stats.profile_path = base + '.txt'
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+from backendHelpers import BackendHelpers
+
+# Maximum number of drives kept in the cache
+DEFAULT_MAX_ENTRIES = 500
+# Drives not seen for this many days are evicted
+DEFAULT_MAX_AGE_DAYS = 90
+# Listings taken this close to the folder's mtime are not trusted, since a
+# change within the same timestamp tick would go unnoticed
+RACY_WINDOW_SECONDS = 2
+
+CACHE_VERSION = 1
+
+
+class ScanCache:
+    """Persistent cache of mastering folder listings, keyed by drive identity"""
+
+    def __init__(self, cache_path=None, max_entries=DEFAULT_MAX_ENTRIES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        if cache_path is None:
+            cache_path = os.path.join(BackendHelpers.getAppSupportFolder(), 'scan_cache.json')
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def get_identity(mastering_folder):
+        """
+        Get the identity of a mastering folder
+
+        Args:
+            mastering_folder (str): Path to the mastering folder
+
+        Returns:
+            dict: Inode, creation time and mtime of the folder
+        """
+        st = os.stat(mastering_folder)
+        return {
+            'ino': st.st_ino,
+            'birthtime': getattr(st, 'st_birthtime', None),
+            'mtime_ns': st.st_mtime_ns,
+        }
+
+    def load(self):
+        """Load the cache from disk, starting empty if it is missing or unreadable"""
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            if cache.get('version') == CACHE_VERSION:
+                self.entries = cache.get('drives', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """Evict stale entries and write the cache to disk atomically"""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.evict()
+            cache = {'version': CACHE_VERSION, 'drives': self.entries}
+            tmp_path = f"{self.cache_path}.tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(cache, f)
+                os.replace(tmp_path, self.cache_path)
+                self.dirty = False
+            except OSError as e:
+                print(f"Warning: Could not save scan cache: {e}")
+
+    def evict(self):
+        """Drop drives not seen within max_age_days and enforce max_entries"""
+        cutoff = time.time() - self.max_age_days * 86400
+        self.entries = {
+            drive: entry for drive, entry in self.entries.items()
+            if entry.get('last_seen', 0) >= cutoff
+        }
+        if len(self.entries) > self.max_entries:
+            newest = sorted(self.entries.items(), key=lambda item: item[1].get('last_seen', 0), reverse=True)
+            self.entries = dict(newest[:self.max_entries])
+
+    def lookup(self, drive_name, mastering_folder):
+        """
+        Get the cached listing for a drive if its mastering folder is unchanged
+
+        Args:
+            drive_name (str): Name of the drive
+            mastering_folder (str): Path to the drive's mastering folder
+
+        Returns:
+            list: Cached folder names, or None if the drive must be rescanned
+        """
+        try:
+            identity = ScanCache.get_identity(mastering_folder)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(drive_name)
+            if not entry or entry.get('identity') != identity:
+                return None
+            entry['last_seen'] = time.time()
+            self.dirty = True
+            return list(entry['folders'])
+
+    def store(self, drive_name, identity, folders):
+        """
+        Store a fresh listing for a drive
+
+        Args:
+            drive_name (str): Name of the drive
+            identity (dict): Identity of the mastering folder taken before listing it
+            folders (list): Folder names found in the mastering folder
+        """
+        now = time.time()
+        if now - identity['mtime_ns'] / 1e9 < RACY_WINDOW_SECONDS:
+            return
+        with self.lock:
+            self.entries[drive_name] = {
+                'identity': identity,
+                'folders': list(folders),
+                'last_seen': now,
+            }
+            self.dirty = True
+
+    def invalidate(self, drive_name=None):
+        """
+        Remove cached listings
+
+        Args:
+            drive_name (str): Drive to invalidate, or None to clear the whole cache
+        """
+        with self.lock:
+            if drive_name is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(drive_name, None)
+            self.dirty = True
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+from backendHelpers import BackendHelpers
+from catalog import Catalog
+from scanSession import ScanSession
+
+# Suffix of the journal kept next to a catalog while drives are processed into it
+JOURNAL_SUFFIX = '.journal'
+# Journals older than this are not resumed, since the drives have likely changed
+DEFAULT_MAX_AGE_HOURS = 24 * 7
+
+JOURNAL_VERSION = 1
+
+
+class ScanJournal:
+    """
+    Checkpoint journal of the drives scanned so far in a processing run.
+    Each drive is appended as one JSON line and flushed to disk as soon as
+    its scan finishes, so a run that is cancelled, crashes or loses a drive
+    keeps every drive finished before that. The next run into the same
+    catalog with the same scan settings reads those drives back instead of
+    scanning them again, as long as their mastering folder's mtime is
+    unchanged. The journal is deleted once the catalog has been written.
+    """
+
+    def __init__(self, catalog_path, settings=None, max_age_hours=DEFAULT_MAX_AGE_HOURS):
+        """
+        Args:
+            catalog_path (str): Catalog the run writes to; the journal is stored next to it
+            settings (dict): Scan settings that change the listings (deep scan,
+                metadata); a journal written with other settings is not resumed
+            max_age_hours (float): Oldest journal that is resumed
+        """
+        self.path = catalog_path + JOURNAL_SUFFIX
+        self.settings = settings or {}
+        self.max_age_hours = max_age_hours
+        self.file = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the drive entries of an earlier run with the same settings
+
+        Returns:
+            tuple: (header dict or None, list of drive entries still valid)
+        """
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if (header.get('version') != JOURNAL_VERSION or header.get('settings') != self.settings or
+                        time.time() - header.get('created', 0) > self.max_age_hours * 3600):
+                    return None, []
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line is cut short if the run was killed while writing it
+                        break
+                    # Drives changed since they were journaled are scanned again
+                    if ScanSession.get_mtime(entry['mastering']) == entry['mtime']:
+                        entries.append(entry)
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None, []
+        return header, entries
+
+    def begin(self, resume=True):
+        """
+        Start journaling a run, keeping the valid drives of an earlier run
+
+        Args:
+            resume (bool): Keep the drives an earlier run already scanned
+
+        Returns:
+            dict: Drive name to (mastering folder, Catalog) for every resumed drive
+        """
+        header, entries = self.load() if resume else (None, [])
+        if header is None:
+            header = {'version': JOURNAL_VERSION, 'settings': self.settings, 'created': time.time()}
+
+        # Rewrite the journal without stale drives, then append to it
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(header) + '\n')
+                for entry in entries:
+                    f.write(json.dumps(entry) + '\n')
+            os.replace(tmp_path, self.path)
+            self.file = open(self.path, 'a', encoding='utf-8')
+        except OSError as e:
+            # The run still works without checkpoints, it just can't be resumed
+            print(f"Warning: Could not write scan journal: {e}")
+            return {}
+
+        resumed = {}
+        for entry in entries:
+            folder_data = Catalog()
+            folder_data.add_folders(entry['folders'], BackendHelpers.stripDriveName(entry['drive']), entry['metadata'])
+            resumed[entry['drive']] = (entry['mastering'], folder_data)
+        return resumed
+
+    def record(self, drive_name, mastering_folder, folder_data, mtime_ns):
+        """
+        Append a scanned drive; safe to call from the scan workers
+
+        Args:
+            drive_name (str): Name of the drive
+            mastering_folder (str): Path to the drive's mastering folder
+            folder_data (Catalog): Folders found on the drive
+            mtime_ns (int): mtime of the mastering folder taken before scanning it
+        """
+        if self.file is None or mastering_folder is None or mtime_ns is None:
+            return
+        metadata = None
+        if folder_data.has_metadata:
+            metadata = list(zip(folder_data.sizes, folder_data.file_counts, folder_data.newest))
+        line = json.dumps({'drive': drive_name, 'mastering': mastering_folder, 'mtime': mtime_ns,
+                           'folders': folder_data.folders, 'metadata': metadata})
+        with self.lock:
+            try:
+                self.file.write(line + '\n')
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except OSError as e:
+                print(f"Warning: Could not write scan journal: {e}")
+
+    def close(self):
+        """Stop journaling, keeping the journal for the next run"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def discard(self):
+        """Stop journaling and delete the journal, once the run's results are saved"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,70 @@
+import os
+import time
+import threading
+from scanCache import RACY_WINDOW_SECONDS
+
+# Seconds a listing taken during a refresh stays usable for processing
+DEFAULT_SESSION_TTL = 300
+
+
+class ScanSession:
+    """
+    Mastering folder listings captured while refreshing the drive list, so
+    that processing the same drives shortly afterwards doesn't list them again.
+    A listing is reused only within the TTL and while the folder's mtime is
+    unchanged.
+    """
+
+    def __init__(self, ttl=DEFAULT_SESSION_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_mtime(mastering_folder):
+        """Get the mtime of a mastering folder, or None if it can't be read"""
+        try:
+            return os.stat(mastering_folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def store(self, drive_name, mastering_folder, folder_data, mtime_ns):
+        """
+        Remember a drive's listing
+
+        Args:
+            drive_name (str): Name of the drive
+            mastering_folder (str): Path to the drive's mastering folder
+            folder_data (Catalog): Folders found in the mastering folder
+            mtime_ns (int): mtime of the mastering folder taken before listing it
+        """
+        if mtime_ns is None or time.time() - mtime_ns / 1e9 < RACY_WINDOW_SECONDS:
+            return
+        with self.lock:
+            self.entries[drive_name] = (time.monotonic(), mastering_folder, mtime_ns, folder_data)
+
+    def lookup(self, drive_name):
+        """
+        Get a drive's listing if it is still fresh
+
+        Args:
+            drive_name (str): Name of the drive
+
+        Returns:
+            tuple: (mastering_folder, folder_data), or None if the drive must be listed again
+        """
+        with self.lock:
+            entry = self.entries.get(drive_name)
+        if entry is None:
+            return None
+        captured_at, mastering_folder, mtime_ns, folder_data = entry
+        if time.monotonic() - captured_at > self.ttl or ScanSession.get_mtime(mastering_folder) != mtime_ns:
+            with self.lock:
+                self.entries.pop(drive_name, None)
+            return None
+        return mastering_folder, folder_data
+
+    def clear(self):
+        """Forget every listing"""
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,430 @@
+import re
+import heapq
+import itertools
+import threading
+from array import array
+from collections import Counter
+from catalog import Catalog
+
+# Rows returned by a fuzzy search
+DEFAULT_FUZZY_LIMIT = 100
+# Rows scored in full per fuzzy query, taken from the closest matches first
+FUZZY_CANDIDATES = 1000
+# Postings counted to rank rows that match only some of the query words;
+# the most common words are left out past this
+FUZZY_POSTINGS_BUDGET = 100000
+
+# Words in folder names and queries; punctuation and underscores separate them
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def get_trigrams(text):
+    """Get the set of three character substrings of a string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def get_edit_distance(a, b, max_distance):
+    """
+    Get the edit distance between two strings, counting a swap of adjacent
+    characters as one edit
+
+    Returns:
+        int: The distance, or max_distance + 1 once it is certain to be larger
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before_previous[j - 2] + 1)
+            current[j] = value
+        if min(current) > max_distance:
+            return max_distance + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def get_max_distance(query_token):
+    """
+    Get the typos allowed in a query word. Short words allow fewer, so "mix"
+    doesn't match "max", and numbers must match as typed.
+    """
+    if len(query_token) <= 2 or query_token.isdigit():
+        return 0
+    return 1 if len(query_token) <= 5 else 2
+
+
+def get_token_score(query_token, token):
+    """
+    Score how well a word of a folder name matches a word of a fuzzy query
+
+    Returns:
+        float: 1 for the same word, less for a prefix, an inner match or a
+            word within a typo or two, 0 for no match
+    """
+    if token == query_token:
+        return 1.0
+    if token.startswith(query_token):
+        return 0.9
+    if len(query_token) >= 3 and query_token in token:
+        return 0.75
+    max_distance = get_max_distance(query_token)
+    # Each character of the query missing from the word takes an edit
+    if len(set(query_token).difference(token)) > max_distance:
+        return 0.0
+    distance = get_edit_distance(query_token, token, max_distance)
+    if distance > max_distance:
+        return 0.0
+    return 0.8 * (1 - distance / max(len(query_token), len(token)))
+
+
+class SearchIndex:
+    """
+    Case-insensitive substring search over catalog rows.
+    Folder names are indexed by trigram so a query only has to check rows
+    that contain every trigram of the query. Drive names are few, so they are
+    matched directly and expanded to their rows.
+    Fuzzy searches rank folder names by how well their words match the
+    query's, using a second index of the words in the catalog and of their
+    trigrams, which is built the first time one is run.
+    """
+
+    def __init__(self, rows):
+        if not isinstance(rows, Catalog):
+            rows = Catalog(rows)
+        self.rows = rows
+        self.folder_keys = []
+        self.drive_keys = []  # Per drive id
+        self.row_drives = rows.drive_ids  # Drive id per row
+        self.drive_rows = []  # Row ids per drive id
+        self.folder_trigrams = {}
+        self.word_rows = None  # Word to ids of the rows containing it, built by the first fuzzy search
+        self.word_trigrams = None  # Padded trigram to the words containing it
+        self.last_query = ""
+        self.last_ids = None
+        self.lock = threading.Lock()
+        self.index_rows(0)
+
+    def index_rows(self, start):
+        """Index the catalog rows from start on, and any drives added with them"""
+        rows = self.rows
+        for drive in rows.drives[len(self.drive_keys):]:
+            self.drive_keys.append(drive.lower())
+            self.drive_rows.append(array('I'))
+
+        self.folder_keys.extend(folder.lower() for folder in itertools.islice(rows.folders, start, None))
+        drive_rows = self.drive_rows
+        for row_id in range(start, len(rows)):
+            drive_rows[self.row_drives[row_id]].append(row_id)
+
+        folder_trigrams = self.folder_trigrams
+        for row_id in range(start, len(rows)):
+            for trigram in get_trigrams(self.folder_keys[row_id]):
+                postings = folder_trigrams.get(trigram)
+                if postings is None:
+                    postings = folder_trigrams[trigram] = array('I')
+                postings.append(row_id)
+
+    def add_rows(self, rows):
+        """
+        Append rows to the catalog and index them, e.g. rows appended to its
+        CSV since it was read. Must not run at the same time as a search.
+
+        Args:
+            rows (iterable): (folder, drive) or (folder, drive, size, file count, newest mtime) tuples
+        """
+        start = len(self.rows)
+        self.rows.extend(rows)
+        self.row_drives = self.rows.drive_ids
+        self.index_rows(start)
+        if self.word_rows is not None:
+            self.index_words(start, self.word_rows, self.word_trigrams)
+        with self.lock:
+            self.last_query = ""
+            self.last_ids = None
+
+    def find_folder_candidates(self, query):
+        """Get the ids of rows whose folder name may contain the query"""
+        trigrams = get_trigrams(query)
+        if not trigrams:
+            return range(len(self.rows))
+        postings = []
+        for trigram in trigrams:
+            ids = self.folder_trigrams.get(trigram)
+            if ids is None:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                break
+        return sorted(candidates)
+
+    def search(self, query):
+        """
+        Find the rows whose folder or drive name contains the query
+
+        Args:
+            query (str): Text to search for, case-insensitive
+
+        Returns:
+            sequence: Matching rows in catalog order
+        """
+        query = query.lower()
+        if not query:
+            return self.rows
+
+        with self.lock:
+            # A query that extends the previous one can only match a subset
+            # of the previous results
+            if self.last_ids is not None and self.last_query and self.last_query in query:
+                candidates = self.last_ids
+            else:
+                candidates = None
+            last_query = self.last_query
+
+        matching_drives = {
+            drive_id for drive_id, key in enumerate(self.drive_keys) if query in key
+        }
+
+        if candidates is None:
+            candidates = self.find_folder_candidates(query)
+            if matching_drives:
+                merged = set(candidates)
+                for drive_id in matching_drives:
+                    merged.update(self.drive_rows[drive_id])
+                candidates = sorted(merged)
+
+        folder_keys = self.folder_keys
+        row_drives = self.row_drives
+        ids = [
+            row_id for row_id in candidates
+            if row_drives[row_id] in matching_drives or query in folder_keys[row_id]
+        ]
+
+        with self.lock:
+            if self.last_query == last_query:
+                self.last_query = query
+                self.last_ids = ids
+
+        return self.rows.select(ids)
+
+    def build_word_index(self):
+        """Index the words of the folder names, for fuzzy searches"""
+        word_rows = {}
+        word_trigrams = {}
+        self.index_words(0, word_rows, word_trigrams)
+        self.word_rows = word_rows
+        self.word_trigrams = word_trigrams
+
+    def index_words(self, start, word_rows, word_trigrams):
+        """Add the words of the folder names from row start on to a word index"""
+        new_words = []
+        for row_id in range(start, len(self.folder_keys)):
+            for word in set(TOKEN_PATTERN.findall(self.folder_keys[row_id])):
+                # Numbers are mostly unique, so they are matched by the trigram index instead
+                if word.isdigit():
+                    continue
+                rows = word_rows.get(word)
+                if rows is None:
+                    rows = word_rows[word] = array('I')
+                    new_words.append(word)
+                rows.append(row_id)
+        # Padded so that short words and word starts have trigrams too
+        for word in new_words:
+            for trigram in get_trigrams(f" {word} "):
+                words = word_trigrams.get(trigram)
+                if words is None:
+                    words = word_trigrams[trigram] = []
+                words.append(word)
+
+    def match_words(self, query_token):
+        """
+        Find the indexed words that match a query word
+
+        Only words sharing enough trigrams with the query word to be within
+        its allowed typos, or to contain it, are compared in full.
+
+        Returns:
+            dict: Word to score, as from get_token_score
+        """
+        max_distance = get_max_distance(query_token)
+        # Each typo breaks at most four trigrams (a swap of two letters breaks
+        # the three holding either and the one holding both), and a word that
+        # contains the query word lacks at most its two padded ends
+        candidates = self.find_similar_words(query_token, max_distance)
+        if max_distance and len(query_token) <= 4 * max_distance:
+            # A short word can share no trigram at all with a swapped spelling,
+            # so look for each spelling with two neighbouring letters swapped too
+            for i in range(len(query_token) - 1):
+                swapped = query_token[:i] + query_token[i + 1] + query_token[i] + query_token[i + 2:]
+                if swapped != query_token:
+                    candidates.update(self.find_similar_words(swapped, max_distance - 1))
+        matches = {}
+        for word in candidates:
+            score = get_token_score(query_token, word)
+            if score:
+                matches[word] = score
+        return matches
+
+    def find_similar_words(self, query_token, max_distance):
+        """Get the indexed words sharing enough trigrams with a word to be within max_distance typos of it"""
+        trigrams = get_trigrams(f" {query_token} ")
+        counts = Counter()
+        for trigram in trigrams:
+            counts.update(self.word_trigrams.get(trigram, ()))
+        threshold = max(1, len(trigrams) - max(2, 4 * max_distance))
+        return {word for word, count in counts.items() if count >= threshold}
+
+    def intersect_words(self, word_groups, number_rows, limit):
+        """
+        Get rows that contain a word from every group
+
+        Args:
+            word_groups (list): Lists of words, one list per query word
+            number_rows (list): Sets of row ids, one per number in the query,
+                that the rows must also be in
+            limit (int): Stop adding rows once there are this many
+
+        Returns:
+            list: Matching row ids
+        """
+        word_rows = self.word_rows
+        groups = [(len(rows), rows, None) for rows in number_rows]
+        groups.extend((sum(len(word_rows[word]) for word in words), None, words) for words in word_groups)
+        groups.sort(key=lambda group: group[0])
+        rows = None
+        for size, group_rows, words in groups:
+            if rows is not None and not rows:
+                break
+            if group_rows is not None:
+                rows = set(group_rows) if rows is None else rows.intersection(group_rows)
+            elif rows is None:
+                rows = set()
+                for word in words:
+                    rows.update(word_rows[word])
+            elif len(rows) * 10 * len(words) < size:
+                # Few rows left; looking for the words in their names beats reading
+                # the postings. Substrings let some extra rows through, which
+                # scoring sorts out.
+                words = sorted(words, key=lambda word: len(word_rows[word]), reverse=True)
+                folder_keys = self.folder_keys
+                rows = {row_id for row_id in rows if any(word in folder_keys[row_id] for word in words)}
+            else:
+                matched = set()
+                for word in words:
+                    matched.update(rows.intersection(word_rows[word]))
+                rows = matched
+        return list(itertools.islice(rows or (), limit))
+
+    def find_fuzzy_candidates(self, query_tokens, token_matches, limit):
+        """
+        Get the rows worth scoring for a fuzzy query, most promising first:
+        rows with the best match for every query word, then rows with any
+        match for every word, then rows matching the most words. Numbers in
+        the query must appear in the folder name as typed.
+
+        Returns:
+            dict: Row ids, in order, as keys
+        """
+        number_rows = [self.search(token).ids for token in query_tokens if token.isdigit()]
+        matched = [matches for matches in token_matches if matches]
+        if not matched:
+            # Only numbers, or nothing close
+            rows = self.intersect_words([], number_rows, FUZZY_CANDIDATES) if number_rows else []
+            return dict.fromkeys(rows)
+
+        best_words = [[word for word, score in matches.items() if score == max(matches.values())]
+                      for matches in matched]
+        candidates = dict.fromkeys(self.intersect_words(best_words, number_rows, FUZZY_CANDIDATES))
+        all_words = [list(matches) for matches in matched]
+        if len(candidates) < limit and all_words != best_words:
+            for row_id in self.intersect_words(all_words, number_rows, FUZZY_CANDIDATES):
+                if len(candidates) >= FUZZY_CANDIDATES:
+                    break
+                candidates[row_id] = None
+        if len(candidates) < limit:
+            # Too few rows match everything; rank partial matches by the words
+            # they match, counting the rarest words first
+            groups = [rows for rows in number_rows]
+            groups.extend(self.word_rows[word] for words in all_words for word in words)
+            groups.sort(key=len)
+            counts = Counter()
+            counted = 0
+            for rows in groups:
+                if counted and counted + len(rows) > FUZZY_POSTINGS_BUDGET:
+                    break
+                counts.update(rows)
+                counted += len(rows)
+            for row_id, _ in counts.most_common(FUZZY_CANDIDATES - len(candidates)):
+                candidates[row_id] = None
+        return candidates
+
+    def fuzzy_search(self, query, limit=DEFAULT_FUZZY_LIMIT):
+        """
+        Find the folder names that best match the query, allowing for typos,
+        abbreviated words and words in a different order
+
+        Each word of the query is scored against the best matching word of a
+        folder name, and the average is raised if the whole query appears in
+        the name as typed. Query words are matched against an index of the
+        words in the catalog, so only rows containing a close word are scored.
+
+        Args:
+            query (str): Words to look for, case-insensitive
+            limit (int): Maximum number of rows to return
+
+        Returns:
+            sequence: Best matching rows, best first
+        """
+        return self.rows.select([-negative_id for _, negative_id in self.rank_fuzzy(query, limit)])
+
+    def rank_fuzzy(self, query, limit=DEFAULT_FUZZY_LIMIT):
+        """
+        Score the folder names that best match the query, as fuzzy_search does
+
+        Returns:
+            list: (score, negative row id) of the best matches, best first;
+                scores of different catalogs can be compared
+        """
+        query = query.lower().strip()
+        query_tokens = list(dict.fromkeys(TOKEN_PATTERN.findall(query)))
+        if not query_tokens:
+            return []
+        with self.lock:
+            if self.word_rows is None:
+                self.build_word_index()
+        # Numbers aren't in the word index; they are scored as they are met
+        token_matches = [{} if token.isdigit() else self.match_words(token) for token in query_tokens]
+        candidates = self.find_fuzzy_candidates(query_tokens, token_matches, limit)
+
+        folder_keys = self.folder_keys
+        scored = []
+        for row_id in candidates:
+            key = folder_keys[row_id]
+            tokens = TOKEN_PATTERN.findall(key)
+            total = 0.0
+            for query_token, matches in zip(query_tokens, token_matches):
+                best = 0.0
+                for token in tokens:
+                    score = matches.get(token)
+                    if score is None and query_token.isdigit() and token.isdigit():
+                        score = matches[token] = get_token_score(query_token, token)
+                    if score is not None and score > best:
+                        best = score
+                total += best
+            if not total:
+                continue
+            score = total / len(query_tokens)
+            if query in key:
+                score += 0.2
+            # Among equal matches, prefer shorter names, then catalog order
+            scored.append((score - 0.001 * len(tokens), -row_id))
+
+        return heapq.nlargest(limit, scored)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import Folders2CSVBackend  # noqa: E402
+from backendHelpers import BackendHelpers  # noqa: E402
+
+
+@pytest.fixture
+def volumes(tmp_path, monkeypatch):
+    """Empty volume root, with the home folder (and so the app's config and caches) in the temp directory"""
+    root = tmp_path / 'Volumes'
+    root.mkdir()
+    home = tmp_path / 'home'
+    home.mkdir()
+    monkeypatch.setenv('HOME', str(home))
+    monkeypatch.setattr(BackendHelpers, 'volumesRoot', str(root))
+    monkeypatch.setattr(Folders2CSVBackend, '_scan_cache', None)
+    return root
+
+
+def make_drive(root, name, folders=()):
+    """Create a fake drive with a mastering folder holding the given subfolders"""
+    mastering = root / name / 'mastering'
+    mastering.mkdir(parents=True)
+    for folder in folders:
+        (mastering / folder).mkdir()
+    return mastering
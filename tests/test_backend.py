@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+
+from backend import Folders2CSVBackend
+from conftest import make_drive
+from csvCatalog import CsvCatalog
+from progressEvents import RunStats
+from scanJournal import JOURNAL_SUFFIX
+
+DRIVES = ['Audio Archive 1', 'Audio Archive 2']
+
+
+def test_each_run_reports_its_own_stats(volumes, tmp_path):
+    make_drive(volumes, 'Audio Archive 1', ['Client A'])
+    make_drive(volumes, 'Audio Archive 2', ['Client B', 'Client C'])
+    first, second = RunStats(), RunStats()
+    Folders2CSVBackend.process_drives_to_csv(['Audio Archive 1'], str(tmp_path / 'one.csv'), stats=first)
+    Folders2CSVBackend.process_drives_to_csv(['Audio Archive 2'], str(tmp_path / 'two.csv'), stats=second)
+    assert list(first.report()['drives']) == ['Audio Archive 1']
+    assert list(second.report()['drives']) == ['Audio Archive 2']
+
+
+def test_failing_listeners_only_print_warnings(volumes, tmp_path, monkeypatch, capsys):
+    make_drive(volumes, 'Audio Archive 1', ['Client A'])
+
+    def fail(*args):
+        raise RuntimeError("listener broke")
+
+    monkeypatch.setattr(Folders2CSVBackend, 'run_listeners', [fail])
+    success, message, count = Folders2CSVBackend.process_drives_to_csv(
+        ['Audio Archive 1'], str(tmp_path / 'catalog.csv'), fail)
+    assert success and count == 1
+    assert "listener broke" in capsys.readouterr().out
+
+
+def cancel_after_first_drive(cancel_event, messages):
+    """Progress callback recording messages and cancelling once a drive is scanned"""
+    def callback(event):
+        messages.append(event.message)
+        if event.done == 1:
+            cancel_event.set()
+    return callback
+
+
+def cancelled_run(volumes, tmp_path):
+    """Start a run over two drives and cancel it after the first"""
+    make_drive(volumes, 'Audio Archive 1', ['Client A'])
+    make_drive(volumes, 'Audio Archive 2', ['Client B'])
+    catalog = str(tmp_path / 'catalog.csv')
+    cancel_event = threading.Event()
+    result = Folders2CSVBackend.process_drives_to_csv(
+        DRIVES, catalog, cancel_after_first_drive(cancel_event, []), max_workers=1, cancel_event=cancel_event)
+    return catalog, result
+
+
+def test_cancelled_run_writes_nothing_and_keeps_the_journal(volumes, tmp_path):
+    catalog, (success, message, count) = cancelled_run(volumes, tmp_path)
+    assert not success and count == 0
+    assert "after scanning 1 of 2 drives" in message
+    assert not os.path.exists(catalog)
+    with open(catalog + JOURNAL_SUFFIX) as f:
+        assert [json.loads(line)['drive'] for line in f.readlines()[1:]] == ['Audio Archive 1']
+
+
+def test_rerun_skips_journaled_drives_and_discards_the_journal(volumes, tmp_path):
+    catalog, _ = cancelled_run(volumes, tmp_path)
+    messages = []
+    success, message, count = Folders2CSVBackend.process_drives_to_csv(
+        DRIVES, catalog, lambda event: messages.append(str(event)))
+    assert success and count == 2
+    assert "Resuming: 1 drives already scanned" in messages
+    assert "Processing drive: Audio Archive 1" not in messages
+    assert "Processing drive: Audio Archive 2" in messages
+    assert CsvCatalog(catalog).read_rows() == [('Client A', 'Audio Archive 1'), ('Client B', 'Audio Archive 2')]
+    assert not os.path.exists(catalog + JOURNAL_SUFFIX)
+
+
+def test_changed_drives_are_scanned_again(volumes, tmp_path):
+    catalog, _ = cancelled_run(volumes, tmp_path)
+    mastering = volumes / 'Audio Archive 1' / 'mastering'
+    (mastering / 'Client C').mkdir()
+    st = os.stat(mastering)
+    os.utime(mastering, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    messages = []
+    Folders2CSVBackend.process_drives_to_csv(DRIVES, catalog, lambda event: messages.append(str(event)))
+    assert "Processing drive: Audio Archive 1" in messages
+    assert ('Client C', 'Audio Archive 1') in CsvCatalog(catalog).read_rows()
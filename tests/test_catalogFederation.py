@@ -0,0 +1,51 @@
+from backend import Folders2CSVBackend
+from catalogFederation import CatalogFederation
+from csvCatalog import CsvCatalog
+
+
+def write_catalog(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    CsvCatalog(str(path)).write_rows(rows)
+    return str(path)
+
+
+def test_catalogs_with_the_same_name_get_distinct_labels(tmp_path):
+    room_a = write_catalog(tmp_path / 'roomA' / '2024.csv', [('Velvet Stems', 'Audio Archive 1')])
+    room_b = write_catalog(tmp_path / 'roomB' / '2024.csv', [('Velvet Mix', 'Audio Archive 2')])
+    other = write_catalog(tmp_path / 'roomB' / '2023.csv', [('Velvet Demo', 'Audio Archive 3')])
+    federation = CatalogFederation([room_a, other])
+    assert [source.label for source in federation.sources.values()] == ['2024', '2023']
+
+    federation.add(room_b)
+    assert [label for label, row in federation.search('velvet')] == ['roomA/2024', '2023', 'roomB/2024']
+
+    federation.remove(room_a)
+    assert [source.label for source in federation.sources.values()] == ['2023', '2024']
+
+
+def test_given_labels_are_kept(tmp_path):
+    first = write_catalog(tmp_path / 'a' / 'catalog.csv', [('Client X', 'Audio Archive 1')])
+    second = write_catalog(tmp_path / 'b' / 'catalog.csv', [('Client X', 'Audio Archive 2')])
+    federation = CatalogFederation()
+    federation.add(first, 'catalog')
+    federation.add(second)
+    assert [label for label, row in federation.search('client x')] == ['catalog', 'catalog (2)']
+
+
+def test_catalogs_that_fail_to_read_are_tried_again(tmp_path, monkeypatch, capsys):
+    path = write_catalog(tmp_path / '2024.csv', [('Velvet Stems', 'Audio Archive 1')])
+    federation = CatalogFederation([path])
+    assert len(federation.search('velvet')) == 1
+
+    CsvCatalog(path).write_rows([('Velvet Stems', 'Audio Archive 1'), ('Velvet Mix', 'Audio Archive 2')])
+
+    def fail(catalog_path, use_snapshot=True):
+        raise PermissionError("share went away")
+
+    monkeypatch.setattr(Folders2CSVBackend, 'load_catalog', fail)
+    # The last version read is still searched
+    assert len(federation.search('velvet')) == 1
+    assert "share went away" in capsys.readouterr().out
+
+    monkeypatch.undo()
+    assert len(federation.search('velvet')) == 2
@@ -0,0 +1,52 @@
+import pytest
+
+from catalog import Catalog
+from catalogQuery import QueryError, compile_query
+from searchIndex import SearchIndex
+
+ROWS = [
+    ('xabc song', 'Audio Archive 1', 5 * 1000 ** 3, 120, -1),
+    ('Mabc Mix', 'Audio Archive 2', 200 * 1000 ** 2, 10, -1),
+    ('abc', 'Audio Archive 3', 1000, 1, -1),
+    ('Midnight Garden Stems', 'Audio Archive 12', 3 * 1000 ** 3, 40, -1),
+    ('Client X', 'Backup Archive', 50, 2, -1),
+    ('Echo Chamber EP', 'Audio Archive 2', 900 * 1000 ** 2, 14, -1),
+]
+
+
+def folders(rows):
+    return [row.folder for row in rows]
+
+
+def brute_force(index, query):
+    """Test every row, without the drive table or trigram candidates"""
+    test = compile_query(query).root.compile(index)
+    return [row.folder for row_id, row in enumerate(index.rows) if test(row_id)]
+
+
+@pytest.mark.parametrize('query', [
+    'folder:[mix]abc*', 'folder:[!x]abc*', 'folder:*abc*', 'folder:abc', 'folder:?abc*', 'folder:/^.abc/',
+    'abc AND size:>1GB', 'drive:2 OR client', 'NOT folder:*stems', 'drive:1-3 files:<50', 'archive (mix OR echo)',
+    'drive:(1 OR backup)', 'folder:(mix OR -abc) size:(<100 OR >1GB)',
+])
+def test_queries_match_a_scan_of_every_row(query):
+    index = SearchIndex(Catalog(ROWS))
+    assert folders(compile_query(query).run(index)) == brute_force(index, query)
+
+
+def test_character_classes_are_not_read_as_literal_text():
+    index = SearchIndex(Catalog(ROWS))
+    assert folders(compile_query('folder:[mix]abc*').run(index)) == ['xabc song', 'Mabc Mix']
+    assert folders(compile_query('folder:[!m]abc*').run(index)) == ['xabc song']
+
+
+def test_grouped_values_take_the_field():
+    index = SearchIndex(Catalog(ROWS))
+    assert folders(compile_query('drive:(2 OR backup)').run(index)) == ['Mabc Mix', 'Client X', 'Echo Chamber EP']
+    assert folders(compile_query('drive:(12 OR folder:xabc*)').run(index)) == ['xabc song', 'Midnight Garden Stems']
+
+
+def test_invalid_queries_raise_query_errors():
+    for query in ['size:>lots', 'folder:/(/', 'newest:yesterday', 'drive:(', 'size:(big)']:
+        with pytest.raises(QueryError):
+            compile_query(query)
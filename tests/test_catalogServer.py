@@ -0,0 +1,102 @@
+import http.client
+import json
+import os
+import threading
+
+import pytest
+
+from backend import Folders2CSVBackend
+from catalog import Catalog
+from catalogServer import CatalogServer, CatalogService, CatalogUnavailable
+from catalogStorage import CsvCatalogStorage
+
+ROWS = [('Velvet Stems', 'Audio Archive 2'), ('Client X', 'Audio Archive 1'), ('Velvet Mix', 'Audio Archive 1')]
+
+
+def make_service(tmp_path, rows=ROWS):
+    storage = CsvCatalogStorage(str(tmp_path / 'catalog.csv'))
+    storage.add_rows(Catalog(rows))
+    return storage, CatalogService(storage.path)
+
+
+def compact(storage):
+    """Compact the catalog, making sure its mtime moves even on coarse clocks"""
+    st = os.stat(storage.path)
+    storage.compact()
+    os.utime(storage.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def found(service, query):
+    return [row['folder'] for row in service.search(query)[1]['rows']]
+
+
+def test_appended_rows_are_added_and_rewrites_read_again(tmp_path):
+    storage, service = make_service(tmp_path)
+    assert found(service, 'velvet') == ['Velvet Stems', 'Velvet Mix']
+    etag = service.etag
+
+    storage.add_rows(Catalog([('Velvet Demo', 'Audio Archive 3'), ('Velvet Mix', 'Audio Archive 1')]))
+    assert found(service, 'velvet') == ['Velvet Stems', 'Velvet Mix', 'Velvet Demo']
+    assert (service.reloads, service.appends) == (1, 1)
+    assert service.etag != etag
+
+    # Compacting sorts the rows, so the tail no longer matches and the CSV is read again
+    compact(storage)
+    assert found(service, 'velvet') == ['Velvet Mix', 'Velvet Stems', 'Velvet Demo']
+    assert (service.reloads, service.appends) == (2, 1)
+
+
+def test_if_none_match_skips_unchanged_catalogs(tmp_path):
+    storage, service = make_service(tmp_path)
+    etag, data = service.search('velvet')
+    assert service.search('velvet', if_none_match=etag) == (etag, None)
+    assert service.lookup('client x', if_none_match=f'"other", {etag}') == (etag, None)
+
+    storage.add_rows(Catalog([('Velvet Demo', 'Audio Archive 3')]))
+    new_etag, data = service.search('velvet', if_none_match=etag)
+    assert new_etag != etag and data['total'] == 3
+
+
+def test_failed_reads_keep_the_last_index(tmp_path, monkeypatch):
+    storage, service = make_service(tmp_path)
+    etag = service.search('velvet')[0]
+    compact(storage)
+
+    def fail(catalog_path, use_snapshot=True):
+        raise PermissionError("share went away")
+
+    monkeypatch.setattr(Folders2CSVBackend, 'load_catalog', fail)
+    with pytest.raises(CatalogUnavailable):
+        service.search('velvet')
+    assert service.etag == etag and len(service.index.rows) == 3
+
+    monkeypatch.undo()
+    assert service.search('velvet')[0] != etag
+
+
+def test_http_answers_304_and_503(tmp_path, monkeypatch):
+    storage, service = make_service(tmp_path)
+    server = CatalogServer(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+        connection.request('GET', '/search?q=velvet')
+        response = connection.getresponse()
+        assert response.status == 200 and json.loads(response.read())['total'] == 2
+        etag = response.getheader('ETag')
+
+        connection.request('GET', '/search?q=velvet', headers={'If-None-Match': etag})
+        response = connection.getresponse()
+        response.read()
+        assert response.status == 304
+
+        compact(storage)
+        monkeypatch.setattr(Folders2CSVBackend, 'load_catalog', lambda *args: 1 / 0)
+        connection.request('GET', '/search?q=velvet', headers={'If-None-Match': etag})
+        response = connection.getresponse()
+        assert response.status == 503 and 'Could not read catalog' in json.loads(response.read())['error']
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,104 @@
+import os
+import struct
+
+from backend import Folders2CSVBackend
+from backendHelpers import BackendHelpers
+from catalog import Catalog
+from catalogSnapshot import CatalogSnapshot, COMPRESSED_BLOCK_ROWS, SNAPSHOT_HEADER, SNAPSHOT_SUFFIX
+from catalogStorage import CsvCatalogStorage
+from csvCatalog import CsvCatalog
+
+ROWS = [(f'Client {i} – Session "{i % 7}"', f'Audio Archive {i % 5 + 1}') for i in range(COMPRESSED_BLOCK_ROWS + 50)]
+
+
+def write_catalog(tmp_path, rows, metadata=False):
+    path = str(tmp_path / 'catalog.csv')
+    CsvCatalog(path).write_rows(rows, metadata)
+    return path
+
+
+def assert_same_catalog(loaded, expected):
+    assert loaded.folders == expected.folders
+    assert list(loaded.iter_tuples()) == list(expected.iter_tuples())
+    assert list(loaded.iter_records()) == list(expected.iter_records())
+
+
+def test_round_trip_plain_and_compressed(tmp_path):
+    path = write_catalog(tmp_path, ROWS)
+    expected = BackendHelpers.getCsvContents(path)
+    for compress in (False, True):
+        snapshot = CatalogSnapshot(path)
+        snapshot.build(compress=compress)
+        with snapshot.open() as view:
+            assert_same_catalog(view.to_catalog(), expected)
+            # Pages that span compressed blocks
+            start = COMPRESSED_BLOCK_ROWS - 2
+            assert view.get_page(start, 4) == (list(expected.iter_tuples())[start:start + 4], len(ROWS))
+
+
+def test_round_trip_with_metadata(tmp_path):
+    rows = [('Client A', 'Audio Archive 1', 1500, 3, 1700000000), ('Client B', 'Audio Archive 2', 0, 0, -1),
+            ('Client C', 'Audio Archive 2')]
+    path = write_catalog(tmp_path, rows, metadata=True)
+    expected = BackendHelpers.getCsvContents(path)
+    loaded = CatalogSnapshot(path).load()
+    assert_same_catalog(loaded, expected)
+    assert loaded.get_metadata(2) is None
+
+
+def test_stale_snapshot_is_rebuilt_and_keeps_compression(tmp_path):
+    path = write_catalog(tmp_path, ROWS[:10])
+    snapshot = CatalogSnapshot(path)
+    snapshot.build(compress=True)
+
+    CsvCatalog(path).write_rows(ROWS[:3])
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert snapshot.open() is None
+    assert list(snapshot.load().iter_tuples()) == ROWS[:3]
+    with snapshot.open() as view:
+        assert view.compressed
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    path = write_catalog(tmp_path, ROWS[:10])
+    snapshot = CatalogSnapshot(path)
+    snapshot.build()
+    with open(snapshot.path, 'r+b') as f:
+        f.truncate(os.path.getsize(snapshot.path) - 20)
+    assert snapshot.open() is None
+    assert len(snapshot.load()) == 10
+
+
+def test_empty_catalog(tmp_path):
+    path = write_catalog(tmp_path, [])
+    assert len(CatalogSnapshot(path).load()) == 0
+    with CatalogSnapshot(path).open() as view:
+        assert view.get_page(0, 10) == ([], 0)
+        assert isinstance(view.to_catalog(), Catalog)
+
+
+def test_sections_are_8_byte_aligned(tmp_path):
+    path = write_catalog(tmp_path, [('Client A', 'Audio Archive 1', 1500, 3, 1700000000)], metadata=True)
+    snapshot = CatalogSnapshot(path)
+    snapshot.build(compress=True)
+    with open(snapshot.path, 'rb') as f:
+        data = f.read()
+    position = SNAPSHOT_HEADER.size
+    while position < len(data):
+        assert position % 8 == 0
+        length, = struct.unpack_from('<Q', data, position)
+        position += 8 + length + (-length % 8)
+    assert position == len(data)
+
+
+def test_snapshots_are_only_kept_for_catalogs_that_have_one(tmp_path):
+    path = write_catalog(tmp_path, ROWS[:10])
+    assert len(Folders2CSVBackend.get_csv_contents(path)) == 10
+    assert not os.path.exists(path + SNAPSHOT_SUFFIX)
+
+    assert Folders2CSVBackend.build_snapshot(path)[0]
+    CsvCatalogStorage(path).add_rows(Catalog(ROWS[10:12]))
+    assert len(Folders2CSVBackend.get_csv_contents(path)) == 12
+    with CatalogSnapshot(path).open() as view:
+        assert view.row_count == 12
@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import time
+
+from catalog import Catalog
+from catalogStorage import ShardedCatalogStorage, SqliteCatalogStorage
+
+
+def test_validating_another_database_leaves_it_alone(tmp_path):
+    path = str(tmp_path / 'other.db')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE foo (bar TEXT)")
+    connection.commit()
+    connection.close()
+
+    storage = SqliteCatalogStorage(path)
+    is_valid, message, count = storage.validate()
+    assert not is_valid and count == 0
+    assert storage.count() == 0
+    connection = sqlite3.connect(path)
+    assert [row[0] for row in connection.execute("SELECT name FROM sqlite_master")] == ['foo']
+    connection.close()
+
+
+def test_validating_a_catalog_database_counts_its_rows(tmp_path):
+    storage = SqliteCatalogStorage(str(tmp_path / 'catalog.db'))
+    storage.add_rows(Catalog([('Client A', 'Audio Archive 1'), ('Client B', 'Audio Archive 2')]))
+    assert storage.validate() == (True, "Valid catalog database with 2 existing entries", 2)
+    assert storage.count() == 2
+
+
+def make_sharded(tmp_path, drives=('Audio Archive 1', 'Audio Archive 2', 'Audio Archive 3'), per_drive=3):
+    storage = ShardedCatalogStorage(str(tmp_path / 'catalog.manifest'))
+    storage.add_rows(Catalog([(f'Client {drive[-1]}{i}', drive) for drive in drives for i in range(per_drive)]))
+    return storage
+
+
+def get_shard_paths(storage):
+    return {drive: storage.get_shard_path(entry) for drive, entry in storage.read_manifest()['shards'].items()}
+
+
+def test_updating_one_drive_rewrites_only_its_shard(tmp_path):
+    storage = make_sharded(tmp_path)
+    paths = get_shard_paths(storage)
+    before = {drive: os.stat(path).st_mtime_ns for drive, path in paths.items()}
+    time.sleep(0.01)
+
+    assert storage.add_rows(Catalog([('Client new', 'Audio Archive 2')])) == (1, 10)
+    after = {drive: os.stat(path).st_mtime_ns for drive, path in paths.items()}
+    assert [drive for drive in paths if after[drive] != before[drive]] == ['Audio Archive 2']
+    assert storage.validate()[0]
+
+
+def test_pages_span_shard_boundaries(tmp_path):
+    storage = make_sharded(tmp_path)
+    rows = list(storage.load().iter_tuples())
+    for offset, limit in [(0, 9), (2, 5), (3, 3), (8, 10), (9, 5)]:
+        assert storage.get_page(offset, limit) == (rows[offset:offset + limit], 9)
+
+
+def test_validate_recounts_shards_changed_outside_the_catalog(tmp_path):
+    storage = make_sharded(tmp_path)
+    paths = get_shard_paths(storage)
+    # As a run stopped between writing a shard and the manifest would leave it
+    with open(paths['Audio Archive 1'], 'a', newline='') as f:
+        f.write('Client extra,Audio Archive 1\r\n')
+    assert storage.validate() == (True, "Valid sharded catalog with 10 existing entries on 3 drives", 10)
+    assert storage.read_manifest()['shards']['Audio Archive 1']['rows'] == 4
+
+    with open(paths['Audio Archive 3'], 'w', newline='') as f:
+        f.write('not a catalog\r\n')
+    is_valid, message, count = storage.validate()
+    assert not is_valid and 'Audio Archive 3' in message
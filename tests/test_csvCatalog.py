@@ -0,0 +1,93 @@
+import csv
+import os
+
+from catalog import Catalog
+from catalogStorage import CsvCatalogStorage
+from csvCatalog import CsvCatalog
+
+
+def write_catalog(tmp_path, rows):
+    catalog = CsvCatalog(str(tmp_path / 'catalog.csv'))
+    catalog.write_rows(rows)
+    return catalog
+
+
+def touch_later(path):
+    """Move a file's mtime forward, as an edit in another program would"""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def test_key_index_is_rebuilt_after_an_outside_edit(tmp_path):
+    catalog = write_catalog(tmp_path, [('Client A', 'Audio Archive 1'), ('Client B', 'Audio Archive 1')])
+    assert list(catalog.read_key_index()) == [CsvCatalog.get_row_key('Client A', 'Audio Archive 1'),
+                                              CsvCatalog.get_row_key('Client B', 'Audio Archive 1')]
+
+    with open(catalog.csv_file_path, 'a', newline='') as f:
+        f.write('Client C,Audio Archive 2\r\n')
+    assert catalog.read_key_index() is None
+    keys = catalog.load_keys()
+    assert keys[-1] == CsvCatalog.get_row_key('Client C', 'Audio Archive 2')
+    assert list(catalog.read_key_index()) == list(keys)
+
+
+def test_key_index_is_stale_after_a_same_size_rewrite(tmp_path):
+    catalog = write_catalog(tmp_path, [('Client A', 'Audio Archive 1')])
+    catalog.load_keys()
+    with open(catalog.csv_file_path, 'w', newline='') as f:
+        f.write('Folder Name,Drive Name\r\nClient Z,Audio Archive 1\r\n')
+    touch_later(catalog.csv_file_path)
+    assert catalog.read_key_index() is None
+    assert list(catalog.load_keys()) == [CsvCatalog.get_row_key('Client Z', 'Audio Archive 1')]
+
+
+def test_append_keeps_both_sidecars_current(tmp_path):
+    catalog = write_catalog(tmp_path, [('Client A', 'Audio Archive 1')])
+    catalog.get_page(0, 10)
+    keys = catalog.load_keys()
+    catalog.append_rows([('Client "B"', 'Audio Archive 2'), ('Line\nbreak', 'Audio Archive 2')], keys)
+
+    assert len(catalog.read_key_index()) == 3
+    assert len(catalog.read_row_index()) == 3
+    assert catalog.get_page(1, 2) == ([('Client "B"', 'Audio Archive 2'), ('Line\nbreak', 'Audio Archive 2')], 3)
+
+
+def test_row_index_is_rebuilt_after_an_outside_edit(tmp_path):
+    catalog = write_catalog(tmp_path, [(f'Client {i}', 'Audio Archive 1') for i in range(10)])
+    assert catalog.get_page(8, 5) == ([('Client 8', 'Audio Archive 1'), ('Client 9', 'Audio Archive 1')], 10)
+
+    catalog.write_rows([('Only', 'Audio Archive 3')])
+    os.remove(catalog.key_index_path)
+    touch_later(catalog.csv_file_path)
+    assert catalog.read_row_index() is None
+    assert catalog.get_page(0, 5) == ([('Only', 'Audio Archive 3')], 1)
+
+
+def read_lines(catalog):
+    with open(catalog.csv_file_path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_metadata_merge_rewrites_only_changed_catalogs(tmp_path):
+    storage = CsvCatalogStorage(str(tmp_path / 'catalog.csv'))
+    storage.add_rows(Catalog([('Client A', 'Audio Archive 1', 100, 2, -1)]))
+    inode = os.stat(storage.path).st_ino
+
+    # The same metadata again, plus a new folder: appended in place
+    new_count, total = storage.add_rows(Catalog([('Client A', 'Audio Archive 1', 100, 2, -1),
+                                                 ('Client B', 'Audio Archive 1', 5, 1, -1)]))
+    assert (new_count, total) == (1, 2)
+    assert os.stat(storage.path).st_ino == inode
+    assert read_lines(storage.csv_catalog)[-1] == ['Client B', 'Audio Archive 1', '5', '1', '']
+
+    # Changed metadata means rewriting the row where it is
+    storage.add_rows(Catalog([('Client A', 'Audio Archive 1', 300, 3, -1)]))
+    assert read_lines(storage.csv_catalog)[1] == ['Client A', 'Audio Archive 1', '300', '3', '']
+    assert len(storage.csv_catalog.load_keys()) == 2
+
+
+def test_plain_rows_keep_the_metadata_columns(tmp_path):
+    storage = CsvCatalogStorage(str(tmp_path / 'catalog.csv'))
+    storage.add_rows(Catalog([('Client A', 'Audio Archive 1', 100, 2, -1)]))
+    storage.add_rows(Catalog([('Client B', 'Audio Archive 2')]))
+    assert read_lines(storage.csv_catalog)[-1] == ['Client B', 'Audio Archive 2', '', '', '']
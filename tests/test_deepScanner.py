@@ -0,0 +1,55 @@
+import os
+
+from deepScanner import DeepScanner
+
+
+def make_tree(tmp_path):
+    """A mastering folder with nested sessions, files, a hidden folder and a link back up the tree"""
+    mastering = tmp_path / 'mastering'
+    for path in ['Client A/2024/Mixes/Old', 'Client A/.cache', 'Client B/Stems', 'Client B/Bounces', 'Temp/Junk']:
+        (mastering / path).mkdir(parents=True)
+    (mastering / 'Client A' / '2024' / 'notes.txt').write_text('not a folder')
+    os.symlink(str(mastering / 'Client A'), str(mastering / 'Client A' / '2024' / 'Back to A'))
+    return str(mastering)
+
+
+def assert_parents_first(folders):
+    for i, folder in enumerate(folders):
+        if '/' in folder:
+            assert folder.rsplit('/', 1)[0] in folders[:i]
+
+
+def test_max_depth_limits_the_levels_listed(tmp_path):
+    mastering = make_tree(tmp_path)
+    assert sorted(DeepScanner(max_depth=1).scan(mastering)) == ['Client A', 'Client B', 'Temp']
+    folders = DeepScanner(max_depth=3).scan(mastering)
+    assert sorted(folders) == ['Client A', 'Client A/2024', 'Client A/2024/Mixes', 'Client B', 'Client B/Bounces',
+                               'Client B/Stems', 'Temp', 'Temp/Junk']
+    assert_parents_first(folders)
+    assert 'Client A/2024/Mixes/Old' in DeepScanner(max_depth=None).scan(mastering)
+
+
+def test_include_and_exclude_patterns(tmp_path):
+    mastering = make_tree(tmp_path)
+    # Excluded folders are skipped with everything inside them
+    assert sorted(DeepScanner(max_depth=None, exclude=['temp', 'client a/2024']).scan(mastering)) == [
+        'Client A', 'Client B', 'Client B/Bounces', 'Client B/Stems']
+    # Included folders are found at any depth, below folders that don't match
+    assert sorted(DeepScanner(max_depth=None, include=['mixes', 'stems', 'old']).scan(mastering)) == [
+        'Client A/2024/Mixes', 'Client A/2024/Mixes/Old', 'Client B/Stems']
+
+
+def test_symlink_loops_are_followed_once(tmp_path):
+    mastering = make_tree(tmp_path)
+    (tmp_path / 'Elsewhere' / 'Session').mkdir(parents=True)
+    os.symlink(str(tmp_path / 'Elsewhere'), os.path.join(mastering, 'Linked'))
+    assert 'Linked' not in DeepScanner(max_depth=None).scan(mastering)
+
+    folders = DeepScanner(max_depth=None, follow_symlinks=True).scan(mastering)
+    # Linked folders are listed under the link's path, but Client A is
+    # already visited, so the link back to it is not
+    assert len(folders) == len(set(folders))
+    assert sorted(folders) == ['Client A', 'Client A/2024', 'Client A/2024/Mixes', 'Client A/2024/Mixes/Old',
+                               'Client B', 'Client B/Bounces', 'Client B/Stems', 'Linked', 'Linked/Session',
+                               'Temp', 'Temp/Junk']
+    assert_parents_first(folders)
@@ -0,0 +1,54 @@
+import csv
+
+from conftest import make_drive
+from driveWatcher import DriveWatcher, FULL_LIST_INTERVAL
+
+
+def test_existing_drives_are_ignored_unless_asked(volumes, tmp_path):
+    make_drive(volumes, 'Audio Archive 1', ['Client A'])
+    assert DriveWatcher(str(tmp_path / 'catalog.csv')).pending == set()
+    assert DriveWatcher(str(tmp_path / 'catalog.csv'), process_existing=True).pending == {'Audio Archive 1'}
+
+
+def test_new_drives_wait_for_mounts_to_settle(volumes, tmp_path):
+    watcher = DriveWatcher(str(tmp_path / 'catalog.csv'), settle_seconds=5)
+    assert watcher.poll(now=100) == []
+
+    make_drive(volumes, 'Audio Archive 2', ['Client B'])
+    make_drive(volumes, 'Macintosh HD')
+    make_drive(volumes, 'Backup Disk')
+    # Listed on the first poll after a new mount point appears, but held back
+    # while more drives may follow
+    assert watcher.poll(now=101) == []
+    assert watcher.poll(now=105) == []
+    assert watcher.poll(now=106) == ['Audio Archive 2']
+    assert watcher.poll(now=120) == []
+
+
+def test_unmounted_drives_are_cataloged_again_when_reattached(volumes, tmp_path):
+    watcher = DriveWatcher(str(tmp_path / 'catalog.csv'), settle_seconds=0)
+    mastering = make_drive(volumes, 'Audio Archive 3')
+    assert watcher.poll(now=FULL_LIST_INTERVAL) == ['Audio Archive 3']
+
+    (mastering).rmdir()
+    (volumes / 'Audio Archive 3').rmdir()
+    assert watcher.poll(now=2 * FULL_LIST_INTERVAL) == []
+    make_drive(volumes, 'Audio Archive 3')
+    assert watcher.poll(now=3 * FULL_LIST_INTERVAL) == ['Audio Archive 3']
+
+
+def test_process_adds_only_the_new_drives(volumes, tmp_path):
+    make_drive(volumes, 'Audio Archive 1', ['Old Project'])
+    catalog_path = tmp_path / 'catalog.csv'
+    processed = []
+    watcher = DriveWatcher(str(catalog_path), settle_seconds=0,
+                           on_processed=lambda drives, result: processed.append((drives, result[0])))
+
+    make_drive(volumes, 'Audio Archive 2', ['New Project', 'Other Project'])
+    ready = watcher.poll(now=FULL_LIST_INTERVAL)
+    watcher.process(ready)
+
+    assert processed == [(['Audio Archive 2'], True)]
+    with open(catalog_path, newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    assert sorted(rows) == [['New Project', 'Audio Archive 2'], ['Other Project', 'Audio Archive 2']]
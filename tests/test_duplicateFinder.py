@@ -0,0 +1,38 @@
+from backend import Folders2CSVBackend
+from conftest import make_drive
+
+DRIVES = ['Audio Archive 1', 'Audio Archive 2', 'Audio Archive 3']
+
+
+def make_project(mastering, name, last_byte=b'\0'):
+    """Create a project folder of two 1000-byte files, the second ending in last_byte"""
+    project = mastering / name
+    project.mkdir()
+    (project / 'mix.wav').write_bytes(b'a' * 1000)
+    (project / 'stems.wav').write_bytes(b'b' * 999 + last_byte)
+
+
+def test_identical_copies_are_reported_together(volumes):
+    for drive in DRIVES[:2]:
+        make_project(make_drive(volumes, drive), 'ProjX')
+    make_project(make_drive(volumes, DRIVES[2]), 'ProjY', b'\1')
+
+    groups = Folders2CSVBackend.find_duplicates(DRIVES, hash_workers=1)
+    assert [sorted(group.folders) for group in groups] == [[('Audio Archive 1', 'ProjX'),
+                                                            ('Audio Archive 2', 'ProjX')]]
+    assert groups[0].wasted == 2000
+
+
+def test_near_copy_of_an_identical_group_is_still_found(volumes):
+    make_project(make_drive(volumes, DRIVES[0]), 'ProjX')
+    make_project(make_drive(volumes, DRIVES[1]), 'ProjX copy')
+    make_project(make_drive(volumes, DRIVES[2]), 'ProjX', b'\1')
+
+    groups = Folders2CSVBackend.find_duplicates(DRIVES, similarity=0.5, hash_workers=1)
+    identical = [group for group in groups if group.similarity == 1.0]
+    near = [group for group in groups if group.similarity < 1.0]
+    assert [sorted(group.folders) for group in identical] == [[('Audio Archive 1', 'ProjX'),
+                                                               ('Audio Archive 2', 'ProjX copy')]]
+    assert [sorted(group.folders) for group in near] == [[('Audio Archive 1', 'ProjX'),
+                                                          ('Audio Archive 3', 'ProjX')]]
+    assert near[0].similarity == 0.5
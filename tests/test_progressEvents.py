@@ -0,0 +1,33 @@
+import collections
+
+from progressEvents import ProgressEvent, ProgressQueue, STAGE_LIST
+
+
+class RefillingDeque(collections.deque):
+    """Stands in for a worker queueing another event whenever one is taken"""
+
+    def popleft(self):
+        event = super().popleft()
+        self.append(ProgressEvent(STAGE_LIST, "more", 'Audio Archive 2'))
+        return event
+
+
+def test_drain_coalesces_events_per_drive():
+    queue = ProgressQueue()
+    queue.put(ProgressEvent(STAGE_LIST, "listing", 'Audio Archive 1', 1, 2))
+    queue.put(ProgressEvent(STAGE_LIST, "started", 'Audio Archive 2'))
+    queue.put(ProgressEvent(STAGE_LIST, "listed", 'Audio Archive 1', 2, 2))
+    progress, drives, latest = queue.drain()
+    assert progress.done == 2
+    assert {drive: event.message for drive, event in drives.items()} == {'Audio Archive 1': "listed",
+                                                                         'Audio Archive 2': "started"}
+    assert latest.message == "listed"
+    assert queue.drain() == (None, {}, None)
+
+
+def test_drain_stops_at_the_events_queued_when_it_started():
+    queue = ProgressQueue()
+    queue.events = RefillingDeque([ProgressEvent(STAGE_LIST, "listing", 'Audio Archive 1', 1, 2)] * 3)
+    progress, drives, latest = queue.drain()
+    assert set(drives) == {'Audio Archive 1'}
+    assert len(queue.events) == 3
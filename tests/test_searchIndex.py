@@ -0,0 +1,71 @@
+from catalog import Catalog
+from searchIndex import SearchIndex, get_edit_distance
+
+ROWS = [
+    ('Northfield Records - Silver Harbor Deluxe_v2_final', 'Audio Archive 7'),
+    ('Midnight Garden Stems', 'Audio Archive 1'),
+    ('midnight garden (demo)', 'Audio Archive 2'),
+    ('Echo Chamber EP', 'Audio Archive 2'),
+    ('Client X', 'Backup Archive'),
+    ('Glass EP 355', 'Audio Archive 3'),
+]
+
+
+def folders(rows):
+    return [row.folder for row in rows]
+
+
+def brute_force(rows, query):
+    query = query.lower()
+    return [folder for folder, drive in rows if query in folder.lower() or query in drive.lower()]
+
+
+def test_substring_search_matches_a_scan_of_every_row():
+    index = SearchIndex(Catalog(ROWS))
+    for query in ['garden', 'GARDEN', 'ep', 'archive 2', 'backup', 'x', 'deluxe_v2', 'nothing here', '']:
+        assert folders(index.search(query)) == brute_force(ROWS, query), query
+
+
+def test_narrowing_a_query_reuses_earlier_results():
+    index = SearchIndex(Catalog(ROWS))
+    assert folders(index.search('mid')) == ['Midnight Garden Stems', 'midnight garden (demo)']
+    assert folders(index.search('midnight garden (')) == ['midnight garden (demo)']
+    # A new query that doesn't extend the last one searches every row again
+    assert folders(index.search('echo')) == ['Echo Chamber EP']
+
+
+def test_fuzzy_search_allows_typos_prefixes_and_word_order():
+    index = SearchIndex(Catalog(ROWS))
+    assert folders(index.fuzzy_search('silvr harbr'))[0] == ROWS[0][0]
+    assert folders(index.fuzzy_search('garden midnight stems'))[0] == 'Midnight Garden Stems'
+    assert folders(index.fuzzy_search('echo cham'))[0] == 'Echo Chamber EP'
+    assert folders(index.fuzzy_search('glass 355'))[0] == 'Glass EP 355'
+    # Numbers must match as typed
+    assert 'Glass EP 355' not in folders(index.fuzzy_search('356'))
+    assert folders(index.fuzzy_search('zzzz')) == []
+
+
+def test_added_rows_are_found_like_rows_indexed_at_the_start():
+    index = SearchIndex(Catalog(ROWS[:3]))
+    index.search('echo')
+    index.fuzzy_search('garden')
+    index.add_rows(ROWS[3:])
+    full = SearchIndex(Catalog(ROWS))
+    for query in ['echo', 'archive', 'ep', 'glass']:
+        assert folders(index.search(query)) == folders(full.search(query))
+        assert folders(index.fuzzy_search(query)) == folders(full.fuzzy_search(query))
+
+
+def test_fuzzy_search_finds_short_words_with_swapped_letters():
+    index = SearchIndex(Catalog(ROWS))
+    # Swapping two letters of a short word can leave no trigram in common with it
+    assert folders(index.fuzzy_search('gadren'))[:2] == ['Midnight Garden Stems', 'midnight garden (demo)']
+    assert folders(index.fuzzy_search('dmeo')) == ['midnight garden (demo)']
+    assert folders(index.fuzzy_search('stmes')) == ['Midnight Garden Stems']
+    assert folders(index.fuzzy_search('ehco')) == ['Echo Chamber EP']
+
+
+def test_edit_distance_counts_transpositions_and_stops_past_the_limit():
+    assert get_edit_distance('garden', 'garden', 2) == 0
+    assert get_edit_distance('garden', 'gadren', 2) == 1
+    assert get_edit_distance('garden', 'gardenias', 2) > 2
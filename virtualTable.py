@@ -0,0 +1,166 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Fallback when the theme does not define a Treeview row height
+DEFAULT_ROW_HEIGHT = 20
+
+
+class VirtualTable(ttk.Frame):
+    """
+    Table that only creates Treeview items for the visible rows.
+    Scrolling reuses the same items and just changes their values, so the
+    cost of showing a catalog does not depend on how many rows it has.
+    """
+
+    def __init__(self, parent, columns=("Folder Name", "Drive Name"), widths=(360, 160), on_sort=None, **kwargs):
+        """
+        Args:
+            parent: Parent widget
+            columns (sequence): Column headings
+            widths (sequence): Initial column widths
+            on_sort (callable): Called with a column number when its heading is clicked
+        """
+        super().__init__(parent, **kwargs)
+        self.rows = []
+        self.top = 0
+        self.visible_count = 1
+        self.on_sort = on_sort
+        self.headings = ()
+        self.items = []  # Pool of Treeview item ids, reused on every render
+
+        self.tree = ttk.Treeview(self, show="headings", selectmode="browse")
+        self.set_columns(columns, widths)
+        self.tree.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.row_height = self.get_row_height()
+        # 'aqua' reports wheel deltas in rows, 'win32' and 'x11' in 120ths of a notch
+        self.windowing_system = self.tk.call("tk", "windowingsystem")
+        self.wheel_delta = 0  # Notch fractions from touchpads, not scrolled yet
+
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.tree.bind("<Up>", lambda e: self.scroll_by(-1) or "break")
+        self.tree.bind("<Down>", lambda e: self.scroll_by(1) or "break")
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-self.visible_count) or "break")
+        self.tree.bind("<Next>", lambda e: self.scroll_by(self.visible_count) or "break")
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0) or "break")
+        self.tree.bind("<End>", lambda e: self.scroll_to(len(self.rows)) or "break")
+
+    def set_columns(self, columns, widths, format_row=tuple):
+        """
+        Replace the table's columns
+
+        Args:
+            columns (sequence): Column headings
+            widths (sequence): Initial column widths
+            format_row (callable): Turns a row into a tuple of column values
+        """
+        self.format_row = format_row  # Turns a row into the values shown
+        if tuple(columns) == self.headings:
+            return
+        self.headings = tuple(columns)
+        # Pooled items hold values for the old columns
+        for item in self.items:
+            self.tree.delete(item)
+        self.items = []
+
+        column_ids = [f"c{i}" for i in range(len(columns))]
+        self.tree.configure(columns=column_ids)
+        for i, (column_id, heading, width) in enumerate(zip(column_ids, columns, widths)):
+            command = (lambda column=i: self.on_sort(column)) if self.on_sort else ""
+            self.tree.heading(column_id, text=heading, command=command)
+            self.tree.column(column_id, width=width, anchor=tk.W, stretch=True)
+
+    def set_sort_indicator(self, column, reverse):
+        """Mark the heading of the column the rows are sorted by"""
+        for i, heading in enumerate(self.headings):
+            if i == column:
+                heading = f"{heading} {'▼' if reverse else '▲'}"
+            self.tree.heading(f"c{i}", text=heading)
+
+    def get_row_height(self):
+        """Get the Treeview row height from the current theme"""
+        try:
+            height = ttk.Style().lookup("Treeview", "rowheight")
+            return int(height) if height else DEFAULT_ROW_HEIGHT
+        except (tk.TclError, ValueError):
+            return DEFAULT_ROW_HEIGHT
+
+    def set_rows(self, rows):
+        """
+        Replace the rows shown by the table
+
+        Args:
+            rows (sequence): Indexable sequence of row tuples
+        """
+        self.rows = rows
+        self.top = 0
+        self.render()
+
+    def on_configure(self, event):
+        """Recompute how many rows fit when the table is resized"""
+        # One row's worth of height is taken by the heading
+        visible_count = max(1, event.height // self.row_height - 1)
+        if visible_count != self.visible_count:
+            self.visible_count = visible_count
+            self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        """Handle scrollbar drags, arrow clicks and page clicks"""
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.rows)))
+        elif action == "scroll":
+            step = self.visible_count if unit == "pages" else 1
+            self.scroll_by(int(amount) * step)
+
+    def on_mousewheel(self, event):
+        """Scroll on mouse wheel, handling both macOS and Windows deltas"""
+        if self.windowing_system == "aqua":
+            self.scroll_by(-event.delta)
+            return
+        # Three rows per notch; precision touchpads send fractions of a notch,
+        # which add up until they make a whole row
+        self.wheel_delta += event.delta * 3
+        rows = int(self.wheel_delta / 120)
+        self.wheel_delta -= rows * 120
+        self.scroll_by(-rows)
+
+    def scroll_by(self, count):
+        """Scroll by a number of rows"""
+        self.scroll_to(self.top + count)
+
+    def scroll_to(self, index):
+        """Scroll so that the given row is at the top"""
+        top = max(0, min(index, len(self.rows) - self.visible_count))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def render(self):
+        """Fill the pooled Treeview items with the rows in the viewport"""
+        total = len(self.rows)
+        self.top = max(0, min(self.top, total - self.visible_count))
+        needed = min(self.visible_count, total - self.top)
+
+        # Grow or shrink the item pool to the number of visible rows
+        while len(self.items) < needed:
+            self.items.append(self.tree.insert("", tk.END, values=()))
+        while len(self.items) > needed:
+            self.tree.delete(self.items.pop())
+
+        for offset, item in enumerate(self.items):
+            self.tree.item(item, values=self.format_row(self.rows[self.top + offset]))
+        self.tree.selection_set(())
+
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + needed) / total)
+        else:
+            self.scrollbar.set(0, 1)